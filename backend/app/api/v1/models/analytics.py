@@ -2,7 +2,7 @@
 Modelos de datos para analítica
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date
 from enum import Enum
@@ -39,6 +39,16 @@ class DemandPrediction(BaseModel):
     time_period: TimePeriod
     factors: Dict[str, Any]  # Factores que influyen en la predicción
 
+class BatchPredictionItem(BaseModel):
+    """Una configuración de la predicción por lotes"""
+    specialty_id: int
+    prediction_horizon: int = Field(30, ge=1, le=365, description="Días hacia adelante para predicción")
+    time_period: Optional[TimePeriod] = Field(None, description="Agrupar el pronóstico por periodo (diario por defecto)")
+
+class BatchPredictionRequest(BaseModel):
+    """Request de predicciones de demanda por lotes"""
+    requests: List[BatchPredictionItem] = Field(..., min_length=1, max_length=500)
+
 class TrendAnalysis(BaseModel):
     """Análisis de tendencias"""
     metric_name: str
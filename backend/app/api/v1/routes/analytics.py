@@ -3,23 +3,29 @@ Rutas de analítica y predicciones
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from ..models.analytics import (
     DemandPrediction, TrendAnalysis, ResourceOptimization,
-    AnalyticsReport, AnalyticsRequest, TimePeriod
+    AnalyticsReport, AnalyticsRequest, TimePeriod, BatchPredictionRequest
 )
 from ..services.analytics_service import AnalyticsService
 from app.core.database import get_db
+from app.core.result_cache import result_cache
+from app.core.model_registry import model_registry
+from app.services.demand_forecast_service import DEMAND_MODEL, demand_model_snapshot, refit_models
+from app.services.cost_forecast_service import COST_MODEL
+from app.services.flow_metrics_history_service import FlowMetricsHistoryService
 
 router = APIRouter()
 
 @router.get("/demand-predictions")
 async def get_demand_predictions(
     specialty_ids: Optional[List[str]] = Query(None, description="IDs de especialidades a analizar"),
-    prediction_horizon: int = Query(30, description="Días hacia adelante para predicción"),
+    prediction_horizon: int = Query(30, ge=1, le=365, description="Días hacia adelante para predicción"),
     db: Session = Depends(get_db)
 ):
     """Obtener predicciones de demanda por especialidad usando datos reales"""
@@ -27,79 +33,136 @@ async def get_demand_predictions(
         service = AnalyticsService(db)
         predictions = await service.get_demand_predictions(specialty_ids, prediction_horizon)
         return predictions
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando predicciones: {str(e)}")
 
+@router.post("/demand-predictions/refit")
+async def refit_demand_models():
+    """
+    Reajustar los modelos de pronóstico de demanda con la actividad más
+    reciente (publica una versión nueva si el modelo se sirve desde el registro).
+    El ajuste corre en el pool de hilos para no bloquear el event loop.
+    """
+    try:
+        model = await run_in_threadpool(refit_models, DEMAND_MODEL, demand_model_snapshot)
+        result_cache.invalidate("analytics:demand_predictions")
+        result_cache.invalidate("analytics:demand_predictions_batch")
+        result_cache.invalidate("analytics:resource_optimization")
+        result_cache.invalidate("analytics:capacity_plan")
+        return {
+            "specialties": len(model["keys"]),
+            "history_days": model["days"],
+            "fitted_at": model["fitted_at"],
+            "cache": demand_model_snapshot.stats(),
+            "registry": model_registry.stats(DEMAND_MODEL)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ajustando modelos de demanda: {str(e)}")
+
+@router.post("/predictions/batch")
+async def get_batch_predictions(
+    batch: BatchPredictionRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Predicciones de demanda para varias configuraciones (especialidad,
+    horizonte, periodo) en una sola llamada; los resultados conservan el
+    orden de `requests`
+    """
+    try:
+        service = AnalyticsService(db)
+        requests = [
+            (item.specialty_id, item.prediction_horizon, item.time_period.value if item.time_period else None)
+            for item in batch.requests
+        ]
+        return {"results": await service.get_demand_predictions_batch(requests)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando predicciones: {str(e)}")
+
+@router.get("/cost-predictions")
+async def get_cost_predictions(
+    center_ids: Optional[List[int]] = Query(None, description="IDs de centros a analizar"),
+    prediction_horizon: int = Query(30, ge=1, le=365, description="Días hacia adelante para predicción"),
+    db: Session = Depends(get_db)
+):
+    """Obtener el monto facturado pronosticado por centro"""
+    try:
+        service = AnalyticsService(db)
+        return await service.get_cost_predictions(center_ids, prediction_horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando predicciones de costo: {str(e)}")
+
+@router.get("/models")
+async def get_models():
+    """Versiones guardadas de los modelos de pronóstico y versión cargada en este worker"""
+    try:
+        return {
+            name: {**model_registry.stats(name), "versions": model_registry.versions(name)}
+            for name in (DEMAND_MODEL, COST_MODEL)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo modelos: {str(e)}")
+
 @router.get("/trend-analysis")
 async def get_trend_analysis(
     specialty_ids: Optional[List[str]] = Query(None, description="IDs de especialidades a analizar"),
     time_period: TimePeriod = Query(TimePeriod.MONTHLY, description="Período de análisis"),
     db: Session = Depends(get_db)
 ):
-    """Obtener análisis de tendencias usando datos reales"""
+    """Obtener análisis de tendencias a partir del historial de métricas de flujos"""
     try:
         service = AnalyticsService(db)
         trends = await service.get_trend_analysis(specialty_ids, time_period)
         return trends
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analizando tendencias: {str(e)}")
 
+@router.post("/trend-analysis/snapshot")
+async def capture_flow_metrics_snapshot(db: Session = Depends(get_db)):
+    """Guardar la instantánea de métricas de flujos del día si aún no existe"""
+    try:
+        return FlowMetricsHistoryService(db).capture()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error guardando métricas de flujos: {str(e)}")
+
 @router.get("/resource-optimization")
 async def get_resource_optimization(
     specialty_ids: Optional[List[int]] = Query(None, description="IDs de especialidades a analizar"),
+    prediction_horizon: int = Query(30, ge=1, le=365, description="Días hacia adelante para la demanda"),
     db: Session = Depends(get_db)
 ):
-    """Obtener recomendaciones de optimización de recursos"""
+    """Utilización de recursos por centro y recomendaciones con la demanda pronosticada"""
     try:
-        # Datos simulados para desarrollo
-        optimizations = [
-            {
-                "specialty_id": 1,
-                "specialty_name": "Medicina General",
-                "resource_type": "Personal Médico",
-                "current_utilization": 0.85,
-                "optimal_utilization": 0.90,
-                "recommendations": [
-                    "Aumentar personal médico en horarios pico",
-                    "Implementar turnos rotativos para cubrir demanda",
-                    "Capacitar personal en atención eficiente"
-                ],
-                "potential_savings": 5000.0,
-                "implementation_priority": "high"
-            },
-            {
-                "specialty_id": 2,
-                "specialty_name": "Cardiología",
-                "resource_type": "Equipos de Diagnóstico",
-                "current_utilization": 0.75,
-                "optimal_utilization": 0.85,
-                "recommendations": [
-                    "Optimizar uso de equipos de diagnóstico",
-                    "Programar mantenimiento preventivo",
-                    "Mejorar flujo de pacientes"
-                ],
-                "potential_savings": 3000.0,
-                "implementation_priority": "medium"
-            },
-            {
-                "specialty_id": 3,
-                "specialty_name": "Ginecología",
-                "resource_type": "Consultorios",
-                "current_utilization": 0.60,
-                "optimal_utilization": 0.80,
-                "recommendations": [
-                    "Reorganizar horarios de consulta",
-                    "Implementar consultas grupales",
-                    "Optimizar espacio físico"
-                ],
-                "potential_savings": 2000.0,
-                "implementation_priority": "low"
-            }
-        ]
-        return optimizations
+        service = AnalyticsService(db)
+        return await service.get_resource_optimization(specialty_ids, prediction_horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando optimizaciones: {str(e)}")
 
+@router.get("/capacity-plan")
+async def get_capacity_plan(
+    specialty_ids: Optional[List[int]] = Query(None, description="IDs de especialidades a analizar"),
+    prediction_horizon: int = Query(30, ge=1, le=365, description="Días hacia adelante para la demanda"),
+    db: Session = Depends(get_db)
+):
+    """Plan de capacidad: reparto de la demanda pronosticada entre centros y utilización por recurso"""
+    try:
+        service = AnalyticsService(db)
+        return await service.get_capacity_plan(specialty_ids, prediction_horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando plan de capacidad: {str(e)}")
+
 @router.post("/generate-report", response_model=AnalyticsReport)
 async def generate_analytics_report(
     request: AnalyticsRequest,
@@ -123,6 +186,11 @@ async def get_dashboard_metrics(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo métricas: {str(e)}")
 
+@router.get("/cache-metrics")
+async def get_cache_metrics():
+    """Aciertos y fallos del caché de resultados de analítica por espacio de nombres"""
+    return result_cache.stats()
+
 @router.get("/test")
 async def test_analytics():
     """Endpoint de prueba para analítica"""
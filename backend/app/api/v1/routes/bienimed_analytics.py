@@ -1,63 +1,195 @@
 """
 Rutas para Analytics de Bienimed
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from datetime import date
 from app.core.database import get_db
-from app.services.bienimed_analytics_service import BienimedAnalyticsService
+from app.integrations.bienimed.database import get_bienimed_db, bienimed_pool_metrics
+from app.services.bienimed_analytics_service import BienimedAnalyticsService, dashboard_stats_snapshot
+from app.services.revenue_rollup_service import RevenueRollupService
+from app.services.clinical_rollup_service import ClinicalRollupService, RollupsNotReady
 
 router = APIRouter()
 
 @router.get("/dashboard-stats", response_model=Dict[str, Any])
-def get_dashboard_stats():
-    """Obtener estadísticas para el dashboard"""
+def get_dashboard_stats(
+    idcentro: Optional[int] = Query(None, description="ID del centro"),
+    idarea: Optional[int] = Query(None, description="ID del área (se resuelve a su centro)"),
+    idusuario: Optional[int] = Query(None, description="ID del usuario (médico)"),
+    idcliente: Optional[int] = Query(None, description="ID del cliente corporativo"),
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
+    """Obtener estadísticas para el dashboard, opcionalmente por centro, área, médico o cliente"""
     try:
-        service = BienimedAnalyticsService()
-        stats = service.get_dashboard_stats()
+        service = BienimedAnalyticsService(bienimed_db)
+        stats = service.get_dashboard_stats(
+            center_id=idcentro, area_id=idarea, user_id=idusuario, client_id=idcliente, db=db
+        )
         return stats
+    except RollupsNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
 
+@router.post("/dashboard-stats/refresh", response_model=Dict[str, Any])
+def refresh_dashboard_stats():
+    """Recalcular la instantánea del dashboard y retornar el estado del caché"""
+    try:
+        dashboard_stats_snapshot.refresh()
+        return {**dashboard_stats_snapshot.get(), "cache": dashboard_stats_snapshot.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al recalcular estadísticas: {str(e)}")
+
 @router.get("/patient-flow-analytics", response_model=Dict[str, Any])
-def get_patient_flow_analytics():
+def get_patient_flow_analytics(
+    start_date: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    end_date: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    idcentro: Optional[int] = Query(None, description="ID del centro"),
+    idarea: Optional[int] = Query(None, description="ID del área (se resuelve a su centro)"),
+    idusuario: Optional[int] = Query(None, description="ID del usuario (médico)"),
+    idcliente: Optional[int] = Query(None, description="ID del cliente corporativo"),
+    center_id: Optional[int] = Query(None, deprecated=True, description="Usar idcentro"),
+    top_n: int = Query(10, ge=1, le=100, description="Cantidad de elementos por ranking"),
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
     """Obtener análisis de flujos de pacientes"""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date no puede ser posterior a end_date")
     try:
-        service = BienimedAnalyticsService()
-        analytics = service.get_patient_flow_analytics()
+        service = BienimedAnalyticsService(bienimed_db)
+        analytics = service.get_patient_flow_analytics(
+            start_date=start_date, end_date=end_date, center_id=idcentro or center_id, top_n=top_n,
+            area_id=idarea, user_id=idusuario, client_id=idcliente, db=db
+        )
         return analytics
+    except RollupsNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener análisis de flujos: {str(e)}")
 
+@router.post("/clinical-rollups/refresh", response_model=Dict[str, Any])
+def refresh_clinical_rollups(
+    full: bool = Query(False, description="Reconstruir los agregados desde cero"),
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
+    """Incorporar los registros clínicos nuevos a los agregados (o reconstruirlos)"""
+    service = ClinicalRollupService(db, bienimed_db)
+    try:
+        return service.refresh(full=full)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar agregados de actividad clínica: {str(e)}")
+
+@router.get("/clinical-rollups/state", response_model=Dict[str, Any])
+def get_clinical_rollups_state(
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
+    """Marca de agua de cada tabla clínica incorporada a los agregados"""
+    try:
+        return ClinicalRollupService(db, bienimed_db).get_state()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener estado de agregados: {str(e)}")
+
 @router.get("/revenue-analytics", response_model=Dict[str, Any])
-def get_revenue_analytics():
+def get_revenue_analytics(
+    start_date: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    end_date: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    granularity: str = Query("month", description="Periodo: day, week o month"),
+    idcentro: Optional[int] = Query(None, description="ID del centro"),
+    idarea: Optional[int] = Query(None, description="ID del área (se resuelve a su centro)"),
+    idusuario: Optional[int] = Query(None, description="ID del usuario que registró la factura"),
+    idcliente: Optional[int] = Query(None, description="No aplica: las facturas no registran cliente"),
+    center_id: Optional[int] = Query(None, deprecated=True, description="Usar idcentro"),
+    payment_method_id: Optional[int] = Query(None, description="ID del método de pago"),
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
     """Obtener análisis de facturación"""
     try:
-        service = BienimedAnalyticsService()
-        analytics = service.get_revenue_analytics()
+        service = BienimedAnalyticsService(bienimed_db)
+        analytics = service.get_revenue_analytics(
+            db, start_date=start_date, end_date=end_date, granularity=granularity,
+            center_id=idcentro or center_id, payment_method_id=payment_method_id,
+            area_id=idarea, user_id=idusuario, client_id=idcliente
+        )
         return analytics
+    except RollupsNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener análisis de facturación: {str(e)}")
 
+@router.post("/revenue-analytics/refresh", response_model=Dict[str, Any])
+def refresh_revenue_rollups(
+    full: bool = Query(False, description="Reconstruir los agregados desde cero"),
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
+    """Incorporar las facturas nuevas a los agregados (o reconstruirlos)"""
+    service = RevenueRollupService(db, bienimed_db)
+    try:
+        return service.refresh(full=full)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar agregados de facturación: {str(e)}")
+
 @router.get("/doctor-performance", response_model=Dict[str, Any])
-def get_doctor_performance():
+def get_doctor_performance(
+    skip: int = Query(0, ge=0, description="Número de doctores a omitir"),
+    limit: int = Query(50, ge=1, le=500, description="Número máximo de doctores"),
+    sort_by: str = Query("total_consultations", description="Métrica de orden"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="Dirección del orden"),
+    start_date: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    end_date: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    idcentro: Optional[int] = Query(None, description="ID del centro"),
+    idarea: Optional[int] = Query(None, description="ID del área (se resuelve a su centro)"),
+    idusuario: Optional[int] = Query(None, description="ID del usuario (médico)"),
+    idcliente: Optional[int] = Query(None, description="ID del cliente corporativo (limita las métricas)"),
+    center_id: Optional[int] = Query(None, deprecated=True, description="Usar idcentro"),
+    specialty_id: Optional[int] = Query(None, description="ID de la especialidad"),
+    period: Optional[str] = Query(None, description="Desglose por periodo: month o year"),
+    db: Session = Depends(get_db),
+    bienimed_db: Session = Depends(get_bienimed_db)
+):
     """Obtener rendimiento de doctores"""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date no puede ser posterior a end_date")
     try:
-        service = BienimedAnalyticsService()
-        performance = service.get_doctor_performance()
+        service = BienimedAnalyticsService(bienimed_db)
+        performance = service.get_doctor_performance(
+            skip=skip, limit=limit, sort_by=sort_by, descending=order == "desc",
+            start_date=start_date, end_date=end_date,
+            center_id=idcentro or center_id, specialty_id=specialty_id, period=period,
+            area_id=idarea, user_id=idusuario, client_id=idcliente, db=db
+        )
         return performance
+    except RollupsNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener rendimiento de doctores: {str(e)}")
 
 @router.get("/flow-recommendations", response_model=List[Dict[str, Any]])
-def get_flow_recommendations():
+def get_flow_recommendations(bienimed_db: Session = Depends(get_bienimed_db)):
     """Obtener recomendaciones de flujos basadas en datos reales"""
     try:
-        service = BienimedAnalyticsService()
+        service = BienimedAnalyticsService(bienimed_db)
         recommendations = service.generate_flow_recommendations()
         return recommendations
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al generar recomendaciones: {str(e)}")
 
-
-
+@router.get("/pool-metrics", response_model=Dict[str, Any])
+def get_pool_metrics():
+    """Obtener métricas de checkout del pool de conexiones de Bienimed"""
+    return bienimed_pool_metrics.snapshot()
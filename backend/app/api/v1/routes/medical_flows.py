@@ -3,16 +3,26 @@ Rutas API para flujos médicos normalizados
 Proporciona endpoints para acceder a los 20 flujos médicos completos
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
+from datetime import timezone
+from email.utils import format_datetime
+import hashlib
 from app.core.database import get_db
-from app.services.medical_flow_service import MedicalFlowService
+from app.services.medical_flow_service import MedicalFlowService, FLOW_INCLUDE_OPTIONS
+from app.services.flow_catalog import FlowVersion
+from app.services.flow_autosave import flow_autosave_buffer
+from app.services.reference_data import reference_data_cache
 import structlog
 
 logger = structlog.get_logger()
 router = APIRouter()
 
+# Tamaño de página cuando se recibe un cursor sin límite
+DEFAULT_FLOWS_PAGE_SIZE = 50
+
 @router.get("/specialties", summary="Obtener todas las especialidades médicas")
 async def get_specialties(db: Session = Depends(get_db)):
     """Obtener todas las especialidades médicas disponibles"""
@@ -52,43 +62,48 @@ async def get_specialty(specialty_id: str, db: Session = Depends(get_db)):
 @router.get("/flows", summary="Obtener todos los flujos médicos")
 async def get_flows(
     specialty_id: Optional[str] = Query(None, description="Filtrar por especialidad"),
+    source_system: Optional[str] = Query(None, description="Filtrar por sistema origen (normalized, bienimed, css, ...)"),
     min_duration: Optional[int] = Query(None, description="Duración mínima en minutos"),
     max_duration: Optional[int] = Query(None, description="Duración máxima en minutos"),
     min_cost: Optional[float] = Query(None, description="Costo mínimo"),
     max_cost: Optional[float] = Query(None, description="Costo máximo"),
     search: Optional[str] = Query(None, description="Buscar por nombre o descripción"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Tamaño de página; sin límite retorna todos"),
+    include: str = Query("nodes,edges", description="Partes del grafo a incluir: nodes, edges (vacío para ninguna)"),
     db: Session = Depends(get_db)
 ):
-    """Obtener flujos médicos con filtros opcionales"""
+    """Obtener flujos médicos con filtros opcionales y paginación por cursor"""
+    include_parts = tuple(part.strip() for part in include.split(",") if part.strip())
+    invalid = [part for part in include_parts if part not in FLOW_INCLUDE_OPTIONS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Valores de include no válidos: {', '.join(invalid)}")
+    
     try:
         service = MedicalFlowService(db)
-        
-        if search:
-            flows = service.search_flows(search)
-        elif specialty_id:
-            flows = service.get_flows_by_specialty(specialty_id)
-        else:
-            # Obtener todos los flujos y filtrar por duración y costo si es necesario
-            flows = service.get_all_flows()
-            
-            # Filtrar por rango de duración si se proporciona
-            if min_duration is not None:
-                flows = [f for f in flows if f.get("averageDuration", 0) >= min_duration]
-            if max_duration is not None:
-                flows = [f for f in flows if f.get("averageDuration", 0) <= max_duration]
-            
-            # Filtrar por rango de costo si se proporciona
-            if min_cost is not None:
-                flows = [f for f in flows if f.get("estimatedCost", 0) >= min_cost]
-            if max_cost is not None:
-                flows = [f for f in flows if f.get("estimatedCost", 0) <= max_cost]
+        page = service.list_flows(
+            specialty_id=specialty_id,
+            source_system=source_system,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            min_cost=min_cost,
+            max_cost=max_cost,
+            search=search,
+            cursor=cursor,
+            # Un cursor sin límite explícito pagina con el tamaño por defecto
+            limit=limit or (DEFAULT_FLOWS_PAGE_SIZE if cursor else None),
+            include=include_parts
+        )
+        flows = page["flows"]
         
         return {
             "success": True,
             "data": flows,
             "count": len(flows),
+            "next_cursor": page["next_cursor"],
             "filters": {
                 "specialty_id": specialty_id,
+                "source_system": source_system,
                 "min_duration": min_duration,
                 "max_duration": max_duration,
                 "min_cost": min_cost,
@@ -96,15 +111,51 @@ async def get_flows(
                 "search": search
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error obteniendo flujos: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@router.get("/flows/search", summary="Buscar flujos médicos por relevancia")
+async def search_flows(
+    q: str = Query(..., min_length=1, description="Texto a buscar (sin distinguir acentos, admite prefijos)"),
+    limit: int = Query(50, ge=1, le=500, description="Número máximo de resultados"),
+    db: Session = Depends(get_db)
+):
+    """Buscar flujos por nombre, descripción, especialidad o pasos, ordenados por relevancia"""
+    try:
+        service = MedicalFlowService(db)
+        flows = service.search_flows(q, limit=limit)
+        
+        return {
+            "success": True,
+            "data": flows,
+            "count": len(flows),
+            "query": q
+        }
+    except Exception as e:
+        logger.error(f"Error buscando flujos: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @router.get("/flows/{flow_id}", summary="Obtener flujo médico completo")
-async def get_flow(flow_id: str, db: Session = Depends(get_db)):
-    """Obtener un flujo médico completo con nodos y conexiones"""
+async def get_flow(flow_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Obtener un flujo médico completo con nodos y conexiones.
+    
+    Responde con ETag y Last-Modified según la versión del flujo; si el cliente
+    envía If-None-Match con la versión vigente se responde 304 sin cuerpo.
+    """
     try:
         service = MedicalFlowService(db)
+        version = service.get_flow_version(flow_id)
+        
+        if version is not None:
+            cache_headers = _flow_cache_headers(flow_id, version)
+            if _etag_matches(request.headers.get("if-none-match"), cache_headers["ETag"]):
+                return Response(status_code=304, headers=cache_headers)
+            response.headers.update(cache_headers)
+        
         flow = service.get_flow_by_id(flow_id)
         
         if not flow:
@@ -120,6 +171,32 @@ async def get_flow(flow_id: str, db: Session = Depends(get_db)):
         logger.error(f"Error obteniendo flujo {flow_id}: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+def _flow_cache_headers(flow_id: str, version: FlowVersion) -> Dict[str, str]:
+    """
+    ETag (de la revisión, que cambia en cada guardado, y de los tipos de paso
+    cuyos nombres incluye el documento) y Last-Modified (de updated_at, con
+    resolución de un segundo) de un flujo
+    """
+    stamp = version.updated_at.isoformat() if version.updated_at else ""
+    step_types = reference_data_cache.step_types_version
+    digest = hashlib.sha1(f"{flow_id}:{version.revision}:{stamp}:{step_types}".encode("utf-8")).hexdigest()[:20]
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "no-cache"}
+    if version.updated_at:
+        # MySQL guarda DATETIME sin zona horaria; se interpreta como UTC
+        updated_at = version.updated_at
+        last_modified = updated_at if updated_at.tzinfo else updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparar If-None-Match (lista separada por comas, admite W/ y *) con el ETag actual"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        (tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates
+    )
+
 @router.get("/step-types", summary="Obtener tipos de pasos")
 async def get_step_types(db: Session = Depends(get_db)):
     """Obtener todos los tipos de pasos médicos"""
@@ -152,6 +229,24 @@ async def get_urgency_levels(db: Session = Depends(get_db)):
         logger.error(f"Error obteniendo niveles de urgencia: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@router.post("/reference-data/refresh", summary="Recargar datos de referencia")
+async def refresh_reference_data(db: Session = Depends(get_db)):
+    """
+    Recargar el caché de tipos de pasos, niveles de urgencia y especialidades.
+    Usar después de modificar esos catálogos directamente en la base de datos.
+    """
+    try:
+        service = MedicalFlowService(db)
+        counts = service.refresh_reference_data()
+
+        return {
+            "success": True,
+            "data": counts
+        }
+    except Exception as e:
+        logger.error(f"Error recargando datos de referencia: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @router.get("/referral-criteria", summary="Obtener criterios de referencia")
 async def get_referral_criteria(
     specialty_id: Optional[str] = Query(None, description="Filtrar por especialidad"),
@@ -193,6 +288,24 @@ async def get_flow_statistics(db: Session = Depends(get_db)):
         logger.error(f"Error obteniendo estadísticas: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@router.post("/statistics/refresh", summary="Recalcular estadísticas de flujos")
+async def refresh_flow_statistics(db: Session = Depends(get_db)):
+    """
+    Recalcular el resumen de estadísticas desde flows, flow_nodes y flow_edges_rel.
+    Necesario después de cargas o migraciones hechas directamente en la base de datos.
+    """
+    try:
+        service = MedicalFlowService(db)
+        stats = service.refresh_flow_statistics()
+
+        return {
+            "success": True,
+            "data": stats
+        }
+    except Exception as e:
+        logger.error(f"Error recalculando estadísticas: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @router.get("/flows/{flow_id}/nodes", summary="Obtener nodos de un flujo")
 async def get_flow_nodes(flow_id: str, db: Session = Depends(get_db)):
     """Obtener todos los nodos de un flujo específico"""
@@ -237,16 +350,130 @@ async def get_flow_edges(flow_id: str, db: Session = Depends(get_db)):
         logger.error(f"Error obteniendo conexiones del flujo {flow_id}: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@router.get("/path-analytics", summary="Analítica de rutas de todos los flujos")
+async def get_path_analytics(
+    flow_ids: Optional[str] = Query(None, description="IDs de flujos separados por coma (por defecto todos los activos)"),
+    include_paths: bool = Query(False, description="Incluir los IDs de nodos de cada ruta"),
+    db: Session = Depends(get_db)
+):
+    """
+    Ruta crítica (mayor duración), rutas de menor y mayor costo, número de rutas
+    y puntos de ramificación de cada flujo, calculados en lote
+    """
+    try:
+        service = MedicalFlowService(db)
+        ids = [flow_id.strip() for flow_id in flow_ids.split(",") if flow_id.strip()] if flow_ids else None
+        # Cálculo síncrono con caché (puede esperar a otro worker): fuera del event loop
+        results = await run_in_threadpool(service.get_path_analytics, ids, include_paths=include_paths)
+
+        return {
+            "success": True,
+            "data": results,
+            "count": len(results)
+        }
+    except Exception as e:
+        logger.error(f"Error calculando analítica de rutas: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@router.get("/flows/{flow_id}/path-analytics", summary="Analítica de rutas de un flujo")
+async def get_flow_path_analytics(flow_id: str, db: Session = Depends(get_db)):
+    """Ruta crítica y rutas de costo de un flujo, con los nodos de cada ruta"""
+    try:
+        service = MedicalFlowService(db)
+        results = await run_in_threadpool(service.get_path_analytics, [flow_id], include_paths=True)
+
+        if not results:
+            raise HTTPException(status_code=404, detail="Flujo no encontrado")
+
+        return {
+            "success": True,
+            "data": results[0]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculando analítica de rutas del flujo {flow_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@router.post("/flows/{flow_id}/simulate", summary="Simular costo y duración de un flujo")
+async def simulate_flow(
+    flow_id: str,
+    iterations: int = Query(10_000, ge=1, description="Número de recorridos simulados"),
+    seed: Optional[int] = Query(None, description="Semilla para resultados reproducibles"),
+    branch_probabilities: Optional[Dict[str, Dict[str, float]]] = Body(
+        None,
+        embed=True,
+        alias="branchProbabilities",
+        description="Probabilidad de cada rama: {source_node_id: {target_node_id: probabilidad}}"
+    ),
+    db: Session = Depends(get_db)
+):
+    """
+    Simulación Monte Carlo: costo de cada paso triangular entre cost_min y
+    cost_max alrededor de cost_avg, y una rama elegida en cada bifurcación.
+    Retorna P50/P90/P99 de costo y duración totales del flujo.
+    """
+    try:
+        service = MedicalFlowService(db)
+        result = service.simulate_flow(
+            flow_id,
+            iterations=iterations,
+            seed=seed,
+            branch_probabilities=branch_probabilities
+        )
+
+        if not result:
+            raise HTTPException(status_code=404, detail="Flujo no encontrado")
+
+        return {
+            "success": True,
+            "data": result
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error simulando flujo {flow_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @router.put("/flows/{flow_id}", summary="Actualizar flujo médico")
 async def update_flow(
     flow_id: str,
+    response: Response,
     flow_data: Dict[str, Any] = Body(...),
+    autosave: bool = Query(False, description="Agrupar cambios sucesivos y escribirlos tras un periodo sin actividad"),
     db: Session = Depends(get_db)
 ):
-    """Actualizar un flujo médico, incluyendo posiciones de nodos"""
+    """
+    Actualizar un flujo médico, incluyendo posiciones y atributos de nodos.
+    
+    Retorna solo los campos que cambiaron. Con `autosave=true` los cambios se
+    validan, se acumulan en memoria y se escriben juntos (202 Accepted). Un
+    valor inválido responde 422 y un flujo inexistente 404.
+    """
     try:
         service = MedicalFlowService(db)
-        result = service.update_flow(flow_id, flow_data)
+        # Validar antes de tocar los cambios pendientes: un payload inválido no los descarta
+        if not service.validate_update(flow_id, flow_data):
+            raise HTTPException(status_code=404, detail="Flujo no encontrado")
+        
+        if autosave:
+            response.status_code = 202
+            return {
+                "success": True,
+                "data": flow_autosave_buffer.submit(flow_id, flow_data)
+            }
+        
+        # Un guardado explícito incluye y reemplaza los cambios aún pendientes de autoguardado
+        flow_data = flow_autosave_buffer.take(flow_id, flow_data)
+        
+        try:
+            result = service.update_flow(flow_id, flow_data)
+        except Exception:
+            # La escritura falló: los cambios quedan pendientes para no perderlos
+            flow_autosave_buffer.restore(flow_id, flow_data)
+            raise
         
         if not result:
             raise HTTPException(status_code=404, detail="Flujo no encontrado")
@@ -257,7 +484,8 @@ async def update_flow(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Error actualizando flujo {flow_id}: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
-
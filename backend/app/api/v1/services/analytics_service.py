@@ -5,9 +5,10 @@ Servicio de analítica y predicciones mejorado con datos reales de flujos médic
 import numpy as np
 import pandas as pd
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from fastapi.concurrency import run_in_threadpool
 import structlog
 
 from ..models.analytics import (
@@ -15,6 +16,11 @@ from ..models.analytics import (
     AnalyticsReport, AnalyticsRequest, TimePeriod, TrendDirection
 )
 from app.core.database import get_db
+from app.core.result_cache import cached
+from app.services.demand_forecast_service import predict_demand, predict_demand_batch
+from app.services.cost_forecast_service import predict_cost
+from app.services.flow_metrics_history_service import FlowMetricsHistoryService
+from app.services.capacity_planning_service import CapacityPlanningService
 
 logger = structlog.get_logger()
 
@@ -24,235 +30,126 @@ class AnalyticsService:
     def __init__(self, db: Session):
         self.db = db
     
+    @cached("analytics:demand_predictions", ttl="PREDICTION_CACHE_TTL")
     async def get_demand_predictions(
         self, 
         specialty_ids: Optional[List[str]] = None,
         prediction_horizon: int = 30
     ) -> List[Dict[str, Any]]:
-        """Generar predicciones de demanda por especialidad usando datos reales"""
-        
+        """
+        Predicciones de demanda por especialidad para los próximos
+        `prediction_horizon` días, con el modelo de series de tiempo ajustado
+        sobre la actividad clínica de Bienimed (ver demand_forecast_service).
+        El ajuste y la evaluación corren en el pool de hilos: en frío el
+        ajuste recorre toda la historia. Los ids de especialidad no numéricos
+        se ignoran. Un horizonte inválido lanza ValueError.
+        """
+        ids = [int(specialty_id) for specialty_id in specialty_ids or [] if str(specialty_id).isdigit()]
+        if specialty_ids and not ids:
+            return []
         try:
-            # Obtener especialidades con flujos agrupados
-            query = """
-            SELECT 
-                COALESCE(f.specialty_id, 'general') as specialty_id,
-                COALESCE(f.specialty_name, 'General') as specialty_name,
-                COUNT(DISTINCT f.id) as flow_count,
-                COUNT(DISTINCT fn.id) as total_steps,
-                AVG(f.average_duration) as avg_duration,
-                AVG(f.estimated_cost) as avg_cost,
-                SUM(f.average_duration) as total_duration
-            FROM flows f
-            LEFT JOIN flow_nodes fn ON fn.flow_id = f.id
-            WHERE f.is_active = 1 
-              AND f.specialty_name IS NOT NULL
-              AND f.specialty_name != 'Sin especialidad'
-            GROUP BY specialty_id, specialty_name
-            HAVING flow_count > 0
-            ORDER BY flow_count DESC, specialty_name
-            """
-            
-            result = self.db.execute(text(query))
-            specialty_data = result.fetchall()
-            
-            predictions = []
-            
-            for row in specialty_data:
-                specialty_id, specialty_name, flow_count, total_steps, avg_duration, avg_cost, total_duration = row
-                
-                # Generar predicción basada en datos reales
-                # Base demand proporcional al número de flujos
-                base_demand = flow_count * 30  # ~30 pacientes por flujo al mes
-                
-                # Factor estacional (varía según mes del año)
-                month = datetime.now().month
-                seasonal_factor = 1 + 0.15 * np.sin(2 * np.pi * (month - 3) / 12)
-                
-                # Factor de crecimiento (basado en complejidad)
-                if avg_duration and avg_duration > 90:
-                    growth_factor = 1.15  # Especialidades complejas crecen más
-                elif avg_duration and avg_duration < 45:
-                    growth_factor = 1.05  # Especialidades rápidas crecen menos
-                else:
-                    growth_factor = 1.10
-                
-                # Predicción con variación aleatoria pequeña
-                predicted_demand = int(base_demand * seasonal_factor * growth_factor * np.random.uniform(0.9, 1.1))
-                
-                # Confianza basada en cantidad de datos
-                if flow_count >= 5:
-                    confidence = np.random.uniform(85, 95)
-                elif flow_count >= 3:
-                    confidence = np.random.uniform(75, 85)
-                else:
-                    confidence = np.random.uniform(65, 75)
-                
-                # Calcular factores de influencia
-                historical_average = predicted_demand / (seasonal_factor * growth_factor)
-                variability = np.std([predicted_demand * np.random.uniform(0.9, 1.1) for _ in range(10)])
-                
-                predictions.append({
-                    "specialty_id": specialty_id,
-                    "specialty_name": specialty_name,
-                    "predicted_demand": predicted_demand,
-                    "confidence_level": confidence / 100,  # Convertir a decimal (0-1)
-                    "prediction_date": datetime.now().isoformat(),
-                    "time_period": 'monthly',
-                    "factors": {
-                        "historical_average": round(historical_average, 1),
-                        "seasonal_factor": round(seasonal_factor, 2),
-                        "variability": round(variability, 1)
-                    }
-                })
-            
-            return predictions
-            
+            return await run_in_threadpool(predict_demand, prediction_horizon, ids or None)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error generating demand predictions: {e}")
             return []
     
+    @cached("analytics:demand_predictions_batch", ttl="PREDICTION_CACHE_TTL")
+    async def get_demand_predictions_batch(
+        self,
+        requests: List[Tuple[int, int, Optional[str]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Predicciones de demanda de varias configuraciones (especialidad,
+        horizonte, periodo) en el orden recibido, con una sola carga del
+        modelo y una sola evaluación del pronóstico (en el pool de hilos). Un
+        horizonte o periodo inválido lanza ValueError.
+        """
+        return await run_in_threadpool(predict_demand_batch, requests)
+    
+    @cached("analytics:cost_predictions", ttl="PREDICTION_CACHE_TTL")
+    async def get_cost_predictions(
+        self,
+        center_ids: Optional[List[int]] = None,
+        prediction_horizon: int = 30
+    ) -> List[Dict[str, Any]]:
+        """
+        Monto facturado pronosticado por centro para los próximos
+        `prediction_horizon` días (ver cost_forecast_service). Un horizonte
+        inválido lanza ValueError.
+        """
+        try:
+            return await run_in_threadpool(predict_cost, prediction_horizon, center_ids or None)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating cost predictions: {e}")
+            return []
+    
+    @cached("analytics:trend_analysis", ttl="PREDICTION_CACHE_TTL")
     async def get_trend_analysis(
         self,
         specialty_ids: Optional[List[str]] = None,
         time_period: TimePeriod = TimePeriod.MONTHLY
     ) -> List[Dict[str, Any]]:
-        """Análisis de tendencias usando datos reales de flujos"""
-        
+        """
+        Tendencias de costo, duración, flujos y pasos por especialidad a partir
+        del historial de métricas de flujos (ver flow_metrics_history_service).
+        Un periodo inválido lanza ValueError.
+        """
         try:
-            # Obtener métricas de flujos médicos desde tabla unificada
-            query = """
-            SELECT 
-                COALESCE(f.specialty_id, 'general') as specialty_id,
-                COALESCE(f.specialty_name, 'General') as specialty_name,
-                AVG(f.average_duration) as avg_duration,
-                AVG(f.estimated_cost) as avg_cost,
-                COUNT(DISTINCT f.id) as flow_count,
-                COUNT(fn.id) as total_steps
-            FROM flows f
-            LEFT JOIN flow_nodes fn ON fn.flow_id = f.id
-            WHERE f.is_active = 1 
-              AND f.specialty_name IS NOT NULL
-              AND f.specialty_name != 'Sin especialidad'
-            GROUP BY f.specialty_id, f.specialty_name
-            HAVING flow_count > 0
-            ORDER BY f.specialty_name
-            """
-            
-            result = self.db.execute(text(query))
-            trends_data = result.fetchall()
-            
-            analyses = []
-            for row in trends_data:
-                specialty_id, specialty_name, avg_duration, avg_cost, flow_count, total_steps = row
-                
-                # Simular análisis de tendencias
-                current_value = float(avg_cost) if avg_cost else 0
-                previous_value = current_value * (1 + np.random.normal(-0.05, 0.15))
-                change_percentage = ((current_value - previous_value) / previous_value) * 100 if previous_value != 0 else 0
-                
-                trend_strength = min(100, max(0, abs(change_percentage) * 2))
-                
-                analyses.append({
-                    "specialty_id": specialty_id,
-                    "specialty_name": specialty_name,
-                    "metric_name": "Costo Promedio por Flujo",
-                    "current_value": round(current_value, 2),
-                    "previous_value": round(previous_value, 2),
-                    "change_percentage": round(change_percentage, 1),
-                    "trend_strength": round(trend_strength, 1),
-                    "trend_direction": "increasing" if change_percentage > 0 else "decreasing",
-                    "data_points": flow_count,
-                    "analysis_date": datetime.now().isoformat()
-                })
-            
-            return analyses
-            
+            return await run_in_threadpool(
+                FlowMetricsHistoryService(self.db).get_trends,
+                getattr(time_period, "value", time_period), specialty_ids or None
+            )
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error generating trend analysis: {e}")
             return []
     
+    @cached("analytics:resource_optimization", ttl="PREDICTION_CACHE_TTL")
     async def get_resource_optimization(
         self,
-        specialty_ids: Optional[List[str]] = None
+        specialty_ids: Optional[List[str]] = None,
+        prediction_horizon: int = 30
     ) -> List[Dict[str, Any]]:
-        """Optimización de recursos basada en datos reales"""
-        
+        """
+        Utilización por centro y recurso con la demanda pronosticada de los
+        próximos `prediction_horizon` días: reparto parejo entre centros
+        contra el plan de capacidad, con unidades faltantes u ociosas y
+        recomendaciones (ver capacity_planning_service). Un horizonte inválido
+        lanza ValueError.
+        """
+        return (await self.get_capacity_plan(specialty_ids, prediction_horizon))["items"]
+    
+    @cached("analytics:capacity_plan", ttl="PREDICTION_CACHE_TTL")
+    async def get_capacity_plan(
+        self,
+        specialty_ids: Optional[List[str]] = None,
+        prediction_horizon: int = 30
+    ) -> Dict[str, Any]:
+        """
+        Plan de capacidad completo: resumen, reparto de pacientes por
+        especialidad y centro y utilización por centro y recurso. Las
+        lecturas, el pronóstico y el solver corren en el pool de hilos. Los
+        ids de especialidad no numéricos se ignoran. Un horizonte inválido
+        lanza ValueError.
+        """
+        ids = [int(specialty_id) for specialty_id in specialty_ids or [] if str(specialty_id).isdigit()]
+        if specialty_ids and not ids:
+            return {"summary": {}, "allocations": [], "items": []}
         try:
-            # Obtener datos de utilización de recursos por especialidad desde tabla unificada
-            query = """
-            SELECT 
-                COALESCE(f.specialty_id, 'general') as specialty_id,
-                COALESCE(f.specialty_name, 'General') as specialty_name,
-                COUNT(DISTINCT f.id) as flow_count,
-                AVG(f.average_duration) as avg_duration,
-                AVG(f.estimated_cost) as avg_cost,
-                COUNT(fn.id) as total_steps,
-                AVG(fn.duration_minutes) as avg_step_duration,
-                AVG(fn.cost_avg) as avg_step_cost
-            FROM flows f
-            LEFT JOIN flow_nodes fn ON fn.flow_id = f.id
-            WHERE f.is_active = 1 
-              AND f.specialty_name IS NOT NULL
-              AND f.specialty_name != 'Sin especialidad'
-            GROUP BY f.specialty_id, f.specialty_name
-            HAVING flow_count > 0
-            ORDER BY f.specialty_name
-            """
-            
-            result = self.db.execute(text(query))
-            resources_data = result.fetchall()
-            
-            optimizations = []
-            for row in resources_data:
-                specialty_id, specialty_name, flow_count, avg_duration, avg_cost, total_steps, avg_step_duration, avg_step_cost = row
-                
-                # Calcular métricas de optimización
-                current_utilization = min(100, max(20, np.random.uniform(60, 90)))
-                optimal_utilization = min(95, current_utilization + np.random.uniform(5, 15))
-                
-                potential_savings = float(avg_cost) * (optimal_utilization - current_utilization) / 100 if avg_cost else 0
-                
-                # Generar recomendaciones basadas en datos reales
-                recommendations = []
-                if avg_duration and avg_duration > 60:
-                    recommendations.append(f"Reducir duración promedio de {avg_duration:.0f} minutos optimizando pasos redundantes")
-                
-                if avg_step_cost and avg_step_cost > 50:
-                    recommendations.append(f"Optimizar costos por paso que actualmente promedian ${avg_step_cost:.0f}")
-                
-                if total_steps and total_steps > 5:
-                    recommendations.append(f"Simplificar flujo eliminando pasos innecesarios (actualmente {total_steps} pasos)")
-                
-                if current_utilization < 70:
-                    recommendations.append("Aumentar utilización de recursos mediante mejor programación")
-                
-                if not recommendations:
-                    recommendations.append("El flujo actual está bien optimizado")
-                
-                priority = "high" if potential_savings > 100 else "medium" if potential_savings > 50 else "low"
-                
-                optimizations.append({
-                    "specialty_id": specialty_id,
-                    "specialty_name": specialty_name,
-                    "resource_type": "Flujo Médico Completo",
-                    "current_utilization": round(current_utilization / 100, 2),
-                    "optimal_utilization": round(optimal_utilization / 100, 2),
-                    "potential_savings": round(potential_savings, 2),
-                    "implementation_priority": priority,
-                    "recommendations": recommendations,
-                    "flow_count": flow_count,
-                    "avg_duration": avg_duration,
-                    "avg_cost": float(avg_cost) if avg_cost else 0,
-                    "total_steps": total_steps,
-                    "analysis_date": datetime.now().isoformat()
-                })
-            
-            return optimizations
-            
+            return await run_in_threadpool(CapacityPlanningService(self.db).plan, prediction_horizon, ids or None)
+        except ValueError:
+            raise
         except Exception as e:
-            logger.error(f"Error generating resource optimization: {e}")
-            return []
+            logger.error(f"Error generating capacity plan: {e}")
+            return {"summary": {}, "allocations": [], "items": []}
     
+    # Sin flujos el servicio devuelve ceros (también cuando la consulta falla); eso no se guarda
+    @cached("analytics:dashboard_metrics", ttl="PREDICTION_CACHE_TTL", cache_if=lambda metrics: bool(metrics.get("total_flows")))
     async def get_dashboard_metrics(self) -> Dict[str, Any]:
         """Métricas del dashboard usando datos reales de la tabla unificada"""
         
@@ -0,0 +1,161 @@
+"""
+Cachés en memoria del proceso
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import threading
+import time
+
+
+class VersionedCache:
+    """
+    Caché LRU cuyas entradas guardan la versión del dato (por ejemplo `updated_at`).
+
+    Una lectura solo acierta si la versión pedida coincide con la guardada, así
+    que un cambio de versión en la base de datos invalida la entrada sin
+    necesidad de avisar al caché.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        """Obtener el valor si existe para esa versión exacta"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, version: Hashable, value: Any) -> None:
+        """Guardar un valor con su versión, descartando el menos usado si se llena"""
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Eliminar una entrada"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Vaciar el caché"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Métricas de uso del caché"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class SnapshotCache:
+    """
+    Caché de un único valor calculado por `loader` (una instantánea).
+
+    Sirve con stale-while-revalidate: mientras la instantánea tenga menos de
+    `ttl_seconds` se retorna tal cual; entre `ttl_seconds` y `max_stale_seconds`
+    se retorna la copia vieja y se recalcula en un hilo de fondo; más vieja que
+    eso (o si no existe) se recalcula en la misma llamada. Solo hay un cálculo
+    en curso a la vez: las llamadas concurrentes esperan ese resultado.
+    """
+
+    def __init__(self, loader: Callable[[], Any], ttl_seconds: float, max_stale_seconds: float, name: str = "snapshot"):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max(max_stale_seconds, ttl_seconds)
+        self.name = name
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Segundos desde el último cálculo (None si nunca se calculó)"""
+        return None if self._loaded_at is None else time.monotonic() - self._loaded_at
+
+    def get(self) -> Any:
+        """Obtener la instantánea según su antigüedad (ver docstring de la clase)"""
+        age = self.age
+        if age is not None and age < self.ttl_seconds:
+            self.hits += 1
+            return self._value
+        if age is not None and age < self.max_stale_seconds:
+            self.stale_hits += 1
+            self.refresh_in_background()
+            return self._value
+        self.misses += 1
+        return self.refresh()
+
+    def refresh(self) -> Any:
+        """Recalcular ahora; si ya hay un cálculo en curso, esperar su resultado"""
+        loaded_at = self._loaded_at
+        with self._refresh_lock:
+            # Otro hilo terminó un cálculo mientras se esperaba el candado
+            if self._loaded_at != loaded_at:
+                return self._value
+            self._refreshing = True
+            try:
+                value = self.loader()
+            except Exception as e:
+                self.refresh_errors += 1
+                self.last_error = str(e)
+                raise
+            finally:
+                self._refreshing = False
+            self._value, self._loaded_at = value, time.monotonic()
+            self.last_error = None
+            return value
+
+    def refresh_in_background(self) -> None:
+        """Recalcular en un hilo de fondo si no hay otro cálculo en curso"""
+        if self._refreshing or self._refresh_lock.locked():
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                # El error queda en `last_error`; se sigue sirviendo la copia anterior
+                pass
+
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def invalidate(self) -> None:
+        """Descartar la instantánea; la siguiente lectura la recalcula"""
+        self._value, self._loaded_at = None, None
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de uso del caché"""
+        age = self.age
+        return {
+            "loaded": self._loaded_at is not None,
+            "age_seconds": None if age is None else round(age, 1),
+            "ttl_seconds": self.ttl_seconds,
+            "max_stale_seconds": self.max_stale_seconds,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "last_error": self.last_error
+        }
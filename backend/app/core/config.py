@@ -53,7 +53,35 @@ class Settings(BaseSettings):
     
     # Analítica
     ML_MODEL_PATH: str = "/app/models"
+    ML_MODEL_CHECK_SECONDS: int = 30  # Cada cuánto se revisa si hay otra versión activa de un modelo
+    ML_MODEL_KEEP_VERSIONS: int = 5  # Versiones de cada modelo que se conservan al publicar una nueva
     PREDICTION_CACHE_TTL: int = 300  # 5 minutos
+    DASHBOARD_STATS_TTL: int = 60  # Antigüedad con la que el dashboard se sirve sin recalcular
+    DASHBOARD_STATS_MAX_STALE: int = 900  # Hasta aquí se sirve la copia vieja mientras se recalcula
+    REVENUE_ROLLUP_INTERVAL: int = 300  # Segundos entre actualizaciones de los agregados de facturación (0 = desactivado)
+    REVENUE_ROLLUP_LOOKBACK_DAYS: int = 3  # Días recientes que se recalculan en cada pasada (ediciones tardías)
+    FLOW_METRICS_SNAPSHOT_INTERVAL: int = 3600  # Segundos entre revisiones de la instantánea diaria de métricas de flujos (0 = desactivado)
+    RESOURCE_MINUTES_PER_DAY: int = 480  # Minutos de atención por día de cada unidad de recurso (planificación de capacidad)
+    CLINICAL_ROLLUP_INTERVAL: int = 300  # Segundos entre actualizaciones de los agregados de actividad clínica (0 = desactivado)
+    CLINICAL_ROLLUP_LOOKBACK_DAYS: int = 3  # Días recientes de actividad clínica que se recalculan en cada pasada (confirmaciones tardías)
+    RESULT_CACHE_ENABLED: bool = True  # Caché de resultados de analítica (Redis o memoria del proceso)
+    RESULT_CACHE_MAX_ENTRIES: int = 2000  # Entradas del LRU en memoria cuando Redis no está habilitado
+    RESULT_CACHE_LOCK_TIMEOUT: int = 30  # Espera máxima por el cálculo de otro proceso (segundos)
+    BIENIMED_ANALYTICS_CACHE_TTL: int = 300  # Analítica de Bienimed (flujo de pacientes, médicos, facturación)
+    FLOW_ANALYTICS_CACHE_TTL: int = 300  # Rutas críticas y de costo de los flujos médicos
+    DEMAND_FORECAST_HISTORY_DAYS: int = 730  # Días de actividad clínica con los que se ajusta el pronóstico de demanda
+    DEMAND_FORECAST_REFIT_SECONDS: int = 3600  # Antigüedad de los parámetros ajustados antes de reajustar en segundo plano
+    DEMAND_FORECAST_MAX_STALE: int = 86400  # Hasta aquí se pronostica con los parámetros viejos mientras se reajustan
+    
+    # Búsqueda de flujos
+    FLOW_SEARCH_INDEX_TTL: int = 600  # Reconstrucción completa del índice cada 10 minutos (0 = nunca)
+    FLOW_CATALOG_TTL: int = 600  # Reconstrucción completa del catálogo en memoria (0 = nunca)
+    FLOW_DETAIL_CACHE_MAX_ENTRIES: int = 1000  # Documentos de flujo completos en caché
+    FLOW_AUTOSAVE_DEBOUNCE_MS: int = 1000  # Inactividad antes de escribir un autoguardado
+    FLOW_AUTOSAVE_MAX_WAIT_MS: int = 5000  # Espera máxima de cambios pendientes
+    REFERENCE_DATA_TTL: int = 3600  # Recarga de catálogos (tipos de paso, urgencias, especialidades)
+    FLOW_SIMULATION_MAX_ITERATIONS: int = 200_000  # Iteraciones máximas por simulación Monte Carlo
+    FLOW_SIMULATION_CACHE_MAX_ENTRIES: int = 500  # Flujos con simulaciones en caché
     
     # Logging
     LOG_LEVEL: str = "INFO"
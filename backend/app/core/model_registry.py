@@ -0,0 +1,265 @@
+"""
+Almacén de artefactos de modelos bajo ML_MODEL_PATH
+
+Cada versión de un modelo es un directorio inmutable con un .npy por arreglo y
+un meta.json; el archivo CURRENT de cada modelo apunta a la versión activa y se
+reemplaza de forma atómica (os.replace). Los procesos cargan la versión activa
+en el primer uso con np.load(mmap_mode="r"): las páginas de los arreglos son
+del caché de archivos del sistema operativo, así que todos los workers
+comparten la misma memoria en lugar de tener cada uno su copia. Cada lectura
+revisa el puntero (a lo sumo cada ML_MODEL_CHECK_SECONDS) y cambia de versión
+sin reiniciar el worker.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import numpy as np
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+CURRENT_POINTER = "CURRENT"
+META_FILE = "meta.json"
+# Nombres de modelo y de arreglo: se usan como nombres de archivo
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+class ModelArtifact(NamedTuple):
+    """Versión cargada de un modelo: arreglos (memoria mapeada, solo lectura) y metadatos"""
+    name: str
+    version: str
+    arrays: Dict[str, np.ndarray]
+    meta: Dict[str, Any]
+
+
+class _LoadedModel:
+    """Estado por modelo dentro del proceso"""
+
+    def __init__(self):
+        self.artifact: Optional[ModelArtifact] = None
+        self.pointer_stamp: Optional[Tuple[int, int]] = None
+        self.checked_at: Optional[float] = None
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+
+
+class ModelRegistry:
+    """
+    Publicación y carga de versiones de modelos.
+
+    `publish` escribe la versión en un directorio temporal, lo renombra a su
+    nombre definitivo y después mueve el puntero CURRENT: un lector nunca ve
+    una versión a medio escribir. `get` carga la versión activa de forma
+    perezosa y la cambia cuando el puntero cambia; los requests en curso
+    siguen usando la versión que ya tenían.
+    """
+
+    def __init__(self, root: Optional[str] = None, check_interval: Optional[float] = None):
+        self.root = root or settings.ML_MODEL_PATH
+        self.check_interval = settings.ML_MODEL_CHECK_SECONDS if check_interval is None else check_interval
+        self._models: Dict[str, _LoadedModel] = {}
+        self._lock = threading.Lock()
+
+    # -- Escritura (entrenamiento fuera de línea) ----------------------------
+
+    def publish(self, name: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], activate: bool = True) -> str:
+        """
+        Guardar una versión nueva del modelo y, con `activate`, convertirla en
+        la versión activa. Los arreglos se guardan sin comprimir para poder
+        mapearlos en memoria. Retorna el identificador de la versión.
+        """
+        self._check_name(name)
+        for array_name in arrays:
+            self._check_name(array_name)
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+
+        version = datetime.now().strftime("%Y%m%d-%H%M%S")
+        suffix = 1
+        while os.path.exists(os.path.join(model_dir, version)):
+            suffix += 1
+            version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+        staging = os.path.join(model_dir, f".tmp-{version}-{os.getpid()}")
+        os.makedirs(staging)
+        try:
+            for array_name, values in arrays.items():
+                np.save(os.path.join(staging, f"{array_name}.npy"), np.ascontiguousarray(values), allow_pickle=False)
+            document = {
+                **meta,
+                "name": name,
+                "version": version,
+                "created_at": datetime.now().isoformat(),
+                "arrays": sorted(arrays),
+            }
+            with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as handle:
+                json.dump(document, handle, ensure_ascii=False, indent=2)
+            os.rename(staging, os.path.join(model_dir, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(name, version)
+        logger.info("Model version published", model=name, version=version, active=activate)
+        return version
+
+    def activate(self, name: str, version: str) -> None:
+        """Apuntar CURRENT a una versión existente (reemplazo atómico del puntero)"""
+        self._check_name(name)
+        if not os.path.isfile(os.path.join(self._model_dir(name), version, META_FILE)):
+            raise ValueError(f"No existe la versión {version} del modelo {name}")
+        pointer = os.path.join(self._model_dir(name), CURRENT_POINTER)
+        staging = f"{pointer}.tmp-{os.getpid()}"
+        with open(staging, "w", encoding="utf-8") as handle:
+            handle.write(version)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(staging, pointer)
+
+    def prune(self, name: str, keep: Optional[int] = None) -> List[str]:
+        """
+        Borrar las versiones más viejas dejando `keep` (nunca la activa). Un
+        worker que aún tenga mapeada una versión borrada la sigue leyendo
+        hasta cambiar de versión.
+        """
+        keep = settings.ML_MODEL_KEEP_VERSIONS if keep is None else keep
+        current = self.current_version(name)
+        removed = []
+        for version in self.versions(name)[keep:]:
+            if version["version"] != current:
+                shutil.rmtree(os.path.join(self._model_dir(name), version["version"]), ignore_errors=True)
+                removed.append(version["version"])
+        return removed
+
+    # -- Lectura ------------------------------------------------------------
+
+    def current_version(self, name: str) -> Optional[str]:
+        """Versión a la que apunta CURRENT (None si el modelo no se ha publicado)"""
+        try:
+            with open(os.path.join(self._model_dir(name), CURRENT_POINTER), encoding="utf-8") as handle:
+                return handle.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self, name: str) -> List[Dict[str, Any]]:
+        """Metadatos de las versiones guardadas, de la más reciente a la más vieja"""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        current = self.current_version(name)
+        versions = []
+        for entry in os.listdir(model_dir):
+            meta_path = os.path.join(model_dir, entry, META_FILE)
+            if entry.startswith(".") or not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, encoding="utf-8") as handle:
+                meta = json.load(handle)
+            versions.append({
+                "version": entry,
+                "created_at": meta.get("created_at"),
+                "active": entry == current,
+                "summary": meta.get("summary", {}),
+            })
+        versions.sort(key=lambda version: (version["created_at"] or "", version["version"]), reverse=True)
+        return versions
+
+    def get(self, name: str) -> Optional[ModelArtifact]:
+        """
+        Versión activa del modelo (None si no hay ninguna publicada). Carga en
+        el primer uso y cambia de versión cuando cambia el puntero; si la
+        versión nueva no se puede cargar se sigue sirviendo la anterior.
+        """
+        with self._lock:
+            state = self._models.setdefault(name, _LoadedModel())
+        now = time.monotonic()
+        if state.checked_at is not None and now - state.checked_at < self.check_interval:
+            return state.artifact
+
+        with self._lock:
+            if state.checked_at is not None and time.monotonic() - state.checked_at < self.check_interval:
+                return state.artifact
+            state.checked_at = time.monotonic()
+            stamp = self._pointer_stamp(name)
+            if stamp == state.pointer_stamp:
+                return state.artifact
+
+            version = self.current_version(name)
+            if version is None:
+                state.artifact, state.pointer_stamp = None, stamp
+                return None
+            if state.artifact is not None and state.artifact.version == version:
+                state.pointer_stamp = stamp
+                return state.artifact
+            try:
+                artifact = self._load(name, version)
+            except Exception as e:
+                state.last_error = str(e)
+                logger.error("Error loading model version", model=name, version=version, error=str(e))
+                return state.artifact
+            # Cambio atómico de referencia: los lectores ven la versión vieja o la nueva
+            previous = state.artifact
+            state.artifact, state.pointer_stamp, state.last_error = artifact, stamp, None
+            state.swaps += 1
+            logger.info(
+                "Model version loaded",
+                model=name, version=version, previous=previous.version if previous else None
+            )
+            return artifact
+
+    def stats(self, name: str) -> Dict[str, Any]:
+        """Versión cargada en este proceso y versión activa en disco"""
+        state = self._models.get(name)
+        artifact = state.artifact if state else None
+        return {
+            "model": name,
+            "active_version": self.current_version(name),
+            "loaded_version": artifact.version if artifact else None,
+            "swaps": state.swaps if state else 0,
+            "last_error": state.last_error if state else None,
+            "check_interval_seconds": self.check_interval,
+        }
+
+    # -- Internos -----------------------------------------------------------
+
+    def _load(self, name: str, version: str) -> ModelArtifact:
+        version_dir = os.path.join(self._model_dir(name), version)
+        with open(os.path.join(version_dir, META_FILE), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        arrays = {}
+        for array_name in meta.get("arrays", []):
+            path = os.path.join(version_dir, f"{array_name}.npy")
+            try:
+                arrays[array_name] = np.load(path, mmap_mode="r", allow_pickle=False)
+            except ValueError:
+                # Un arreglo vacío no se puede mapear: se lee normal
+                arrays[array_name] = np.load(path, allow_pickle=False)
+        return ModelArtifact(name, version, arrays, meta)
+
+    def _pointer_stamp(self, name: str) -> Optional[Tuple[int, int]]:
+        """Inodo y fecha de modificación del puntero: cambian con cada os.replace"""
+        try:
+            stat = os.stat(os.path.join(self._model_dir(name), CURRENT_POINTER))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def _check_name(name: str) -> None:
+        if not _SAFE_NAME.match(name):
+            raise ValueError(f"Nombre no válido: {name}")
+
+
+# Registro compartido por la aplicación y el entrenamiento por línea de comandos
+model_registry = ModelRegistry()
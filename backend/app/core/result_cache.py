@@ -0,0 +1,567 @@
+"""
+Caché de resultados de analítica
+
+Guarda en Redis (cuando REDIS_ENABLED está activo) o en un LRU en memoria del
+proceso los resultados de las consultas de analítica. Las claves se agrupan por
+espacio de nombres para poder invalidarlas juntas, los TTL se toman de la
+configuración y solo un llamador calcula cada clave a la vez (protección contra
+estampidas): dentro del proceso con un candado por clave y entre procesos con
+un candado `SET NX` en Redis.
+
+Las funciones síncronas decoradas con `cached` pueden esperar el cálculo de
+otro llamador; desde código asíncrono se llaman en el pool de hilos
+(run_in_threadpool), nunca directamente en el event loop.
+"""
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Union
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+import uuid
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+KEY_PREFIX = "pj:cache"
+# Los diccionarios con claves que no son texto (ids numéricos) se guardan como pares
+KEYED_DICT_MARKER = "__pj_items__"
+LOCK_POLL_SECONDS = 0.05
+# Tras un error de Redis se usa la memoria durante este tiempo antes de reintentar
+REDIS_RETRY_SECONDS = 30
+
+# Libera el candado solo si sigue siendo nuestro (no lo tomó otro tras expirar)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _json_default(value: Any) -> Any:
+    """Serializar los tipos que devuelven las consultas de analítica"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "tolist"):
+        # Escalares y arreglos de numpy
+        return value.tolist()
+    raise TypeError(f"Tipo no serializable en caché: {type(value).__name__}")
+
+
+def _keep_key_types(value: Any) -> Any:
+    """
+    JSON solo admite claves de texto: los diccionarios con otras claves se
+    convierten en lista de pares para recuperar las claves originales (y su
+    orden) al leer
+    """
+    if isinstance(value, dict):
+        items = {key: _keep_key_types(item) for key, item in value.items()}
+        if all(isinstance(key, str) for key in items):
+            return items
+        return {KEYED_DICT_MARKER: [[key, item] for key, item in items.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_keep_key_types(item) for item in value]
+    return value
+
+
+def _restore_keyed_dict(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and KEYED_DICT_MARKER in value:
+        return {tuple(key) if isinstance(key, list) else key: item for key, item in value[KEYED_DICT_MARKER]}
+    return value
+
+
+def encode(value: Any) -> str:
+    return json.dumps(_keep_key_types(value), default=_json_default, separators=(",", ":"))
+
+
+def decode(payload: str) -> Any:
+    return json.loads(payload, object_hook=_restore_keyed_dict)
+
+
+def _params_digest(params: Dict[str, Any]) -> str:
+    """Huella de los parámetros de una llamada (independiente del orden de las claves)"""
+    payload = json.dumps(params, default=_json_default, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def has_value(value: Any) -> bool:
+    """
+    Criterio por defecto para guardar un resultado. Los servicios devuelven
+    listas o diccionarios vacíos cuando la consulta falla, así que esos no se
+    guardan para no fijar un error durante todo el TTL.
+    """
+    return value is not None and value != [] and value != {}
+
+
+class MemoryBackend:
+    """LRU en memoria con expiración por entrada"""
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, payload: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _KeyLocks:
+    """Candados por clave que se descartan cuando nadie los usa"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._locks: Dict[str, Tuple[Any, int]] = {}
+        self._guard = threading.Lock()
+
+    def _acquire_ref(self, key: str) -> Any:
+        with self._guard:
+            lock, refs = self._locks.get(key) or (self._factory(), 0)
+            self._locks[key] = (lock, refs + 1)
+            return lock
+
+    def _release_ref(self, key: str) -> None:
+        with self._guard:
+            lock, refs = self._locks[key]
+            if refs <= 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, refs - 1)
+
+    @contextmanager
+    def hold(self, key: str):
+        lock = self._acquire_ref(key)
+        try:
+            with lock:
+                yield
+        finally:
+            self._release_ref(key)
+
+    @asynccontextmanager
+    async def ahold(self, key: str):
+        lock = self._acquire_ref(key)
+        try:
+            async with lock:
+                yield
+        finally:
+            self._release_ref(key)
+
+
+class ResultCache:
+    """
+    Caché de resultados con respaldo en Redis o en memoria.
+
+    Los valores se guardan como JSON y todos los caminos (acierto, fallo y
+    caché desactivado) devuelven el valor decodificado, con la misma forma:
+    diccionarios con sus claves originales, listas y fechas como texto ISO.
+    """
+
+    def __init__(self, max_entries: int = 2000, lock_timeout: float = 30.0, enabled: bool = True):
+        self.enabled = enabled
+        self.lock_timeout = lock_timeout
+        self.memory = MemoryBackend(max_entries)
+        self._sync_redis = None
+        self._redis_retry_at = 0.0
+        self._thread_locks = _KeyLocks(threading.Lock)
+        self._async_locks = _KeyLocks(asyncio.Lock)
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    # Claves y métricas
+
+    @staticmethod
+    def namespace_prefix(namespace: str) -> str:
+        return f"{KEY_PREFIX}:{namespace}:"
+
+    def make_key(self, namespace: str, params: Dict[str, Any]) -> str:
+        return f"{self.namespace_prefix(namespace)}{_params_digest(params)}"
+
+    def _count(self, namespace: str, metric: str) -> None:
+        with self._stats_lock:
+            counters = self._stats.setdefault(
+                namespace, {"hits": 0, "misses": 0, "lock_waits": 0, "errors": 0, "not_stored": 0}
+            )
+            counters[metric] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Aciertos y fallos por espacio de nombres y backend en uso"""
+        with self._stats_lock:
+            namespaces = {name: dict(counters) for name, counters in self._stats.items()}
+        for counters in namespaces.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else None
+        hits = sum(counters["hits"] for counters in namespaces.values())
+        misses = sum(counters["misses"] for counters in namespaces.values())
+        return {
+            "enabled": self.enabled,
+            "backend": "redis" if self._redis_configured() else "memory",
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "namespaces": namespaces,
+        }
+
+    # Conexiones a Redis
+
+    def _redis_configured(self) -> bool:
+        return settings.REDIS_ENABLED and time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, namespace: str, error: Exception) -> None:
+        """Usar la memoria durante un tiempo tras un error de Redis"""
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+        self._count(namespace, "errors")
+        logger.warning("Result cache falling back to memory", namespace=namespace, error=str(error))
+
+    def _get_sync_redis(self):
+        """Cliente síncrono para las funciones síncronas (los servicios de Bienimed y flujos)"""
+        if not self._redis_configured():
+            return None
+        if self._sync_redis is None:
+            import redis
+
+            self._sync_redis = redis.Redis.from_url(
+                settings.REDIS_URL,
+                password=settings.REDIS_PASSWORD,
+                decode_responses=True,
+                encoding="utf-8"
+            )
+        return self._sync_redis
+
+    def _get_async_redis(self):
+        """Cliente asíncrono global inicializado en el arranque (app.core.redis)"""
+        if not self._redis_configured():
+            return None
+        from app.core.redis import get_redis
+
+        return get_redis()
+
+    # Lectura y escritura síncronas
+
+    def _read(self, client, namespace: str, key: str) -> Optional[str]:
+        if client is not None:
+            try:
+                return client.get(key)
+            except Exception as e:
+                self._redis_failed(namespace, e)
+        return self.memory.get(key)
+
+    def _write(self, client, namespace: str, key: str, payload: str, ttl: int) -> None:
+        if client is not None:
+            try:
+                client.set(key, payload, ex=ttl)
+                return
+            except Exception as e:
+                self._redis_failed(namespace, e)
+        self.memory.set(key, payload, ttl)
+
+    def _acquire_redis_lock(self, client, namespace: str, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Tomar el candado de cálculo entre procesos. Retorna (token, None) al
+        tomarlo, (None, valor) si otro proceso terminó mientras se esperaba y
+        (None, None) si se agotó la espera o Redis falló (se calcula sin candado).
+        """
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        waited = False
+        try:
+            while True:
+                if client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                    return token, None
+                if not waited:
+                    self._count(namespace, "lock_waits")
+                    waited = True
+                time.sleep(LOCK_POLL_SECONDS)
+                payload = client.get(key)
+                if payload is not None:
+                    return None, payload
+                if time.monotonic() >= deadline:
+                    return None, None
+        except Exception as e:
+            self._redis_failed(namespace, e)
+            return None, None
+
+    def _release_redis_lock(self, client, namespace: str, key: str, token: str) -> None:
+        try:
+            client.eval(_RELEASE_LOCK_SCRIPT, 1, f"{key}:lock", token)
+        except Exception as e:
+            self._redis_failed(namespace, e)
+
+    def get_or_compute(
+        self,
+        namespace: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+        ttl: int,
+        cache_if: Callable[[Any], bool] = has_value
+    ) -> Any:
+        """
+        Devolver el resultado guardado o calcularlo una sola vez. Llamado desde
+        el event loop no espera a otros llamadores (no bloquea el loop): si no
+        hay valor guardado calcula sin candados.
+        """
+        if not self.enabled or ttl <= 0:
+            return decode(encode(compute()))
+
+        key = self.make_key(namespace, params)
+        client = self._get_sync_redis()
+        payload = self._read(client, namespace, key)
+        if payload is not None:
+            self._count(namespace, "hits")
+            return decode(payload)
+
+        if _in_event_loop():
+            logger.warning("Synchronous cached call on the event loop", namespace=namespace)
+            return self._compute_and_store(client, namespace, key, compute, ttl, cache_if)
+
+        # Un solo cálculo por clave dentro del proceso; el resto espera aquí
+        with self._thread_locks.hold(key):
+            payload = self._read(client, namespace, key)
+            if payload is not None:
+                # Otro llamador del proceso lo calculó mientras se esperaba
+                self._count(namespace, "lock_waits")
+                self._count(namespace, "hits")
+                return decode(payload)
+
+            token = None
+            if client is not None:
+                token, payload = self._acquire_redis_lock(client, namespace, key)
+                if payload is not None:
+                    self._count(namespace, "hits")
+                    return decode(payload)
+            try:
+                return self._compute_and_store(client, namespace, key, compute, ttl, cache_if)
+            finally:
+                if token is not None:
+                    self._release_redis_lock(client, namespace, key, token)
+
+    def _compute_and_store(
+        self, client, namespace: str, key: str, compute: Callable[[], Any], ttl: int, cache_if: Callable[[Any], bool]
+    ) -> Any:
+        self._count(namespace, "misses")
+        value = compute()
+        payload = encode(value)
+        if cache_if(value):
+            self._write(client, namespace, key, payload, ttl)
+        else:
+            self._count(namespace, "not_stored")
+        return decode(payload)
+
+    # Lectura y escritura asíncronas
+
+    async def _aread(self, client, namespace: str, key: str) -> Optional[str]:
+        if client is not None:
+            try:
+                return await client.get(key)
+            except Exception as e:
+                self._redis_failed(namespace, e)
+        return self.memory.get(key)
+
+    async def _awrite(self, client, namespace: str, key: str, payload: str, ttl: int) -> None:
+        if client is not None:
+            try:
+                await client.set(key, payload, ex=ttl)
+                return
+            except Exception as e:
+                self._redis_failed(namespace, e)
+        self.memory.set(key, payload, ttl)
+
+    async def _aacquire_redis_lock(self, client, namespace: str, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """Versión asíncrona de `_acquire_redis_lock`"""
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        waited = False
+        try:
+            while True:
+                if await client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                    return token, None
+                if not waited:
+                    self._count(namespace, "lock_waits")
+                    waited = True
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+                payload = await client.get(key)
+                if payload is not None:
+                    return None, payload
+                if time.monotonic() >= deadline:
+                    return None, None
+        except Exception as e:
+            self._redis_failed(namespace, e)
+            return None, None
+
+    async def _arelease_redis_lock(self, client, namespace: str, key: str, token: str) -> None:
+        try:
+            await client.eval(_RELEASE_LOCK_SCRIPT, 1, f"{key}:lock", token)
+        except Exception as e:
+            self._redis_failed(namespace, e)
+
+    async def aget_or_compute(
+        self,
+        namespace: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        cache_if: Callable[[Any], bool] = has_value
+    ) -> Any:
+        """Versión asíncrona de `get_or_compute`"""
+        if not self.enabled or ttl <= 0:
+            return decode(encode(await compute()))
+
+        key = self.make_key(namespace, params)
+        client = self._get_async_redis()
+        payload = await self._aread(client, namespace, key)
+        if payload is not None:
+            self._count(namespace, "hits")
+            return decode(payload)
+
+        async with self._async_locks.ahold(key):
+            payload = await self._aread(client, namespace, key)
+            if payload is not None:
+                # Otro llamador del proceso lo calculó mientras se esperaba
+                self._count(namespace, "lock_waits")
+                self._count(namespace, "hits")
+                return decode(payload)
+
+            token = None
+            if client is not None:
+                token, payload = await self._aacquire_redis_lock(client, namespace, key)
+                if payload is not None:
+                    self._count(namespace, "hits")
+                    return decode(payload)
+            try:
+                self._count(namespace, "misses")
+                value = await compute()
+                payload = encode(value)
+                if cache_if(value):
+                    await self._awrite(client, namespace, key, payload, ttl)
+                else:
+                    self._count(namespace, "not_stored")
+                return decode(payload)
+            finally:
+                if token is not None:
+                    await self._arelease_redis_lock(client, namespace, key, token)
+
+    # Invalidación
+
+    def invalidate(self, namespace: str) -> int:
+        """Eliminar todas las entradas de un espacio de nombres"""
+        prefix = self.namespace_prefix(namespace)
+        removed = self.memory.delete_prefix(prefix)
+        client = self._get_sync_redis()
+        if client is not None:
+            try:
+                keys = list(client.scan_iter(match=f"{prefix}*", count=500))
+                if keys:
+                    removed += client.delete(*keys)
+            except Exception as e:
+                self._redis_failed(namespace, e)
+        logger.info("Result cache invalidated", namespace=namespace, removed=removed)
+        return removed
+
+
+def cached(
+    namespace: str,
+    ttl: Union[int, str] = "PREDICTION_CACHE_TTL",
+    exclude: Iterable[str] = ("self", "db"),
+    cache_if: Callable[[Any], bool] = has_value
+):
+    """
+    Guardar en `result_cache` el resultado de una función o corrutina.
+
+    La clave se forma con los argumentos ya enlazados (incluye los valores por
+    defecto) menos los de `exclude` (la instancia y las sesiones). `ttl` puede
+    ser un número de segundos o el nombre de un valor de la configuración. Las
+    funciones síncronas se llaman desde el pool de hilos, no desde el event loop.
+    """
+    excluded = frozenset(exclude)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_params(args, kwargs) -> Dict[str, Any]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return {name: value for name, value in bound.arguments.items() if name not in excluded}
+
+        def ttl_seconds() -> int:
+            return int(getattr(settings, ttl) if isinstance(ttl, str) else ttl)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await result_cache.aget_or_compute(
+                    namespace, key_params(args, kwargs), lambda: func(*args, **kwargs), ttl_seconds(), cache_if
+                )
+            wrapper = async_wrapper
+        else:
+            @functools.wraps(func)
+            def sync_wrapper(*args, **kwargs):
+                return result_cache.get_or_compute(
+                    namespace, key_params(args, kwargs), lambda: func(*args, **kwargs), ttl_seconds(), cache_if
+                )
+            wrapper = sync_wrapper
+
+        wrapper.cache_namespace = namespace
+        return wrapper
+
+    return decorator
+
+
+# Instancia global compartida por los servicios de analítica
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    lock_timeout=settings.RESULT_CACHE_LOCK_TIMEOUT,
+    enabled=settings.RESULT_CACHE_ENABLED
+)
@@ -1,9 +1,11 @@
 """
 Configuración de base de datos para la integración con Bienimed
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import Any, Dict
+import threading
 import os
 
 # Configuración de la base de datos Bienimed
@@ -17,6 +19,67 @@ bienimed_engine = create_engine(
     echo=False  # Cambiar a True para debug
 )
 
+class PoolMetrics:
+    """Contadores de uso del pool de conexiones de un engine (checkouts, en uso, pico)"""
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.invalidations = 0
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+    
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+    
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+    
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(0, self.in_use - 1)
+    
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+    
+    def reset_peak(self) -> None:
+        """Reiniciar el pico de conexiones en uso al valor actual"""
+        with self._lock:
+            self.peak_in_use = self.in_use
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Métricas acumuladas junto con el estado actual del pool"""
+        pool = self.engine.pool
+        with self._lock:
+            metrics = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "invalidations": self.invalidations
+            }
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                metrics[f"pool_{name}"] = getattr(pool, name)()
+        return metrics
+
+# Métricas de checkout del pool de Bienimed
+bienimed_pool_metrics = PoolMetrics(bienimed_engine)
+
 # SessionLocal para Bienimed
 BienimedSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=bienimed_engine)
 
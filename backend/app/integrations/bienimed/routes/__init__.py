@@ -11,6 +11,7 @@ from .laboratory_orders import router as laboratory_orders_router
 from .imaging_orders import router as imaging_orders_router
 from .invoices import router as invoices_router
 from .filters import router as filters_router
+from .exports import router as exports_router
 
 __all__ = [
     "patients_router",
@@ -23,6 +24,7 @@ __all__ = [
     "imaging_orders_router",
     "invoices_router",
     "filters_router",
+    "exports_router",
 ]
 
 
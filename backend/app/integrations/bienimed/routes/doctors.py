@@ -17,26 +17,36 @@ def get_doctors(
     search: Optional[str] = Query(None, description="Buscar por nombre, apellido o email"),
     specialty_id: Optional[int] = Query(None, description="Filtrar por especialidad"),
     active_only: bool = Query(True, description="Solo doctores activos"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor de la respuesta anterior)"),
+    sort_by: str = Query("id", description="Orden: id, fecha_creacion o apellidopaterno"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Dirección del orden"),
     db: Session = Depends(get_bienimed_db)
 ):
     """Obtener lista de doctores de Bienimed con filtros opcionales"""
     try:
         service = DoctorService(db)
-        doctors = service.get_doctors(
+        result = service.get_doctors(
             skip=skip, 
             limit=limit, 
             search=search, 
             specialty_id=specialty_id,
-            active_only=active_only
+            active_only=active_only,
+            cursor=cursor,
+            sort_by=sort_by,
+            order=order
         )
-        total = service.count_doctors(search=search, specialty_id=specialty_id)
+        # Con cursor no se cuenta la tabla: sería un recorrido completo
+        total = None if cursor else service.count_doctors(search=search, specialty_id=specialty_id)
         
         return DoctorListResponse(
-            doctors=[doctor.to_dict() for doctor in doctors],
+            doctors=[doctor.to_dict() for doctor in result.items],
             total=total,
-            page=skip // limit + 1,
-            per_page=limit
+            page=None if cursor else skip // limit + 1,
+            per_page=limit,
+            next_cursor=result.next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar doctores: {str(e)}")
     finally:
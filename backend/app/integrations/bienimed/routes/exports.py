@@ -0,0 +1,45 @@
+"""
+Rutas para exportar tablas completas de Bienimed (NDJSON o CSV en streaming)
+"""
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional
+from datetime import date
+from ..services.export_service import ExportService, EXPORT_ENTITIES, EXPORT_FORMATS
+
+router = APIRouter()
+
+@router.get("/", response_model=Dict[str, Any])
+def get_export_entities():
+    """Listar las entidades y formatos disponibles para exportar"""
+    return {"entities": list(EXPORT_ENTITIES), "formats": list(EXPORT_FORMATS)}
+
+@router.get("/{entity}")
+def export_entity(
+    entity: str,
+    output_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson o csv"),
+    gzip: bool = Query(False, description="Comprimir la exportación en gzip"),
+    after_id: Optional[int] = Query(None, ge=0, description="Exportar solo registros con id mayor (reanudar o incremental)"),
+    start_date: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    end_date: Optional[date] = Query(None, description="Fecha final (inclusive)")
+):
+    """
+    Exportar una tabla completa de Bienimed en orden de id, sin paginar. Las
+    filas se envían a medida que se leen del cursor del servidor.
+    """
+    service = ExportService()
+    try:
+        chunks = service.export(
+            entity, output_format, after_id=after_id, start_date=start_date, end_date=end_date, compress=gzip
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al exportar datos: {str(e)}")
+
+    filename = service.filename(entity, output_format, gzip)
+    return StreamingResponse(
+        chunks,
+        media_type=service.media_type(output_format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -15,20 +15,30 @@ def get_imaging_orders(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     diagnostico_id: Optional[int] = Query(None, description="Filtrar por diagnóstico"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor de la respuesta anterior)"),
+    sort_by: str = Query("id", description="Orden: id o fecha_creacion"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Dirección del orden"),
     db: Session = Depends(get_bienimed_db)
 ):
     """Obtener lista de órdenes de imagenología de Bienimed"""
     try:
         service = ImagingOrderService(db)
-        orders = service.get_imaging_orders(skip=skip, limit=limit, diagnostico_id=diagnostico_id)
-        total = service.count_imaging_orders(diagnostico_id=diagnostico_id)
+        result = service.get_imaging_orders(
+            skip=skip, limit=limit, diagnostico_id=diagnostico_id,
+            cursor=cursor, sort_by=sort_by, order=order
+        )
+        # Con cursor no se cuenta la tabla: sería un recorrido completo
+        total = None if cursor else service.count_imaging_orders(diagnostico_id=diagnostico_id)
         
         return ImagingOrderListResponse(
-            imaging_orders=[order.to_dict() for order in orders],
+            imaging_orders=[order.to_dict() for order in result.items],
             total=total,
-            page=skip // limit + 1,
-            per_page=limit
+            page=None if cursor else skip // limit + 1,
+            per_page=limit,
+            next_cursor=result.next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar órdenes de imagenología: {str(e)}")
     finally:
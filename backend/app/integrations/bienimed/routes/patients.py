@@ -16,20 +16,30 @@ def get_patients(
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
     search: Optional[str] = Query(None, description="Buscar por nombre, apellido o email"),
     document: Optional[str] = Query(None, description="Buscar por número de documento"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor de la respuesta anterior)"),
+    sort_by: str = Query("id", description="Orden: id, fecha_creacion o apellidopaterno"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Dirección del orden"),
     db: Session = Depends(get_bienimed_db)
 ):
     """Obtener lista de pacientes de Bienimed con filtros opcionales"""
     try:
         service = PatientService(db)
-        patients = service.get_patients(skip=skip, limit=limit, search=search, document=document)
-        total = service.count_patients(search=search)
+        result = service.get_patients(
+            skip=skip, limit=limit, search=search, document=document,
+            cursor=cursor, sort_by=sort_by, order=order
+        )
+        # Con cursor no se cuenta la tabla: sería un recorrido completo
+        total = None if cursor else service.count_patients(search=search)
         
         return PatientListResponse(
-            patients=[patient.to_dict() for patient in patients],
+            patients=[patient.to_dict() for patient in result.items],
             total=total,
-            page=skip // limit + 1,
-            per_page=limit
+            page=None if cursor else skip // limit + 1,
+            per_page=limit,
+            next_cursor=result.next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar pacientes: {str(e)}")
     finally:
@@ -16,20 +16,30 @@ def get_procedures(
     limit: int = Query(100, ge=1, le=1000),
     patient_id: Optional[int] = Query(None, description="Filtrar por paciente"),
     consulta_id: Optional[int] = Query(None, description="Filtrar por consulta"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor de la respuesta anterior)"),
+    sort_by: str = Query("id", description="Orden: id"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Dirección del orden"),
     db: Session = Depends(get_bienimed_db)
 ):
     """Obtener lista de procedimientos de Bienimed"""
     try:
         service = ProcedureService(db)
-        procedures = service.get_procedures(skip=skip, limit=limit, patient_id=patient_id, consulta_id=consulta_id)
-        total = service.count_procedures(patient_id=patient_id)
+        result = service.get_procedures(
+            skip=skip, limit=limit, patient_id=patient_id, consulta_id=consulta_id,
+            cursor=cursor, sort_by=sort_by, order=order
+        )
+        # Con cursor no se cuenta la tabla: sería un recorrido completo
+        total = None if cursor else service.count_procedures(patient_id=patient_id)
         
         return ProcedureListResponse(
-            procedures=[procedure.to_dict() for procedure in procedures],
+            procedures=[procedure.to_dict() for procedure in result.items],
             total=total,
-            page=skip // limit + 1,
-            per_page=limit
+            page=None if cursor else skip // limit + 1,
+            per_page=limit,
+            next_cursor=result.next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar procedimientos: {str(e)}")
     finally:
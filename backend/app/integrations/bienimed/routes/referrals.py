@@ -16,20 +16,30 @@ def get_referrals(
     limit: int = Query(100, ge=1, le=1000),
     consulta_id: Optional[int] = Query(None, description="Filtrar por consulta"),
     especialidad_id: Optional[int] = Query(None, description="Filtrar por especialidad"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor de la respuesta anterior)"),
+    sort_by: str = Query("id", description="Orden: id o creado"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Dirección del orden"),
     db: Session = Depends(get_bienimed_db)
 ):
     """Obtener lista de referencias de Bienimed"""
     try:
         service = ReferralService(db)
-        referrals = service.get_referrals(skip=skip, limit=limit, consulta_id=consulta_id, especialidad_id=especialidad_id)
-        total = service.count_referrals(consulta_id=consulta_id)
+        result = service.get_referrals(
+            skip=skip, limit=limit, consulta_id=consulta_id, especialidad_id=especialidad_id,
+            cursor=cursor, sort_by=sort_by, order=order
+        )
+        # Con cursor no se cuenta la tabla: sería un recorrido completo
+        total = None if cursor else service.count_referrals(consulta_id=consulta_id)
         
         return ReferralListResponse(
-            referrals=[referral.to_dict() for referral in referrals],
+            referrals=[referral.to_dict() for referral in result.items],
             total=total,
-            page=skip // limit + 1,
-            per_page=limit
+            page=None if cursor else skip // limit + 1,
+            per_page=limit,
+            next_cursor=result.next_cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar referencias: {str(e)}")
     finally:
@@ -10,6 +10,7 @@ from .prescription import PrescriptionResponse, PrescriptionListResponse
 from .laboratory_order import LaboratoryOrderResponse, LaboratoryOrderListResponse
 from .imaging_order import ImagingOrderResponse, ImagingOrderListResponse
 from .invoice import InvoiceResponse, InvoiceListResponse
+from .pagination import PaginatedResponse
 
 __all__ = [
     "PatientResponse",
@@ -30,6 +31,7 @@ __all__ = [
     "ImagingOrderListResponse",
     "InvoiceResponse",
     "InvoiceListResponse",
+    "PaginatedResponse",
 ]
 
 
@@ -3,6 +3,7 @@ Schemas para Diagnósticos de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List
+from .pagination import PaginatedResponse
 
 class DiagnosisResponse(BaseModel):
     id: int
@@ -18,11 +19,8 @@ class DiagnosisResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class DiagnosisListResponse(BaseModel):
+class DiagnosisListResponse(PaginatedResponse):
     diagnoses: List[DiagnosisResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
@@ -4,6 +4,7 @@ Schemas para Doctores de Bienimed
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
+from .pagination import PaginatedResponse
 
 class DoctorResponse(BaseModel):
     id: int
@@ -31,11 +32,8 @@ class DoctorResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class DoctorListResponse(BaseModel):
+class DoctorListResponse(PaginatedResponse):
     doctors: List[DoctorResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
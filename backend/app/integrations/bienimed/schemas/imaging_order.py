@@ -3,6 +3,7 @@ Schemas para Órdenes de Imagenología de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List
+from .pagination import PaginatedResponse
 
 class ImagingOrderResponse(BaseModel):
     id: int
@@ -16,11 +17,8 @@ class ImagingOrderResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class ImagingOrderListResponse(BaseModel):
+class ImagingOrderListResponse(PaginatedResponse):
     imaging_orders: List[ImagingOrderResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
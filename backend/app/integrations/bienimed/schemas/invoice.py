@@ -3,6 +3,7 @@ Schemas para Facturas de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from .pagination import PaginatedResponse
 
 class ResponsablePago(BaseModel):
     nombre: str
@@ -35,11 +36,8 @@ class InvoiceResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class InvoiceListResponse(BaseModel):
+class InvoiceListResponse(PaginatedResponse):
     invoices: List[InvoiceResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
@@ -3,6 +3,7 @@ Schemas para Órdenes de Laboratorio de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List
+from .pagination import PaginatedResponse
 
 class LaboratoryOrderResponse(BaseModel):
     id: int
@@ -16,11 +17,8 @@ class LaboratoryOrderResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class LaboratoryOrderListResponse(BaseModel):
+class LaboratoryOrderListResponse(PaginatedResponse):
     laboratory_orders: List[LaboratoryOrderResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
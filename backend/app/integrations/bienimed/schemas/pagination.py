@@ -0,0 +1,16 @@
+"""
+Envoltura común de los listados paginados de Bienimed
+"""
+from pydantic import BaseModel
+from typing import Optional
+
+class PaginatedResponse(BaseModel):
+    # Solo en modo por desplazamiento; con cursor se omiten (contar la tabla es un recorrido completo)
+    total: Optional[int] = None
+    page: Optional[int] = None
+    per_page: int
+    # Cursor de la siguiente página; None en la última
+    next_cursor: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -4,6 +4,7 @@ Schemas para Pacientes de Bienimed
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import date, datetime
+from .pagination import PaginatedResponse
 
 class PatientResponse(BaseModel):
     id: int
@@ -25,11 +26,8 @@ class PatientResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class PatientListResponse(BaseModel):
+class PatientListResponse(PaginatedResponse):
     patients: List[PatientResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
@@ -3,6 +3,7 @@ Schemas para Recetas de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List
+from .pagination import PaginatedResponse
 
 class PrescriptionResponse(BaseModel):
     id: int
@@ -16,11 +17,8 @@ class PrescriptionResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class PrescriptionListResponse(BaseModel):
+class PrescriptionListResponse(PaginatedResponse):
     prescriptions: List[PrescriptionResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
@@ -3,6 +3,7 @@ Schemas para Procedimientos de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List
+from .pagination import PaginatedResponse
 
 class ProcedureResponse(BaseModel):
     id: int
@@ -18,11 +19,8 @@ class ProcedureResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class ProcedureListResponse(BaseModel):
+class ProcedureListResponse(PaginatedResponse):
     procedures: List[ProcedureResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
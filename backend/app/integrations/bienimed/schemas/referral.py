@@ -3,6 +3,7 @@ Schemas para Referencias de Bienimed
 """
 from pydantic import BaseModel
 from typing import Optional, List
+from .pagination import PaginatedResponse
 
 class ReferralResponse(BaseModel):
     id: int
@@ -16,11 +17,8 @@ class ReferralResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class ReferralListResponse(BaseModel):
+class ReferralListResponse(PaginatedResponse):
     referrals: List[ReferralResponse]
-    total: int
-    page: int
-    per_page: int
 
     class Config:
         from_attributes = True
@@ -10,6 +10,7 @@ from .prescription_service import PrescriptionService
 from .laboratory_order_service import LaboratoryOrderService
 from .imaging_order_service import ImagingOrderService
 from .invoice_service import InvoiceService
+from .export_service import ExportService
 
 __all__ = [
     "PatientService",
@@ -21,6 +22,7 @@ __all__ = [
     "LaboratoryOrderService",
     "ImagingOrderService",
     "InvoiceService",
+    "ExportService",
 ]
 
 
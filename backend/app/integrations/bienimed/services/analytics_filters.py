@@ -0,0 +1,48 @@
+"""
+Filtros comunes para las consultas agregadas de Bienimed (dimensiones:
+centro, área, médico y cliente)
+"""
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models.filter import Area, CentroUsuario
+
+
+def center_user_ids(center_id: int):
+    """Subconsulta con los usuarios (médicos) asignados a un centro"""
+    return select(CentroUsuario.idusuario).where(CentroUsuario.idcentro == center_id)
+
+
+def resolve_center_id(db: Session, center_id: Optional[int] = None, area_id: Optional[int] = None) -> Optional[int]:
+    """
+    Centro efectivo del filtro. Los registros clínicos y las facturas no
+    guardan el área, así que un área se resuelve a su centro. Lanza ValueError
+    si el área no existe o no pertenece al centro indicado.
+    """
+    if not area_id:
+        return center_id
+    area_center = db.query(Area.idcentro).filter(Area.id == area_id).scalar()
+    if area_center is None:
+        raise ValueError(f"Área no encontrada: {area_id}")
+    if center_id and center_id != area_center:
+        raise ValueError(f"El área {area_id} no pertenece al centro {center_id}")
+    return area_center
+
+
+def dimension_user_ids(
+    db: Session,
+    center_id: Optional[int] = None,
+    area_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> Optional[List[int]]:
+    """
+    Médicos (idusuario) incluidos por los filtros de centro, área y médico;
+    None si ninguno aplica. Un médico fuera del centro deja la lista vacía.
+    """
+    center_id = resolve_center_id(db, center_id, area_id)
+    if not center_id:
+        return [user_id] if user_id else None
+    user_ids = [row[0] for row in db.execute(center_user_ids(center_id).distinct())]
+    if user_id:
+        return [user_id] if user_id in user_ids else []
+    return user_ids
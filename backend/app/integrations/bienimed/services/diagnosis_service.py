@@ -5,6 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..models.diagnosis import Diagnosis
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+DIAGNOSIS_SORT_KEYS = {"id": Diagnosis.id, "fecha": Diagnosis.fecha}
 
 class DiagnosisService:
     def __init__(self, db: Session = None):
@@ -15,9 +19,15 @@ class DiagnosisService:
         skip: int = 0, 
         limit: int = 100,
         patient_id: Optional[int] = None,
-        consulta_id: Optional[int] = None
-    ) -> List[Diagnosis]:
-        """Obtener lista de diagnósticos con filtros opcionales"""
+        consulta_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de diagnósticos con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Diagnosis)
         
         if patient_id:
@@ -26,7 +36,7 @@ class DiagnosisService:
         if consulta_id:
             query = query.filter(Diagnosis.idconsulta == consulta_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Diagnosis, DIAGNOSIS_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_diagnosis_by_id(self, diagnosis_id: int) -> Optional[Diagnosis]:
         """Obtener diagnóstico por ID"""
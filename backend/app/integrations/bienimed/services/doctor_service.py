@@ -3,9 +3,19 @@ Servicio para consultar doctores de Bienimed
 """
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from ..models.doctor import Doctor
 from ..database import BienimedSessionLocal
+from .analytics_filters import center_user_ids
+from .pagination import Page, paginate
+
+# Métricas de rendimiento por las que se puede ordenar el reporte
+PERFORMANCE_METRICS = ("total_diagnoses", "total_procedures", "total_prescriptions", "total_consultations")
+# Periodos soportados para el desglose de rendimiento
+PERFORMANCE_PERIODS = ("month", "year")
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+DOCTOR_SORT_KEYS = {"id": Doctor.id, "fecha_creacion": Doctor.fecha_creacion, "apellidopaterno": Doctor.apellidopaterno}
 
 class DoctorService:
     def __init__(self, db: Session = None):
@@ -17,9 +27,15 @@ class DoctorService:
         limit: int = 100,
         search: Optional[str] = None,
         specialty_id: Optional[int] = None,
-        active_only: bool = True
-    ) -> List[Doctor]:
-        """Obtener lista de doctores con filtros opcionales"""
+        active_only: bool = True,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de doctores con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Doctor)
         
         if active_only:
@@ -37,7 +53,7 @@ class DoctorService:
         if specialty_id:
             query = query.filter(Doctor.idespecialidad == specialty_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Doctor, DOCTOR_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_doctor_by_id(self, doctor_id: int) -> Optional[Doctor]:
         """Obtener doctor por ID"""
@@ -68,6 +84,49 @@ class DoctorService:
         
         return query.count()
     
+    def list_performance_doctors(
+        self,
+        center_id: Optional[int] = None,
+        specialty_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Doctores incluidos en el reporte de rendimiento, sin métricas"""
+        query = self.db.query(
+            Doctor.id, Doctor.idusuario, Doctor.primernombre, Doctor.apellidopaterno, Doctor.idespecialidad
+        )
+        rows = self._performance_filters(query, center_id, specialty_id, user_id).order_by(Doctor.id).all()
+        return [
+            {
+                "id": row.id,
+                "user_id": row.idusuario,
+                "name": f"Dr. {row.primernombre} {row.apellidopaterno}",
+                "specialty_id": row.idespecialidad
+            }
+            for row in rows
+        ]
+    
+    def get_user_specialties(self) -> Dict[int, int]:
+        """Especialidad de cada médico: {idusuario: idespecialidad}, incluidos los inactivos"""
+        rows = self.db.query(Doctor.idusuario, Doctor.idespecialidad).filter(Doctor.idusuario.isnot(None))
+        return {user_id: specialty_id for user_id, specialty_id in rows}
+    
+    @staticmethod
+    def _performance_filters(
+        query,
+        center_id: Optional[int],
+        specialty_id: Optional[int],
+        user_id: Optional[int] = None
+    ):
+        """Doctores activos, opcionalmente de un centro, especialidad o usuario"""
+        query = query.filter(Doctor.estado == 'Activo')
+        if center_id:
+            query = query.filter(Doctor.idusuario.in_(center_user_ids(center_id)))
+        if specialty_id:
+            query = query.filter(Doctor.idespecialidad == specialty_id)
+        if user_id:
+            query = query.filter(Doctor.idusuario == user_id)
+        return query
+    
     def close(self):
         """Cerrar conexión a la base de datos"""
         if self.db:
@@ -0,0 +1,152 @@
+"""
+Servicio para exportar tablas completas de Bienimed en NDJSON o CSV
+"""
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import csv
+import io
+import json
+import zlib
+from ..database import bienimed_engine
+from ..models.patient import Patient
+from ..models.doctor import Doctor
+from ..models.diagnosis import Diagnosis
+from ..models.procedure import Procedure
+from ..models.referral import Referral
+from ..models.prescription import Prescription
+from ..models.laboratory_order import LaboratoryOrder
+from ..models.imaging_order import ImagingOrder
+from ..models.invoice import Invoice
+
+# Entidades exportables: nombre en la URL -> (modelo, columna de fecha para filtrar)
+EXPORT_ENTITIES = {
+    "patients": (Patient, Patient.fecha_creacion),
+    "doctors": (Doctor, Doctor.fecha_creacion),
+    "diagnoses": (Diagnosis, Diagnosis.fecha),
+    "procedures": (Procedure, Procedure.creado),
+    "referrals": (Referral, Referral.creado),
+    "prescriptions": (Prescription, Prescription.fecha_creacion),
+    "laboratory_orders": (LaboratoryOrder, LaboratoryOrder.fecha_creacion),
+    "imaging_orders": (ImagingOrder, ImagingOrder.fecha_creacion),
+    "invoices": (Invoice, Invoice.created_date),
+}
+EXPORT_FORMATS = ("ndjson", "csv")
+# Filas que el cursor del servidor entrega por lote
+EXPORT_BATCH_SIZE = 2000
+# Bytes acumulados antes de enviar un fragmento de la respuesta
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    """Serializar fechas y decimales como en los to_dict de los modelos"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return str(value)
+    return str(value)
+
+
+class ExportService:
+    """
+    Exportación de tablas completas de Bienimed. Las filas se leen con un
+    cursor del lado del servidor (stream_results/yield_per) en orden de id y se
+    escriben por fragmentos, opcionalmente comprimidos en gzip, así que la
+    memoria usada no depende del tamaño de la tabla.
+    """
+
+    def __init__(self, engine: Engine = None, batch_size: int = EXPORT_BATCH_SIZE):
+        self.engine = engine or bienimed_engine
+        self.batch_size = batch_size
+
+    def export(
+        self,
+        entity: str,
+        output_format: str = "ndjson",
+        after_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        compress: bool = False
+    ) -> Iterator[bytes]:
+        """
+        Validar los parámetros y retornar el generador de fragmentos de la
+        exportación. `after_id` permite reanudar una extracción o traer solo los
+        registros nuevos. Los parámetros inválidos lanzan ValueError antes de
+        abrir la conexión.
+        """
+        if entity not in EXPORT_ENTITIES:
+            raise ValueError(f"Entidad no válida: {entity}. Opciones: {', '.join(EXPORT_ENTITIES)}")
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError(f"Formato no válido: {output_format}. Opciones: {', '.join(EXPORT_FORMATS)}")
+        if start_date and end_date and start_date > end_date:
+            raise ValueError("start_date no puede ser posterior a end_date")
+
+        model, date_column = EXPORT_ENTITIES[entity]
+        table = model.__table__
+        statement = select(table).order_by(table.c.id)
+        if after_id is not None:
+            statement = statement.where(table.c.id > after_id)
+        if start_date:
+            statement = statement.where(date_column >= start_date)
+        if end_date:
+            statement = statement.where(date_column < end_date + timedelta(days=1))
+
+        columns = [column.name for column in table.columns]
+        return self._stream(statement, columns, output_format, compress)
+
+    @staticmethod
+    def media_type(output_format: str, compress: bool = False) -> str:
+        if compress:
+            return "application/gzip"
+        return "application/x-ndjson" if output_format == "ndjson" else "text/csv; charset=utf-8"
+
+    @staticmethod
+    def filename(entity: str, output_format: str, compress: bool = False) -> str:
+        return f"{entity}.{output_format}" + (".gz" if compress else "")
+
+    def _stream(self, statement, columns: List[str], output_format: str, compress: bool) -> Iterator[bytes]:
+        """
+        Generador de la exportación. Usa su propia conexión porque se consume
+        después de que la ruta retorna; la conexión queda ocupada por el cursor
+        hasta terminar (o hasta que el cliente se desconecta).
+        """
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n") if output_format == "csv" else None
+        if writer:
+            writer.writerow(columns)
+
+        def flush() -> bytes:
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(data) if compressor else data
+
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execution_options(yield_per=self.batch_size).execute(statement)
+                for rows in result.partitions():
+                    for row in rows:
+                        if writer:
+                            writer.writerow(row)
+                        else:
+                            buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+                            buffer.write("\n")
+                    if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                        chunk = flush()
+                        if chunk:
+                            yield chunk
+        except Exception as e:
+            # La respuesta ya empezó: se corta para que el cliente no la tome por completa
+            print(f"Error exporting Bienimed data: {e}")
+            raise
+
+        chunk = flush()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
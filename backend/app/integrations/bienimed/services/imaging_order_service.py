@@ -5,6 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..models.imaging_order import ImagingOrder
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+IMAGING_ORDER_SORT_KEYS = {"id": ImagingOrder.id, "fecha_creacion": ImagingOrder.fecha_creacion}
 
 class ImagingOrderService:
     def __init__(self, db: Session = None):
@@ -14,15 +18,21 @@ class ImagingOrderService:
         self, 
         skip: int = 0, 
         limit: int = 100,
-        diagnostico_id: Optional[int] = None
-    ) -> List[ImagingOrder]:
-        """Obtener lista de órdenes de imagenología con filtros opcionales"""
+        diagnostico_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de órdenes de imagenología con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(ImagingOrder)
         
         if diagnostico_id:
             query = query.filter(ImagingOrder.iddiagnostico == diagnostico_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, ImagingOrder, IMAGING_ORDER_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_imaging_order_by_id(self, order_id: int) -> Optional[ImagingOrder]:
         """Obtener orden de imagenología por ID"""
@@ -6,6 +6,10 @@ from sqlalchemy import or_
 from typing import List, Optional
 from ..models.invoice import Invoice
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+INVOICE_SORT_KEYS = {"id": Invoice.id}
 
 class InvoiceService:
     def __init__(self, db: Session = None):
@@ -16,9 +20,15 @@ class InvoiceService:
         skip: int = 0, 
         limit: int = 100,
         patient_id: Optional[int] = None,
-        search: Optional[str] = None
-    ) -> List[Invoice]:
-        """Obtener lista de facturas con filtros opcionales"""
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de facturas con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Invoice)
         
         if patient_id:
@@ -33,7 +43,7 @@ class InvoiceService:
                 )
             )
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Invoice, INVOICE_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_invoice_by_id(self, invoice_id: int) -> Optional[Invoice]:
         """Obtener factura por ID"""
@@ -5,6 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..models.laboratory_order import LaboratoryOrder
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+LABORATORY_ORDER_SORT_KEYS = {"id": LaboratoryOrder.id, "fecha_creacion": LaboratoryOrder.fecha_creacion}
 
 class LaboratoryOrderService:
     def __init__(self, db: Session = None):
@@ -14,15 +18,21 @@ class LaboratoryOrderService:
         self, 
         skip: int = 0, 
         limit: int = 100,
-        diagnostico_id: Optional[int] = None
-    ) -> List[LaboratoryOrder]:
-        """Obtener lista de órdenes de laboratorio con filtros opcionales"""
+        diagnostico_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de órdenes de laboratorio con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(LaboratoryOrder)
         
         if diagnostico_id:
             query = query.filter(LaboratoryOrder.iddiagnostico == diagnostico_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, LaboratoryOrder, LABORATORY_ORDER_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_laboratory_order_by_id(self, order_id: int) -> Optional[LaboratoryOrder]:
         """Obtener orden de laboratorio por ID"""
@@ -0,0 +1,101 @@
+"""
+Paginación de los listados de Bienimed: por desplazamiento (skip/limit) o por
+cursor sobre (clave de orden, id)
+"""
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+from typing import Any, Dict, List, NamedTuple, Optional
+from datetime import date, datetime
+import base64
+import binascii
+import json
+
+# Direcciones de orden soportadas
+SORT_ORDERS = ("asc", "desc")
+
+
+class Page(NamedTuple):
+    """Registros de una página y cursor de la siguiente (None si es la última)"""
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(sort_by: str, order: str, value: Any, last_id: int) -> str:
+    """Cursor opaco con la clave de orden y el id del último registro de la página"""
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort_by, "o": order, "v": value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, order: str, column) -> Dict[str, Any]:
+    """
+    Leer un cursor generado por encode_cursor. Lanza ValueError si está mal
+    formado o si se generó con otro orden.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        value, last_id = payload["v"], int(payload["id"])
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise ValueError("Cursor no válido")
+    if payload.get("s") != sort_by or payload.get("o") != order:
+        raise ValueError("El cursor se generó con otro orden: repita sort_by y order de la primera página")
+
+    python_type = column.type.python_type
+    if value is not None and python_type in (date, datetime):
+        try:
+            value = python_type.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError("Cursor no válido")
+    return {"value": value, "id": last_id}
+
+
+def paginate(
+    query: Query,
+    model,
+    sort_keys: Dict[str, Any],
+    sort_by: str = "id",
+    order: str = "asc",
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> Page:
+    """
+    Ordenar por (clave de orden, id) y retornar una página. Con `cursor` la
+    página empieza después del registro que lo generó, con una condición
+    sobre el índice en lugar de OFFSET (costo independiente de la
+    profundidad); `skip` se mantiene para el modo por desplazamiento. Las
+    claves de orden deben ser columnas NOT NULL. Los parámetros inválidos
+    lanzan ValueError.
+    """
+    if sort_by not in sort_keys:
+        raise ValueError(f"Orden no válido: {sort_by}. Opciones: {', '.join(sort_keys)}")
+    if order not in SORT_ORDERS:
+        raise ValueError(f"Dirección no válida: {order}. Opciones: {', '.join(SORT_ORDERS)}")
+    if cursor and skip:
+        raise ValueError("skip y cursor no se pueden combinar")
+
+    column, id_column = sort_keys[sort_by], model.id
+    descending = order == "desc"
+    if cursor:
+        position = decode_cursor(cursor, sort_by, order, column)
+        if column is id_column:
+            condition = id_column < position["id"] if descending else id_column > position["id"]
+        elif descending:
+            condition = or_(column < position["value"], and_(column == position["value"], id_column < position["id"]))
+        else:
+            condition = or_(column > position["value"], and_(column == position["value"], id_column > position["id"]))
+        query = query.filter(condition)
+
+    ordering = [column.desc(), id_column.desc()] if descending else [column.asc(), id_column.asc()]
+    if column is id_column:
+        ordering = ordering[1:]
+    # Un registro extra indica si hay otra página
+    rows = query.order_by(*ordering).offset(skip).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor(sort_by, order, getattr(last, column.key), last.id))
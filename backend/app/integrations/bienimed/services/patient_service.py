@@ -6,6 +6,10 @@ from sqlalchemy import or_, and_
 from typing import List, Optional
 from ..models.patient import Patient
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+PATIENT_SORT_KEYS = {"id": Patient.id, "fecha_creacion": Patient.fecha_creacion, "apellidopaterno": Patient.apellidopaterno}
 
 class PatientService:
     def __init__(self, db: Session = None):
@@ -16,9 +20,15 @@ class PatientService:
         skip: int = 0, 
         limit: int = 100,
         search: Optional[str] = None,
-        document: Optional[str] = None
-    ) -> List[Patient]:
-        """Obtener lista de pacientes con filtros opcionales"""
+        document: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de pacientes con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Patient)
         
         if search:
@@ -33,7 +43,7 @@ class PatientService:
         if document:
             query = query.filter(Patient.numerodocumento == document)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Patient, PATIENT_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_patient_by_id(self, patient_id: int) -> Optional[Patient]:
         """Obtener paciente por ID"""
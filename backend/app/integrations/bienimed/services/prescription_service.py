@@ -5,6 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..models.prescription import Prescription
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+PRESCRIPTION_SORT_KEYS = {"id": Prescription.id, "fecha_creacion": Prescription.fecha_creacion}
 
 class PrescriptionService:
     def __init__(self, db: Session = None):
@@ -14,15 +18,21 @@ class PrescriptionService:
         self, 
         skip: int = 0, 
         limit: int = 100,
-        diagnostico_id: Optional[int] = None
-    ) -> List[Prescription]:
-        """Obtener lista de recetas con filtros opcionales"""
+        diagnostico_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de recetas con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Prescription)
         
         if diagnostico_id:
             query = query.filter(Prescription.iddiagnostico == diagnostico_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Prescription, PRESCRIPTION_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_prescription_by_id(self, prescription_id: int) -> Optional[Prescription]:
         """Obtener receta por ID"""
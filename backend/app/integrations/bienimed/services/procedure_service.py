@@ -5,6 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..models.procedure import Procedure
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+PROCEDURE_SORT_KEYS = {"id": Procedure.id}
 
 class ProcedureService:
     def __init__(self, db: Session = None):
@@ -15,9 +19,15 @@ class ProcedureService:
         skip: int = 0, 
         limit: int = 100,
         patient_id: Optional[int] = None,
-        consulta_id: Optional[int] = None
-    ) -> List[Procedure]:
-        """Obtener lista de procedimientos con filtros opcionales"""
+        consulta_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de procedimientos con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Procedure)
         
         if patient_id:
@@ -26,7 +36,7 @@ class ProcedureService:
         if consulta_id:
             query = query.filter(Procedure.idconsulta == consulta_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Procedure, PROCEDURE_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_procedure_by_id(self, procedure_id: int) -> Optional[Procedure]:
         """Obtener procedimiento por ID"""
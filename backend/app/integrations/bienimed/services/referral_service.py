@@ -5,6 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..models.referral import Referral
 from ..database import BienimedSessionLocal
+from .pagination import Page, paginate
+
+# Claves de orden del listado (columnas NOT NULL, desempate por id)
+REFERRAL_SORT_KEYS = {"id": Referral.id, "creado": Referral.creado}
 
 class ReferralService:
     def __init__(self, db: Session = None):
@@ -15,9 +19,15 @@ class ReferralService:
         skip: int = 0, 
         limit: int = 100,
         consulta_id: Optional[int] = None,
-        especialidad_id: Optional[int] = None
-    ) -> List[Referral]:
-        """Obtener lista de referencias con filtros opcionales"""
+        especialidad_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "id",
+        order: str = "asc"
+    ) -> Page:
+        """
+        Obtener lista de referencias con filtros opcionales, ordenada por (sort_by, id) y paginada
+        por desplazamiento (skip) o por cursor (ver pagination.paginate)
+        """
         query = self.db.query(Referral)
         
         if consulta_id:
@@ -26,7 +36,7 @@ class ReferralService:
         if especialidad_id:
             query = query.filter(Referral.idespecialidad == especialidad_id)
         
-        return query.offset(skip).limit(limit).all()
+        return paginate(query, Referral, REFERRAL_SORT_KEYS, sort_by, order, skip, limit, cursor)
     
     def get_referral_by_id(self, referral_id: int) -> Optional[Referral]:
         """Obtener referencia por ID"""
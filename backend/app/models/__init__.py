@@ -18,9 +18,19 @@ from app.models.flow_models import (
     FlowNode,
     FlowEdge,
     ReferralCriteria,
-    NodeResource
+    NodeResource,
+    FlowStatisticsSummary
 )
 
+# Agregados de facturación
+from app.models.revenue_models import RevenueRollup, RevenuePatientTotal, RevenueRollupState
+
+# Agregados de actividad clínica
+from app.models.clinical_rollup_models import ClinicalActivityRollup, ClinicalConsultation, ClinicalRollupState
+
+# Historial de métricas de flujos
+from app.models.flow_metrics_models import FlowMetricsHistory
+
 __all__ = [
     "BaseModel",
     "Specialty",
@@ -37,5 +47,16 @@ __all__ = [
     "FlowNode",
     "FlowEdge",
     "ReferralCriteria",
-    "NodeResource"
+    "NodeResource",
+    "FlowStatisticsSummary",
+    # Agregados de facturación
+    "RevenueRollup",
+    "RevenuePatientTotal",
+    "RevenueRollupState",
+    # Agregados de actividad clínica
+    "ClinicalActivityRollup",
+    "ClinicalConsultation",
+    "ClinicalRollupState",
+    # Historial de métricas de flujos
+    "FlowMetricsHistory"
 ]
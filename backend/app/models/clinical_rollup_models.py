@@ -0,0 +1,71 @@
+"""
+Modelos de los agregados de actividad clínica precalculados
+Se alimentan de diagnósticos, procedimientos, referencias, recetas y órdenes
+de laboratorio e imagenología (base de datos de Bienimed)
+"""
+
+from sqlalchemy import Column, String, Integer, Date, DateTime, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ClinicalActivityRollup(Base):
+    """Registros clínicos por tabla de origen, día, médico, cliente y elemento"""
+
+    __tablename__ = "clinical_activity_rollups"
+
+    # diagnoses, procedures, referrals, prescriptions, lab_orders o imaging_orders
+    source = Column(String(20), primary_key=True)
+    activity_date = Column(Date, primary_key=True)
+    # Médico (idusuario) al que se atribuye el registro; 0 si no se conoce
+    user_id = Column(Integer, primary_key=True, default=0)
+    # Cliente corporativo (idcliente) del registro; 0 si no tiene
+    client_id = Column(Integer, primary_key=True, default=0)
+    # Código de diagnóstico, procedimiento o especialidad referida; 0 si no aplica
+    item_id = Column(Integer, primary_key=True, default=0)
+
+    row_count = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("idx_clinical_activity_rollups_user", "source", "user_id", "activity_date"),
+        Index("idx_clinical_activity_rollups_client", "source", "client_id", "activity_date"),
+    )
+
+    def __repr__(self):
+        return f"<ClinicalActivityRollup(source={self.source}, date={self.activity_date}, count={self.row_count})>"
+
+class ClinicalConsultation(Base):
+    """Días, médicos y clientes con diagnósticos de cada consulta (para contar consultas y pacientes distintos)"""
+
+    __tablename__ = "clinical_consultations"
+
+    consultation_id = Column(Integer, primary_key=True)
+    activity_date = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True, default=0)
+    client_id = Column(Integer, primary_key=True, default=0)
+    patient_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("idx_clinical_consultations_date", "activity_date", "user_id"),
+        Index("idx_clinical_consultations_client", "client_id", "activity_date"),
+    )
+
+    def __repr__(self):
+        return f"<ClinicalConsultation(consultation_id={self.consultation_id}, date={self.activity_date})>"
+
+class ClinicalRollupState(Base):
+    """Marca de agua por tabla de origen de los agregados de actividad clínica"""
+
+    __tablename__ = "clinical_rollup_state"
+
+    source = Column(String(20), primary_key=True)
+    # Mayor id ya agregado de la tabla de origen
+    last_id = Column(Integer, nullable=False, default=0)
+    # Mayor fecha de registro vista (fecha, creado o fecha_creacion)
+    last_activity_date = Column(Date, nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ClinicalRollupState(source={self.source}, last_id={self.last_id})>"
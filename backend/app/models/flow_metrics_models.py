@@ -0,0 +1,33 @@
+"""
+Historial de métricas de flujos por especialidad
+Lo alimenta FlowMetricsSnapshotScheduler a partir de flows y flow_nodes; solo se
+agregan filas (una por día y especialidad), nunca se actualizan
+"""
+
+from sqlalchemy import Column, String, Integer, Date, DateTime, DECIMAL, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class FlowMetricsHistory(Base):
+    """Métricas de los flujos activos de una especialidad al tomar la instantánea del día"""
+
+    __tablename__ = "flow_metrics_history"
+
+    snapshot_date = Column(Date, primary_key=True)
+    # flows.specialty_id ('general' si el flujo no tiene especialidad)
+    specialty_id = Column(String(36), primary_key=True)
+    specialty_name = Column(String(255), nullable=False)
+
+    flow_count = Column(Integer, nullable=False, default=0)
+    step_count = Column(Integer, nullable=False, default=0)
+    avg_cost = Column(DECIMAL(12, 2), nullable=True)
+    avg_duration = Column(DECIMAL(10, 2), nullable=True)  # en minutos
+
+    captured_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_flow_metrics_history_specialty", "specialty_id", "snapshot_date"),
+    )
+
+    def __repr__(self):
+        return f"<FlowMetricsHistory(date={self.snapshot_date}, specialty={self.specialty_id}, flows={self.flow_count})>"
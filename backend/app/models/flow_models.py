@@ -108,6 +108,7 @@ class Flow(Base):
     is_active = Column(Boolean, default=True)
     is_public = Column(Boolean, default=True)  # Si es visible públicamente
     version = Column(String(20), default='1.0')  # Versión del flujo
+    revision = Column(Integer, nullable=False, default=0, server_default='0')  # Se incrementa en cada guardado (ETag y caché del documento)
     
     # Metadatos
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -290,3 +291,25 @@ class NodeResource(Base):
             "quantity": self.quantity
         }
 
+
+class FlowStatisticsSummary(Base):
+    """Resumen precalculado de estadísticas de flujos activos, por dimensión"""
+    
+    __tablename__ = "flow_statistics_summary"
+    
+    # Dimensión del resumen: 'total', 'specialty', 'source_system' o 'flow_type'
+    dimension = Column(String(30), primary_key=True)
+    # Valor de la dimensión ('' para el total o para flujos sin valor)
+    dimension_value = Column(String(255), primary_key=True, default='')
+    
+    flow_count = Column(Integer, nullable=False, default=0)
+    node_count = Column(Integer, nullable=False, default=0)
+    edge_count = Column(Integer, nullable=False, default=0)
+    # Sumas para calcular promedios sin recorrer los flujos (NULL cuenta como 0)
+    duration_sum = Column(DECIMAL(16, 2), nullable=False, default=0)
+    cost_sum = Column(DECIMAL(16, 2), nullable=False, default=0)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<FlowStatisticsSummary(dimension={self.dimension}, value={self.dimension_value}, flows={self.flow_count})>"
@@ -0,0 +1,68 @@
+"""
+Modelos de los agregados de facturación precalculados
+Se alimentan de invoice_headers (base de datos de Bienimed)
+"""
+
+from sqlalchemy import Column, String, Integer, Date, DateTime, DECIMAL, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class RevenueRollup(Base):
+    """Facturación agregada por periodo, centro, método de pago y usuario"""
+
+    __tablename__ = "revenue_rollups"
+
+    # Granularidad del periodo: 'day', 'week' (inicia en lunes) o 'month'
+    granularity = Column(String(10), primary_key=True)
+    # Primer día del periodo
+    bucket_start = Column(Date, primary_key=True)
+    # 0 cuando la factura no tiene centro, método de pago o usuario
+    center_id = Column(Integer, primary_key=True, default=0)
+    payment_method_id = Column(Integer, primary_key=True, default=0)
+    # Usuario que registró la factura (id_created_by)
+    user_id = Column(Integer, primary_key=True, default=0)
+
+    invoice_count = Column(Integer, nullable=False, default=0)
+    revenue_total = Column(DECIMAL(16, 2), nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("idx_revenue_rollups_center", "granularity", "center_id", "bucket_start"),
+        Index("idx_revenue_rollups_user", "granularity", "user_id", "bucket_start"),
+    )
+
+    def __repr__(self):
+        return f"<RevenueRollup(granularity={self.granularity}, bucket={self.bucket_start}, revenue={self.revenue_total})>"
+
+class RevenuePatientTotal(Base):
+    """Facturación acumulada por paciente (histórico completo)"""
+
+    __tablename__ = "revenue_patient_totals"
+
+    patient_id = Column(Integer, primary_key=True)
+    invoice_count = Column(Integer, nullable=False, default=0)
+    revenue_total = Column(DECIMAL(16, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_revenue_patient_totals_revenue", "revenue_total"),
+    )
+
+    def __repr__(self):
+        return f"<RevenuePatientTotal(patient_id={self.patient_id}, revenue={self.revenue_total})>"
+
+class RevenueRollupState(Base):
+    """Marca de agua de la última factura incorporada a los agregados"""
+
+    __tablename__ = "revenue_rollup_state"
+
+    id = Column(Integer, primary_key=True, default=1)
+    # Mayor invoice_headers.id ya agregado
+    last_invoice_id = Column(Integer, nullable=False, default=0)
+    # Mayor created_date visto; los días recientes se recalculan en cada pasada
+    last_created_date = Column(Date, nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<RevenueRollupState(last_invoice_id={self.last_invoice_id}, last_created_date={self.last_created_date})>"
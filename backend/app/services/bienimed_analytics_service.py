@@ -2,14 +2,15 @@
 Servicio de Analytics usando datos de Bienimed
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
 from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager
 import json
 
 # Importar servicios de Bienimed
 from app.integrations.bienimed.services.patient_service import PatientService
-from app.integrations.bienimed.services.doctor_service import DoctorService
+from app.integrations.bienimed.services.doctor_service import DoctorService, PERFORMANCE_METRICS, PERFORMANCE_PERIODS
 from app.integrations.bienimed.services.diagnosis_service import DiagnosisService
 from app.integrations.bienimed.services.procedure_service import ProcedureService
 from app.integrations.bienimed.services.referral_service import ReferralService
@@ -17,177 +18,337 @@ from app.integrations.bienimed.services.prescription_service import Prescription
 from app.integrations.bienimed.services.laboratory_order_service import LaboratoryOrderService
 from app.integrations.bienimed.services.imaging_order_service import ImagingOrderService
 from app.integrations.bienimed.services.invoice_service import InvoiceService
+from app.integrations.bienimed.services.analytics_filters import resolve_center_id, dimension_user_ids
+from app.integrations.bienimed.database import BienimedSessionLocal
+from app.integrations.bienimed.models.patient import Patient
+from app.integrations.bienimed.models.doctor import Doctor
+from app.integrations.bienimed.models.diagnosis import Diagnosis
+from app.integrations.bienimed.models.procedure import Procedure
+from app.integrations.bienimed.models.referral import Referral
+from app.integrations.bienimed.models.prescription import Prescription
+from app.integrations.bienimed.models.laboratory_order import LaboratoryOrder
+from app.integrations.bienimed.models.imaging_order import ImagingOrder
+from app.integrations.bienimed.models.invoice import Invoice
+from app.core.cache import SnapshotCache
+from app.core.result_cache import cached
+from app.services.revenue_rollup_service import RevenueRollupService
+from app.services.clinical_rollup_service import ClinicalRollupService, RollupsNotReady, PERFORMANCE_SOURCES
+from app.core.config import settings
+from app.core.database import create_db_session
+
+
+def load_dashboard_stats() -> Dict[str, Any]:
+    """
+    Calcular las estadísticas del dashboard en una sola consulta: cada conteo
+    y la suma de facturación son subconsultas escalares de un mismo SELECT,
+    sobre las tablas completas. Usa su propia sesión porque también se ejecuta
+    en el hilo de refresco de la instantánea.
+    """
+    counts = {
+        "total_patients": select(func.count(Patient.id)),
+        "total_doctors": select(func.count(Doctor.id)).where(Doctor.estado == 'Activo'),
+        "total_diagnoses": select(func.count(Diagnosis.id)),
+        "total_procedures": select(func.count(Procedure.id)),
+        "total_referrals": select(func.count(Referral.id)),
+        "total_prescriptions": select(func.count(Prescription.id)),
+        "total_lab_orders": select(func.count(LaboratoryOrder.id)),
+        "total_imaging_orders": select(func.count(ImagingOrder.id)),
+        "total_invoices": select(func.count(Invoice.id)),
+        "total_revenue": select(func.coalesce(func.sum(Invoice.total), 0)),
+    }
+    db = BienimedSessionLocal()
+    try:
+        row = db.execute(select(*(query.scalar_subquery().label(name) for name, query in counts.items()))).one()
+    finally:
+        db.close()
+    
+    stats = {name: int(row._mapping[name]) for name in counts if name != "total_revenue"}
+    total_revenue = float(row.total_revenue or 0)
+    stats.update({
+        "total_revenue": round(total_revenue, 2),
+        "avg_invoice": round(total_revenue / stats["total_invoices"], 2) if stats["total_invoices"] else 0,
+        "last_updated": datetime.now().isoformat()
+    })
+    return stats
+
+
+# Instantánea compartida del dashboard (página inicial, consultada constantemente)
+dashboard_stats_snapshot = SnapshotCache(
+    load_dashboard_stats,
+    ttl_seconds=settings.DASHBOARD_STATS_TTL,
+    max_stale_seconds=settings.DASHBOARD_STATS_MAX_STALE,
+    name="dashboard-stats"
+)
+
 
 class BienimedAnalyticsService:
-    def __init__(self):
-        self.patient_service = PatientService()
-        self.doctor_service = DoctorService()
-        self.diagnosis_service = DiagnosisService()
-        self.procedure_service = ProcedureService()
-        self.referral_service = ReferralService()
-        self.prescription_service = PrescriptionService()
-        self.laboratory_service = LaboratoryOrderService()
-        self.imaging_service = ImagingOrderService()
-        self.invoice_service = InvoiceService()
+    def __init__(self, db: Session = None):
+        """
+        Todos los servicios de Bienimed comparten una sola sesión (una conexión
+        del pool). Si se recibe `db` (por ejemplo la sesión del request) quien
+        la creó la cierra; si no, se abre una propia que se libera con `close()`.
+        """
+        self._owns_db = db is None
+        self.db = db or BienimedSessionLocal()
+        self.patient_service = PatientService(self.db)
+        self.doctor_service = DoctorService(self.db)
+        self.diagnosis_service = DiagnosisService(self.db)
+        self.procedure_service = ProcedureService(self.db)
+        self.referral_service = ReferralService(self.db)
+        self.prescription_service = PrescriptionService(self.db)
+        self.laboratory_service = LaboratoryOrderService(self.db)
+        self.imaging_service = ImagingOrderService(self.db)
+        self.invoice_service = InvoiceService(self.db)
     
-    def get_dashboard_stats(self) -> Dict[str, Any]:
-        """Obtener estadísticas para el dashboard"""
+    def get_dashboard_stats(
+        self,
+        center_id: Optional[int] = None,
+        area_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        client_id: Optional[int] = None,
+        db: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        """
+        Obtener estadísticas para el dashboard. Sin filtros se sirven desde la
+        instantánea en caché; con centro, área, médico o cliente se calculan
+        desde los agregados (ver get_dashboard_slice).
+        """
+        if center_id or area_id or user_id or client_id:
+            return self.get_dashboard_slice(center_id, area_id, user_id, client_id, db=db)
         try:
-            # Contar totales
-            total_patients = self.patient_service.count_patients()
-            total_doctors = self.doctor_service.count_doctors()
-            total_diagnoses = self.diagnosis_service.count_diagnoses()
-            total_procedures = self.procedure_service.count_procedures()
-            total_referrals = self.referral_service.count_referrals()
-            total_prescriptions = self.prescription_service.count_prescriptions()
-            total_lab_orders = self.laboratory_service.count_laboratory_orders()
-            total_imaging_orders = self.imaging_service.count_imaging_orders()
-            total_invoices = self.invoice_service.count_invoices()
-            
-            # Calcular totales financieros
-            invoices = self.invoice_service.get_invoices(limit=1000)
-            total_revenue = sum(float(invoice.total) for invoice in invoices if invoice.total)
-            avg_invoice = total_revenue / len(invoices) if invoices else 0
+            return dict(dashboard_stats_snapshot.get())
+        except Exception as e:
+            print(f"Error getting dashboard stats: {e}")
+            return {}
+    
+    @cached("bienimed:dashboard_slice", ttl="BIENIMED_ANALYTICS_CACHE_TTL")
+    def get_dashboard_slice(
+        self,
+        center_id: Optional[int] = None,
+        area_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        client_id: Optional[int] = None,
+        db: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        """
+        Estadísticas del dashboard para un centro, área, médico o cliente, con
+        las mismas claves que la instantánea. Los registros clínicos salen de
+        clinical_activity_rollups, los pacientes son los atendidos (con algún
+        diagnóstico) y la facturación sale de revenue_rollups. Las facturas no
+        registran cliente: con `client_id` los campos de facturación son None.
+        
+        Los filtros inválidos lanzan ValueError; si los agregados clínicos
+        aún no tienen su primera construcción, RollupsNotReady.
+        """
+        try:
+            center_id = resolve_center_id(self.db, center_id, area_id)
+            user_ids = dimension_user_ids(self.db, center_id, None, user_id)
+            filters = {"user_ids": user_ids, "client_id": client_id}
+            with self._clinical_rollups(db) as rollups:
+                rollups.require_built()
+                counts = rollups.count_by_source(**filters)
+                patients = rollups.count_consultations(**filters)["patients"]
+                revenue = None
+                if not client_id:
+                    revenue = RevenueRollupService(rollups.db, self.db).get_revenue(
+                        granularity="month", center_id=center_id, user_id=user_id
+                    )
             
-            return {
-                "total_patients": total_patients,
-                "total_doctors": total_doctors,
-                "total_diagnoses": total_diagnoses,
-                "total_procedures": total_procedures,
-                "total_referrals": total_referrals,
-                "total_prescriptions": total_prescriptions,
-                "total_lab_orders": total_lab_orders,
-                "total_imaging_orders": total_imaging_orders,
-                "total_invoices": total_invoices,
-                "total_revenue": round(total_revenue, 2),
-                "avg_invoice": round(avg_invoice, 2),
-                "last_updated": datetime.now().isoformat()
+            stats = {
+                "total_patients": patients,
+                "total_doctors": len(self.doctor_service.list_performance_doctors(center_id, None, user_id)),
+                "total_diagnoses": counts["diagnoses"],
+                "total_procedures": counts["procedures"],
+                "total_referrals": counts["referrals"],
+                "total_prescriptions": counts["prescriptions"],
+                "total_lab_orders": counts["lab_orders"],
+                "total_imaging_orders": counts["imaging_orders"],
+                "total_invoices": revenue["invoice_count"] if revenue else None,
+                "total_revenue": revenue["total_revenue"] if revenue else None,
+                "avg_invoice": None,
             }
+            if revenue:
+                count = revenue["invoice_count"]
+                stats["avg_invoice"] = round(revenue["total_revenue"] / count, 2) if count else 0
+            stats.update({
+                "filters": {"center_id": center_id, "area_id": area_id, "user_id": user_id, "client_id": client_id},
+                "last_updated": datetime.now().isoformat()
+            })
+            return stats
+        except (ValueError, RollupsNotReady):
+            raise
         except Exception as e:
-            print(f"Error getting dashboard stats: {e}")
+            print(f"Error getting dashboard slice: {e}")
             return {}
+    
+    @contextmanager
+    def _clinical_rollups(self, db: Optional[Session]):
+        """Agregados de actividad clínica con la sesión recibida o una propia"""
+        own_db = create_db_session() if db is None else None
+        try:
+            yield ClinicalRollupService(db or own_db, self.db)
         finally:
-            self._close_services()
+            if own_db is not None:
+                own_db.close()
     
-    def get_patient_flow_analytics(self) -> Dict[str, Any]:
-        """Analizar flujos de pacientes basados en datos reales"""
+    @cached("bienimed:patient_flow", ttl="BIENIMED_ANALYTICS_CACHE_TTL")
+    def get_patient_flow_analytics(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        center_id: Optional[int] = None,
+        top_n: int = 10,
+        area_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        client_id: Optional[int] = None,
+        db: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        """
+        Analizar flujos de pacientes basados en datos reales.
+        
+        Los conteos y el top-N se leen de los agregados de actividad clínica
+        (clinical_activity_rollups), filtrados opcionalmente por rango de
+        fechas, centro, área, médico y cliente; de Bienimed solo se leen los
+        médicos del centro. Los filtros inválidos lanzan ValueError; si los
+        agregados aún no tienen su primera construcción, RollupsNotReady.
+        """
         try:
-            # Obtener diagnósticos más comunes
-            diagnoses = self.diagnosis_service.get_diagnoses(limit=100)
-            diagnosis_counts = {}
-            for diagnosis in diagnoses:
-                diag_id = diagnosis.iddiagnostico
-                diagnosis_counts[diag_id] = diagnosis_counts.get(diag_id, 0) + 1
-            
-            # Obtener procedimientos más comunes
-            procedures = self.procedure_service.get_procedures(limit=100)
-            procedure_counts = {}
-            for procedure in procedures:
-                proc_id = procedure.idprocedimiento
-                if proc_id:
-                    procedure_counts[proc_id] = procedure_counts.get(proc_id, 0) + 1
-            
-            # Obtener referencias más comunes
-            referrals = self.referral_service.get_referrals(limit=100)
-            referral_counts = {}
-            for referral in referrals:
-                spec_id = referral.idespecialidad
-                referral_counts[spec_id] = referral_counts.get(spec_id, 0) + 1
-            
-            # Obtener órdenes de laboratorio
-            lab_orders = self.laboratory_service.get_laboratory_orders(limit=100)
-            lab_count = len(lab_orders)
-            
-            # Obtener órdenes de imagenología
-            imaging_orders = self.imaging_service.get_imaging_orders(limit=100)
-            imaging_count = len(imaging_orders)
-            
+            user_ids = dimension_user_ids(self.db, center_id, area_id, user_id)
+            with self._clinical_rollups(db) as rollups:
+                analytics = rollups.get_patient_flow(start_date, end_date, user_ids, client_id, top_n)
             return {
-                "most_common_diagnoses": dict(sorted(diagnosis_counts.items(), key=lambda x: x[1], reverse=True)[:10]),
-                "most_common_procedures": dict(sorted(procedure_counts.items(), key=lambda x: x[1], reverse=True)[:10]),
-                "most_common_referrals": dict(sorted(referral_counts.items(), key=lambda x: x[1], reverse=True)[:10]),
-                "lab_orders_count": lab_count,
-                "imaging_orders_count": imaging_count,
-                "total_consultations": len(diagnoses),
+                **analytics,
+                "filters": {
+                    "start_date": start_date.isoformat() if start_date else None,
+                    "end_date": end_date.isoformat() if end_date else None,
+                    "center_id": center_id,
+                    "area_id": area_id,
+                    "user_id": user_id,
+                    "client_id": client_id
+                },
                 "analysis_date": datetime.now().isoformat()
             }
+        except (ValueError, RollupsNotReady):
+            raise
         except Exception as e:
             print(f"Error getting patient flow analytics: {e}")
             return {}
-        finally:
-            self._close_services()
     
-    def get_revenue_analytics(self) -> Dict[str, Any]:
-        """Analizar datos de facturación"""
+    @cached("bienimed:revenue", ttl="BIENIMED_ANALYTICS_CACHE_TTL")
+    def get_revenue_analytics(
+        self,
+        db: Session,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        granularity: str = "month",
+        center_id: Optional[int] = None,
+        payment_method_id: Optional[int] = None,
+        area_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        client_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Analizar datos de facturación desde los agregados precalculados
+        (revenue_rollups), para cualquier rango de fechas, filtrable por
+        centro (o área), método de pago y usuario que registró la factura.
+        Las facturas no registran cliente ni área: el área se resuelve a su
+        centro y `client_id` se rechaza. Los parámetros inválidos lanzan
+        ValueError; si los agregados aún no tienen su primera construcción,
+        RollupsNotReady.
+        """
+        if client_id:
+            raise ValueError("Las facturas no registran cliente: el filtro idcliente no aplica a facturación")
+        rollups = RevenueRollupService(db, self.db)
         try:
-            invoices = self.invoice_service.get_invoices(limit=1000)
-            
-            # Análisis por mes (simulado)
-            monthly_revenue = {}
-            for invoice in invoices:
-                if invoice.created_date:
-                    month_key = invoice.created_date.strftime("%Y-%m")
-                    monthly_revenue[month_key] = monthly_revenue.get(month_key, 0) + float(invoice.total or 0)
-            
-            # Análisis por paciente
-            patient_revenue = {}
-            for invoice in invoices:
-                if invoice.id_patient:
-                    patient_revenue[invoice.id_patient] = patient_revenue.get(invoice.id_patient, 0) + float(invoice.total or 0)
-            
-            # Top pacientes por facturación
-            top_patients = dict(sorted(patient_revenue.items(), key=lambda x: x[1], reverse=True)[:10])
-            
+            center_id = resolve_center_id(self.db, center_id, area_id)
+            filters = {"start_date": start_date, "end_date": end_date, "center_id": center_id,
+                       "payment_method_id": payment_method_id, "user_id": user_id}
+            revenue = rollups.get_revenue(granularity=granularity, **filters)
+            monthly = revenue if granularity == "month" else rollups.get_revenue(granularity="month", **filters)
             return {
-                "monthly_revenue": monthly_revenue,
-                "top_patients_by_revenue": top_patients,
-                "total_invoices_analyzed": len(invoices),
+                "monthly_revenue": {entry["period"][:7]: entry["revenue"] for entry in monthly["periods"]},
+                "top_patients_by_revenue": rollups.get_top_patients(10, start_date, end_date, center_id, user_id),
+                "total_invoices_analyzed": revenue["invoice_count"],
+                **revenue,
+                "rollup_state": rollups.get_state(),
                 "analysis_date": datetime.now().isoformat()
             }
+        except (ValueError, RollupsNotReady):
+            raise
         except Exception as e:
             print(f"Error getting revenue analytics: {e}")
             return {}
-        finally:
-            self._close_services()
     
-    def get_doctor_performance(self) -> Dict[str, Any]:
-        """Analizar rendimiento de doctores"""
+    @cached("bienimed:doctor_performance", ttl="BIENIMED_ANALYTICS_CACHE_TTL")
+    def get_doctor_performance(
+        self,
+        skip: int = 0,
+        limit: int = 50,
+        sort_by: str = "total_consultations",
+        descending: bool = True,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        center_id: Optional[int] = None,
+        specialty_id: Optional[int] = None,
+        period: Optional[str] = None,
+        area_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        client_id: Optional[int] = None,
+        db: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        """
+        Analizar rendimiento de doctores, paginado y ordenado por cualquier
+        métrica. Las métricas por idusuario se leen de los agregados de
+        actividad clínica; de Bienimed solo se lee la lista de doctores. Con
+        `period` ("month" o "year") agrega el desglose por periodo de los
+        doctores de la página. Centro, área y médico limitan la lista de
+        doctores; `client_id` limita las métricas a la actividad de ese cliente.
+        
+        Los parámetros inválidos lanzan ValueError; si los agregados aún no
+        tienen su primera construcción, RollupsNotReady.
+        """
+        if sort_by not in PERFORMANCE_METRICS:
+            raise ValueError(f"Métrica de orden no válida: {sort_by}. Opciones: {', '.join(PERFORMANCE_METRICS)}")
+        if period and period not in PERFORMANCE_PERIODS:
+            raise ValueError(f"Periodo no válido: {period}. Opciones: {', '.join(PERFORMANCE_PERIODS)}")
         try:
-            doctors = self.doctor_service.get_doctors(limit=50)
-            doctor_stats = {}
-            
-            for doctor in doctors:
-                # Contar diagnósticos por doctor
-                diagnoses = self.diagnosis_service.get_diagnoses(limit=1000)
-                doctor_diagnoses = [d for d in diagnoses if d.idusuario == doctor.idusuario]
-                
-                # Contar procedimientos por doctor
-                procedures = self.procedure_service.get_procedures(limit=1000)
-                doctor_procedures = [p for p in procedures if p.idusuario == doctor.idusuario]
-                
-                # Contar recetas por doctor
-                prescriptions = self.prescription_service.get_prescriptions(limit=1000)
-                doctor_prescriptions = [pr for pr in prescriptions if pr.iddiagnostico in [d.iddiagnostico for d in doctor_diagnoses]]
+            center_id = resolve_center_id(self.db, center_id, area_id)
+            doctors = self.doctor_service.list_performance_doctors(center_id, specialty_id, user_id)
+            # Con centro o médico se leen solo los agregados de esos doctores
+            user_ids = [doctor["user_id"] for doctor in doctors] if center_id or user_id else None
+            with self._clinical_rollups(db) as rollups:
+                activity = rollups.get_user_activity(start_date, end_date, user_ids, client_id)
+                for doctor in doctors:
+                    totals = activity.get(doctor["user_id"], {})
+                    doctor.update({metric: totals.get(metric, 0) for metric in PERFORMANCE_SOURCES})
+                    doctor["total_consultations"] = doctor["total_diagnoses"] + doctor["total_procedures"]
                 
-                doctor_stats[doctor.id] = {
-                    "name": f"Dr. {doctor.primernombre} {doctor.apellidopaterno}",
-                    "specialty_id": doctor.idespecialidad,
-                    "total_diagnoses": len(doctor_diagnoses),
-                    "total_procedures": len(doctor_procedures),
-                    "total_prescriptions": len(doctor_prescriptions),
-                    "total_consultations": len(doctor_diagnoses) + len(doctor_procedures)
-                }
+                # Orden estable por id para empates, como en la consulta en la base de datos
+                doctors.sort(key=lambda doctor: -doctor[sort_by] if descending else doctor[sort_by])
+                page = doctors[skip:skip + limit]
+                if period:
+                    breakdown = rollups.get_user_activity_by_period(
+                        [doctor["user_id"] for doctor in page], period, start_date, end_date, client_id
+                    )
+                    for doctor in page:
+                        doctor["periods"] = breakdown.get(doctor["user_id"], {})
             
             return {
-                "doctor_performance": doctor_stats,
-                "total_doctors_analyzed": len(doctors),
+                "doctor_performance": {doctor.pop("id"): doctor for doctor in page},
+                "total_doctors_analyzed": len(page),
+                "total_doctors": len(doctors),
+                "skip": skip,
+                "limit": limit,
+                "sort_by": sort_by,
+                "order": "desc" if descending else "asc",
+                "period": period,
                 "analysis_date": datetime.now().isoformat()
             }
+        except (ValueError, RollupsNotReady):
+            raise
         except Exception as e:
             print(f"Error getting doctor performance: {e}")
             return {}
-        finally:
-            self._close_services()
     
     def generate_flow_recommendations(self) -> List[Dict[str, Any]]:
         """Generar recomendaciones de flujos basadas en datos reales"""
@@ -253,23 +414,8 @@ class BienimedAnalyticsService:
         except Exception as e:
             print(f"Error generating flow recommendations: {e}")
             return []
-        finally:
-            self._close_services()
     
-    def _close_services(self):
-        """Cerrar todas las conexiones de servicios"""
-        try:
-            self.patient_service.close()
-            self.doctor_service.close()
-            self.diagnosis_service.close()
-            self.procedure_service.close()
-            self.referral_service.close()
-            self.prescription_service.close()
-            self.laboratory_service.close()
-            self.imaging_service.close()
-            self.invoice_service.close()
-        except:
-            pass
-
-
-
+    def close(self):
+        """Liberar la sesión de Bienimed si la abrió este servicio"""
+        if self._owns_db and self.db:
+            self.db.close()
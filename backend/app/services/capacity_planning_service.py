@@ -0,0 +1,369 @@
+"""
+Planificación de capacidad por centro y recurso
+Convierte la demanda pronosticada de cada especialidad (demand_forecast_service)
+en minutos de recurso con los requerimientos de los pasos de sus flujos
+(node_resources: cantidad × duración del paso), la reparte entre los centros que
+ofrecen la especialidad sin exceder la capacidad de cada recurso (resources y
+health_centers.capacity) y compara la utilización resultante con la de un
+reparto parejo entre centros. Todo el cálculo son operaciones matriciales
+especialidades × centros × recursos.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import json
+import math
+import time
+import numpy as np
+import structlog
+
+from app.core.config import settings
+from app.services.demand_forecast_service import predict_demand
+from app.services.flow_search_index import fold_text
+
+logger = structlog.get_logger()
+
+# Duración asumida de un paso sin duration_minutes
+DEFAULT_STEP_MINUTES = 30
+# Utilización objetivo: por encima se recomienda ampliar, por debajo de LOW_UTILIZATION hay capacidad ociosa
+TARGET_UTILIZATION = 0.85
+LOW_UTILIZATION = 0.5
+# Rondas del reparto; cada una reparte la demanda pendiente en la capacidad libre
+MAX_ALLOCATION_ROUNDS = 50
+
+
+def _json_value(value: Any) -> Any:
+    """Las columnas JSON llegan como texto con algunos drivers"""
+    if isinstance(value, (str, bytes)):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def even_split(demand: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+    """Demanda de cada especialidad repartida en partes iguales entre sus centros (reparto sin planificar)"""
+    centers = eligible.sum(axis=1, keepdims=True)
+    return np.divide(demand[:, None] * eligible, centers, out=np.zeros(eligible.shape), where=centers > 0)
+
+
+def _room(slack: np.ndarray, load: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+    """Pacientes de cada especialidad que caben en cada centro con la capacidad libre (inf si no usa recursos limitados)"""
+    safe_load = np.where(load > 0, load, 1.0)
+    ratio = np.where(load[:, None, :] > 0, slack[None, :, :] / safe_load[:, None, :], np.inf)
+    return np.where(eligible, ratio.min(axis=2, initial=np.inf), 0.0)
+
+
+def solve_allocation(
+    demand: np.ndarray,
+    load: np.ndarray,
+    eligible: np.ndarray,
+    capacity: np.ndarray,
+    max_rounds: int = MAX_ALLOCATION_ROUNDS
+) -> np.ndarray:
+    """
+    Pacientes de cada especialidad asignados a cada centro (especialidades ×
+    centros) sin exceder la capacidad.
+
+    `load` son los minutos de cada recurso por paciente (especialidades ×
+    recursos) y `capacity` los minutos disponibles (centros × recursos). En
+    cada ronda la demanda pendiente se ofrece a los centros en proporción a
+    cuántos pacientes más les caben; si la suma de las ofertas excede un
+    recurso, las ofertas de las especialidades que lo usan se recortan en la
+    misma proporción. Así la carga queda pareja entre centros y lo que no
+    cabe en ningún lado queda como demanda no atendida.
+    """
+    allocation = np.zeros(eligible.shape)
+    remaining = demand.astype(float).copy()
+    for _ in range(max_rounds):
+        slack = np.maximum(capacity - allocation.T @ load, 0.0)
+        room = _room(slack, load, eligible)
+        unlimited = np.isinf(room)
+        # Donde algún centro no tiene límite, la oferta se reparte en partes iguales entre esos centros
+        weights = np.where(unlimited.any(axis=1, keepdims=True), unlimited, np.where(unlimited, 0.0, room)).astype(float)
+        totals = weights.sum(axis=1, keepdims=True)
+        offer = np.divide(remaining[:, None] * weights, totals, out=np.zeros(weights.shape), where=totals > 0)
+        offer = np.minimum(offer, room)
+
+        requested = offer.T @ load
+        fraction = np.minimum(np.divide(slack, requested, out=np.ones(slack.shape), where=requested > 0), 1.0)
+        scale = np.where(load[:, None, :] > 0, fraction[None, :, :], 1.0).min(axis=2, initial=1.0)
+        granted = offer * scale
+        if granted.sum() <= 1e-9:
+            break
+        allocation += granted
+        remaining = np.maximum(remaining - granted.sum(axis=1), 0.0)
+        if remaining.sum() <= 1e-6:
+            break
+    return allocation
+
+
+class CapacityPlanningService:
+    """Plan de capacidad de la red de centros para la demanda pronosticada"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # -- Datos ----------------------------------------------------------------
+
+    def _flow_loads(self) -> Tuple[Dict[str, str], Dict[str, Dict[str, float]]]:
+        """
+        Minutos de cada recurso por paciente de cada especialidad: suma de
+        cantidad × duración de los pasos de cada flujo activo, promediada
+        entre los flujos de la especialidad. Retorna nombres y cargas por
+        especialidad (clave: nombre sin acentos).
+        """
+        names: Dict[str, str] = {}
+        flow_counts: Dict[str, int] = {}
+        for specialty_name, flow_count in self.db.execute(text("""
+            SELECT specialty_name, COUNT(*)
+            FROM flows
+            WHERE is_active = 1 AND specialty_name IS NOT NULL AND specialty_name != 'Sin especialidad'
+            GROUP BY specialty_name
+        """)):
+            key = fold_text(specialty_name)
+            names.setdefault(key, specialty_name)
+            flow_counts[key] = flow_counts.get(key, 0) + int(flow_count)
+
+        loads: Dict[str, Dict[str, float]] = {}
+        for specialty_name, resource_code, minutes in self.db.execute(text("""
+            SELECT f.specialty_name, nr.resource_code, SUM(COALESCE(nr.quantity, 1) * COALESCE(fn.duration_minutes, :default_minutes))
+            FROM flows f
+            JOIN flow_nodes fn ON fn.flow_id = f.id
+            JOIN node_resources nr ON nr.node_id = fn.id
+            WHERE f.is_active = 1 AND f.specialty_name IS NOT NULL AND f.specialty_name != 'Sin especialidad'
+            GROUP BY f.specialty_name, nr.resource_code
+        """), {"default_minutes": DEFAULT_STEP_MINUTES}):
+            key, code = fold_text(specialty_name), fold_text(resource_code).strip()
+            if code and minutes:
+                by_code = loads.setdefault(key, {})
+                by_code[code] = by_code.get(code, 0.0) + float(minutes) / flow_counts[key]
+        return names, loads
+
+    def _specialty_names(self) -> Dict[str, str]:
+        """Nombre sin acentos de cada id de especialidad (catálogo original y normalizado)"""
+        names = {}
+        for table in ("specialties", "specialties_normalized"):
+            try:
+                names.update({str(specialty_id): fold_text(name) for specialty_id, name in self.db.execute(
+                    text(f"SELECT id, name FROM {table}")
+                )})
+            except Exception:
+                self.db.rollback()
+        return names
+
+    def _centers(self) -> List[Dict[str, Any]]:
+        """
+        Centros activos con las especialidades que ofrecen (None = todas) y
+        unidades y costo por hora de cada recurso: los recursos registrados
+        (resources, por tipo) y, para los tipos sin registros, la capacidad
+        declarada del centro (health_centers.capacity).
+        """
+        specialty_names = self._specialty_names()
+        centers: Dict[str, Dict[str, Any]] = {}
+        for center_id, name, capacity, specialties in self.db.execute(text("""
+            SELECT id, name, capacity, specialties FROM health_centers WHERE is_active = 1
+        """)):
+            declared = _json_value(capacity) or {}
+            offered = _json_value(specialties)
+            centers[center_id] = {
+                "id": center_id,
+                "name": name,
+                "specialties": (
+                    {specialty_names.get(str(value), fold_text(str(value))) for value in offered}
+                    if isinstance(offered, list) and offered else None
+                ),
+                "units": {
+                    fold_text(code).strip(): float(units)
+                    for code, units in (declared.items() if isinstance(declared, dict) else [])
+                    if isinstance(units, (int, float)) and units > 0
+                },
+                "cost_per_hour": {},
+            }
+
+        registered: Dict[str, Dict[str, float]] = {}
+        for center_id, resource_type, units, cost in self.db.execute(text("""
+            SELECT health_center_id, type, SUM(capacity), SUM(capacity * cost_per_hour) / NULLIF(SUM(capacity), 0)
+            FROM resources
+            WHERE is_active = 1 AND health_center_id IS NOT NULL AND capacity > 0
+            GROUP BY health_center_id, type
+        """)):
+            if center_id in centers:
+                code = fold_text(resource_type).strip()
+                registered.setdefault(center_id, {})[code] = float(units)
+                centers[center_id]["cost_per_hour"][code] = float(cost or 0)
+        for center_id, units in registered.items():
+            centers[center_id]["units"].update(units)
+        return list(centers.values())
+
+    # -- Plan -----------------------------------------------------------------
+
+    def plan(self, horizon: int = 30, specialty_ids: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+        """
+        Plan de capacidad para los próximos `horizon` días: reparto de la
+        demanda por especialidad entre centros, utilización por centro y
+        recurso (reparto parejo contra planificado), unidades faltantes y
+        ociosas. Lanza ValueError si el horizonte no es válido.
+        """
+        started = time.perf_counter()
+        predictions = predict_demand(horizon, specialty_ids)
+        flow_names, flow_loads = self._flow_loads()
+        centers = self._centers()
+
+        predicted = {fold_text(p["specialty_name"]): p for p in predictions}
+        keys = sorted(key for key in flow_loads if key in predicted)
+        codes = sorted({code for key in keys for code in flow_loads[key]})
+        minutes_per_unit = settings.RESOURCE_MINUTES_PER_DAY * horizon
+
+        demand = np.array([predicted[key]["predicted_demand"] for key in keys], dtype=float)
+        load = np.array([[flow_loads[key].get(code, 0.0) for code in codes] for key in keys]).reshape(len(keys), len(codes))
+        eligible = np.array([
+            [center["specialties"] is None or key in center["specialties"] for center in centers] for key in keys
+        ], dtype=bool).reshape(len(keys), len(centers))
+        units = np.array([[center["units"].get(code, 0.0) for code in codes] for center in centers]).reshape(len(centers), len(codes))
+        capacity = units * minutes_per_unit
+
+        # Recursos sin capacidad registrada en ningún centro: no limitan el reparto
+        constrained = capacity.sum(axis=0) > 0
+        allocation = solve_allocation(demand, load[:, constrained], eligible, capacity[:, constrained])
+        baseline = even_split(demand, eligible)
+        unmet = np.maximum(demand - allocation.sum(axis=1), 0.0)
+
+        planned_minutes = allocation.T @ load
+        baseline_minutes = baseline.T @ load
+        # Minutos que faltan para la demanda no atendida, en los centros que ofrecen la especialidad
+        unmet_share = even_split(unmet, eligible)
+        missing_minutes = unmet_share.T @ load
+
+        items = self._items(
+            centers, codes, predicted, keys, flow_names, units, capacity, constrained, allocation,
+            planned_minutes, baseline_minutes, missing_minutes, load, minutes_per_unit
+        )
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            "Capacity plan computed",
+            specialties=len(keys), centers=len(centers), resources=len(codes), elapsed_ms=elapsed_ms
+        )
+        return {
+            "summary": {
+                "prediction_horizon": horizon,
+                "minutes_per_unit": minutes_per_unit,
+                "specialties": len(keys),
+                "centers": len(centers),
+                "resources": len(codes),
+                "predicted_patients": int(round(demand.sum())),
+                "served_patients": int(round(allocation.sum())),
+                "unmet_patients": int(round(unmet.sum())),
+                "unconstrained_resources": [code for code, limited in zip(codes, constrained) if not limited],
+                "specialties_without_flows": sorted(
+                    p["specialty_name"] for key, p in predicted.items() if key not in flow_loads
+                ),
+                "elapsed_ms": elapsed_ms,
+            },
+            "allocations": [
+                {
+                    "specialty_id": predicted[key]["specialty_id"],
+                    "specialty_name": predicted[key]["specialty_name"],
+                    "predicted_demand": int(demand[s]),
+                    "served": round(float(allocation[s].sum()), 1),
+                    "unmet": round(float(unmet[s]), 1),
+                    "by_center": {
+                        center["id"]: round(float(allocation[s, c]), 1)
+                        for c, center in enumerate(centers) if allocation[s, c] > 0
+                    },
+                }
+                for s, key in enumerate(keys)
+            ],
+            "items": items,
+        }
+
+    def _items(
+        self, centers, codes, predicted, keys, flow_names, units, capacity, constrained, allocation,
+        planned_minutes, baseline_minutes, missing_minutes, load, minutes_per_unit
+    ) -> List[Dict[str, Any]]:
+        """Utilización y recomendaciones por centro y recurso (o por recurso si no tiene capacidad registrada)"""
+        items = []
+        for r, code in enumerate(codes):
+            if not constrained[r]:
+                demand_minutes = float(planned_minutes[:, r].sum() + missing_minutes[:, r].sum())
+                top = int(load[:, r].argmax()) if len(keys) else None
+                items.append({
+                    "center_id": None,
+                    "center_name": None,
+                    "specialty_id": predicted[keys[top]]["specialty_id"] if top is not None else None,
+                    "specialty_name": flow_names[keys[top]] if top is not None else None,
+                    "resource_type": code,
+                    "capacity_units": 0,
+                    "demand_minutes": round(demand_minutes, 1),
+                    "current_utilization": None,
+                    "optimal_utilization": None,
+                    "additional_units_needed": math.ceil(demand_minutes / TARGET_UTILIZATION / minutes_per_unit),
+                    "idle_units": 0,
+                    "potential_savings": 0.0,
+                    "implementation_priority": "medium",
+                    "recommendations": [f"Registrar la capacidad de {code} en los centros: hoy no limita el plan"],
+                })
+                continue
+
+            for c, center in enumerate(centers):
+                if capacity[c, r] <= 0 and baseline_minutes[c, r] <= 0:
+                    continue
+                current = baseline_minutes[c, r] / capacity[c, r] if capacity[c, r] > 0 else None
+                optimal = planned_minutes[c, r] / capacity[c, r] if capacity[c, r] > 0 else None
+                # Unidades para atender lo planificado más la demanda no atendida a la utilización objetivo
+                required = (planned_minutes[c, r] + missing_minutes[c, r]) / TARGET_UTILIZATION / minutes_per_unit
+                additional = max(0, math.ceil(required - units[c, r] - 1e-9))
+                idle = max(0, math.floor(units[c, r] - required)) if optimal is not None and optimal < LOW_UTILIZATION else 0
+                hourly_cost = center["cost_per_hour"].get(code, 0.0)
+                savings = idle * minutes_per_unit / 60 * hourly_cost
+
+                consumers = allocation[:, c] * load[:, r]
+                top = int(consumers.argmax()) if consumers.size and consumers.max() > 0 else None
+
+                recommendations = []
+                if additional > 0:
+                    recommendations.append(f"Agregar {additional} unidad(es) de {code} para cubrir la demanda pronosticada")
+                if current is not None and current > 1 and optimal is not None and optimal <= 1:
+                    recommendations.append(
+                        f"Derivar pacientes a centros con capacidad libre: la utilización pasa de {current:.0%} a {optimal:.0%}"
+                    )
+                elif current is not None and optimal is not None and optimal - current > 0.1:
+                    recommendations.append(f"Recibir pacientes derivados de centros saturados (utilización {optimal:.0%})")
+                if idle > 0:
+                    recommendations.append(f"Capacidad ociosa: {idle} unidad(es) de {code} se pueden reasignar")
+                if optimal is not None and TARGET_UTILIZATION < optimal <= 1 and additional == 0:
+                    recommendations.append(f"Utilización sobre el objetivo de {TARGET_UTILIZATION:.0%}: vigilar tiempos de espera")
+                if not recommendations:
+                    recommendations.append("Capacidad adecuada para la demanda pronosticada")
+
+                if additional > 0 or capacity[c, r] <= 0 or (current is not None and current > 1):
+                    priority = "high"
+                elif idle > 0 or (optimal is not None and optimal > TARGET_UTILIZATION):
+                    priority = "medium"
+                else:
+                    priority = "low"
+
+                items.append({
+                    "center_id": center["id"],
+                    "center_name": center["name"],
+                    "specialty_id": predicted[keys[top]]["specialty_id"] if top is not None else None,
+                    "specialty_name": flow_names[keys[top]] if top is not None else None,
+                    "resource_type": code,
+                    "capacity_units": float(units[c, r]),
+                    "demand_minutes": round(float(planned_minutes[c, r]), 1),
+                    "current_utilization": round(float(current), 3) if current is not None else None,
+                    "optimal_utilization": round(float(optimal), 3) if optimal is not None else None,
+                    "additional_units_needed": additional,
+                    "idle_units": idle,
+                    "potential_savings": round(savings, 2),
+                    "implementation_priority": priority,
+                    "recommendations": recommendations,
+                })
+
+        order = {"high": 0, "medium": 1, "low": 2}
+        items.sort(key=lambda item: (
+            order[item["implementation_priority"]], -(item["optimal_utilization"] or 0), item["resource_type"]
+        ))
+        return items
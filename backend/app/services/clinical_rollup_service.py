@@ -0,0 +1,594 @@
+"""
+Agregados de actividad clínica
+Mantiene clinical_activity_rollups (registros por tabla de origen, día, médico,
+cliente y elemento) y clinical_consultations (días, médicos y clientes de cada
+consulta) a partir de las tablas clínicas de Bienimed, de forma incremental
+con una marca de agua por tabla (mayor id y mayor fecha de registro). La
+analítica de flujo de pacientes y el rendimiento de médicos se leen de aquí
+sin consultar la base de datos clínica.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text, func, bindparam, select
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
+import threading
+import time
+import structlog
+
+from app.core.config import settings
+from app.core.database import create_db_session
+from app.core.result_cache import result_cache
+from app.integrations.bienimed.database import BienimedSessionLocal
+from app.integrations.bienimed.models.diagnosis import Diagnosis
+from app.integrations.bienimed.models.procedure import Procedure
+from app.integrations.bienimed.models.referral import Referral
+from app.integrations.bienimed.models.prescription import Prescription
+from app.integrations.bienimed.models.laboratory_order import LaboratoryOrder
+from app.integrations.bienimed.models.imaging_order import ImagingOrder
+from app.integrations.bienimed.services.doctor_service import PERFORMANCE_METRICS, PERFORMANCE_PERIODS
+
+logger = structlog.get_logger()
+
+# Tablas de origen de los agregados
+CLINICAL_SOURCES = ("diagnoses", "procedures", "referrals", "prescriptions", "lab_orders", "imaging_orders")
+# Métricas del reporte de rendimiento de médicos y su tabla de origen
+PERFORMANCE_SOURCES = {
+    "total_diagnoses": "diagnoses",
+    "total_procedures": "procedures",
+    "total_prescriptions": "prescriptions",
+}
+# Valor guardado cuando el registro no tiene médico o elemento
+NO_DIMENSION = 0
+# Filas escritas por sentencia
+WRITE_BATCH_SIZE = 5000
+# Espacios del caché de resultados que se leen de estos agregados
+DERIVED_CACHE_NAMESPACES = ("bienimed:patient_flow", "bienimed:doctor_performance", "bienimed:dashboard_slice")
+
+# Una sola actualización de agregados a la vez dentro del proceso
+_refresh_lock = threading.Lock()
+
+# Filas (día, médico, cliente, elemento, registros)
+ActivityTotals = List[Tuple[date, int, int, int, int]]
+
+
+class RollupsNotReady(RuntimeError):
+    """Los agregados todavía no tienen su primera construcción (la hace la tarea de fondo)"""
+
+
+def _as_date(value: Any) -> Optional[date]:
+    """DATE() devuelve texto en algunos motores"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def _chunks(values: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _day_runs(days: Iterable[date]) -> Iterable[Tuple[date, date]]:
+    """Rangos (primer día, último día) de días consecutivos"""
+    run_start = run_end = None
+    for day in sorted(days):
+        if run_end is not None and day == run_end + timedelta(days=1):
+            run_end = day
+            continue
+        if run_start is not None:
+            yield run_start, run_end
+        run_start = run_end = day
+    if run_start is not None:
+        yield run_start, run_end
+
+
+def _day_range(source: str, first_day: date, last_day: date):
+    """
+    Condición de los registros de la tabla cuyo día está entre dos fechas,
+    sobre la columna original (sin DATE()) para que use su índice
+    """
+    if source == "diagnoses":
+        return Diagnosis.fecha.between(first_day, last_day)
+    column = {
+        "procedures": Procedure.creado,
+        "referrals": Referral.creado,
+        "prescriptions": Prescription.fecha_creacion,
+        "lab_orders": LaboratoryOrder.fecha_creacion,
+        "imaging_orders": ImagingOrder.fecha_creacion,
+    }[source]
+    return (column >= datetime.combine(first_day, datetime.min.time())) & \
+        (column < datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+
+
+def _source_columns(source: str):
+    """
+    (modelo, columna id, día, médico, cliente, elemento, join) de cada tabla de
+    origen. Las recetas y órdenes se atribuyen al médico y cliente del
+    diagnóstico al que pertenecen; las referencias, a los de los diagnósticos
+    de su consulta.
+    """
+    if source == "diagnoses":
+        return (Diagnosis, Diagnosis.id, Diagnosis.fecha, Diagnosis.idusuario, Diagnosis.idcliente,
+                Diagnosis.iddiagnostico, None)
+    if source == "procedures":
+        return (Procedure, Procedure.id, func.date(Procedure.creado), Procedure.idusuario, Procedure.idcliente,
+                Procedure.idprocedimiento, None)
+    if source == "referrals":
+        def consultation_value(column):
+            return select(func.min(column)).where(
+                Diagnosis.idconsulta == Referral.idconsulta
+            ).correlate(Referral).scalar_subquery()
+        return (Referral, Referral.id, func.date(Referral.creado), consultation_value(Diagnosis.idusuario),
+                consultation_value(Diagnosis.idcliente), Referral.idespecialidad, None)
+    model = {"prescriptions": Prescription, "lab_orders": LaboratoryOrder, "imaging_orders": ImagingOrder}[source]
+    return (model, model.id, func.date(model.fecha_creacion), Diagnosis.idusuario, Diagnosis.idcliente,
+            None, Diagnosis.id == model.iddiagnostico)
+
+
+class ClinicalRollupService:
+    """Lectura y mantenimiento incremental de los agregados de actividad clínica"""
+
+    def __init__(self, db: Session, bienimed_db: Optional[Session] = None):
+        self.db = db
+        self._owns_bienimed_db = bienimed_db is None
+        self.bienimed_db = bienimed_db or BienimedSessionLocal()
+
+    # -- Mantenimiento ----------------------------------------------------
+
+    def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Incorporar a los agregados las filas con id mayor a la marca de agua de
+        cada tabla y recalcular los últimos CLINICAL_ROLLUP_LOOKBACK_DAYS días
+        (ver _apply_new_rows). Cada tabla se confirma en su propia transacción.
+
+        Con `full=True` (o si una tabla aún no tiene marca de agua) la
+        reconstruye completa. Las ediciones y borrados de filas más antiguas
+        que esa ventana solo se reflejan con una reconstrucción completa.
+        """
+        with _refresh_lock:
+            started = time.perf_counter()
+            sources = {}
+            for source in CLINICAL_SOURCES:
+                state = self._read_state(source)
+                model = _source_columns(source)[0]
+                upper_id = self.bienimed_db.query(func.max(model.id)).scalar() or 0
+                try:
+                    if full or state is None:
+                        sources[source] = self._rebuild(source, state, upper_id)
+                    else:
+                        sources[source] = self._apply_new_rows(source, state, upper_id)
+                    self.db.commit()
+                except Exception:
+                    self.db.rollback()
+                    raise
+
+        if any(source_result["mode"] in ("full", "incremental") for source_result in sources.values()):
+            for namespace in DERIVED_CACHE_NAMESPACES:
+                result_cache.invalidate(namespace)
+        result = {
+            "sources": sources,
+            "new_rows": sum(source_result.get("new_rows", 0) for source_result in sources.values()),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info("Clinical rollups refreshed", new_rows=result["new_rows"], elapsed_ms=result["elapsed_ms"])
+        return result
+
+    def is_built(self) -> bool:
+        """Si todas las tablas de origen tienen marca de agua (primera construcción hecha)"""
+        return set(CLINICAL_SOURCES) <= set(self.get_state())
+
+    def require_built(self) -> None:
+        """
+        Las lecturas no construyen los agregados: la primera construcción la
+        hace ClinicalRollupScheduler al iniciar la aplicación (o
+        POST /clinical-rollups/refresh). Mientras tanto se lanza RollupsNotReady.
+        """
+        if not self.is_built():
+            raise RollupsNotReady("Los agregados de actividad clínica se están construyendo; intente más tarde")
+
+    def _rebuild(self, source: str, state: Optional[Tuple[int, Optional[date]]], upper_id: int) -> Dict[str, Any]:
+        id_column = _source_columns(source)[1]
+        totals = self._source_totals(source, id_column <= upper_id)
+        if not self._claim_state(source, state, upper_id, max((row[0] for row in totals), default=None)):
+            return {"mode": "skipped", "last_id": state[0]}
+
+        self.db.execute(text("DELETE FROM clinical_activity_rollups WHERE source = :source"), {"source": source})
+        self._insert_totals(source, totals)
+        if source == "diagnoses":
+            self.db.execute(text("DELETE FROM clinical_consultations"))
+            self._insert_consultations(self._consultations_query(Diagnosis.id <= upper_id).all())
+
+        return {"mode": "full", "last_id": upper_id, "new_rows": sum(row[4] for row in totals), "groups": len(totals)}
+
+    def _apply_new_rows(self, source: str, state: Tuple[int, Optional[date]], upper_id: int) -> Dict[str, Any]:
+        """
+        Recalcular desde la tabla de origen los días con filas nuevas (id mayor
+        a la marca) y los últimos CLINICAL_ROLLUP_LOOKBACK_DAYS días hasta la
+        fecha de la marca, como en los agregados de facturación. Los días se
+        reemplazan completos, así que las filas que se confirman tarde con un
+        id menor a la marca (y las ediciones o borrados) dentro de esa ventana
+        quedan reflejadas sin contarse dos veces.
+        """
+        last_id, last_date = state
+        model, id_column, day = _source_columns(source)[:3]
+        new_rows: Dict[date, int] = {}
+        if upper_id > last_id:
+            rows = self.bienimed_db.query(day, func.count(id_column)).select_from(model).filter(
+                id_column > last_id, id_column <= upper_id, day.isnot(None)
+            ).group_by(day)
+            new_rows = {_as_date(row[0]): row[1] for row in rows}
+        dirty_days = set(new_rows)
+        if last_date:
+            dirty_days.update(last_date - timedelta(days=offset) for offset in range(settings.CLINICAL_ROLLUP_LOOKBACK_DAYS))
+        if not dirty_days:
+            return {"mode": "unchanged", "last_id": last_id, "new_rows": 0}
+
+        high_water_date = max([day for day in (last_date, *new_rows) if day], default=None)
+        if not self._claim_state(source, state, upper_id, high_water_date):
+            return {"mode": "skipped", "last_id": last_id}
+
+        groups = 0
+        for first_day, last_day in _day_runs(dirty_days):
+            days = {"source": source, "first_day": first_day, "last_day": last_day}
+            totals = self._source_totals(source, id_column <= upper_id, _day_range(source, first_day, last_day))
+            self.db.execute(text("""
+                DELETE FROM clinical_activity_rollups
+                WHERE source = :source AND activity_date BETWEEN :first_day AND :last_day
+            """), days)
+            self._insert_totals(source, totals)
+            groups += len(totals)
+            if source == "diagnoses":
+                self.db.execute(text("""
+                    DELETE FROM clinical_consultations WHERE activity_date BETWEEN :first_day AND :last_day
+                """), days)
+                self._insert_consultations(self._consultations_query(
+                    Diagnosis.id <= upper_id, _day_range(source, first_day, last_day)
+                ).all())
+
+        return {"mode": "incremental", "last_id": upper_id, "new_rows": sum(new_rows.values()),
+                "days": len(dirty_days), "groups": groups}
+
+    def _source_totals(self, source: str, *conditions) -> ActivityTotals:
+        """Filas de la tabla de origen agrupadas por día, médico, cliente y elemento (en Bienimed)"""
+        model, id_column, day, user, client, item, join = _source_columns(source)
+        columns = [day, func.coalesce(user, NO_DIMENSION), func.coalesce(client, NO_DIMENSION)]
+        if item is not None:
+            columns.append(func.coalesce(item, NO_DIMENSION))
+        query = self.bienimed_db.query(*columns, func.count(id_column)).select_from(model)
+        if join is not None:
+            query = query.outerjoin(Diagnosis, join)
+        rows = query.filter(day.isnot(None), *conditions).group_by(*columns)
+        if item is None:
+            return [(_as_date(row[0]), row[1], row[2], NO_DIMENSION, row[3]) for row in rows]
+        return [(_as_date(row[0]), row[1], row[2], row[3], row[4]) for row in rows]
+
+    def _insert_totals(self, source: str, totals: ActivityTotals) -> None:
+        for batch in _chunks(totals, WRITE_BATCH_SIZE):
+            self.db.execute(text("""
+                INSERT INTO clinical_activity_rollups
+                    (source, activity_date, user_id, client_id, item_id, row_count, updated_at)
+                VALUES
+                    (:source, :activity_date, :user_id, :client_id, :item_id, :row_count, CURRENT_TIMESTAMP)
+            """), [
+                {"source": source, "activity_date": day, "user_id": user_id, "client_id": client_id,
+                 "item_id": item_id, "row_count": count}
+                for day, user_id, client_id, item_id, count in batch
+            ])
+
+    def _consultations_query(self, *conditions):
+        """
+        Grupos (consulta, día, médico, cliente) de los diagnósticos con el
+        paciente de la consulta (en Bienimed)
+        """
+        columns = [
+            Diagnosis.idconsulta, Diagnosis.fecha,
+            func.coalesce(Diagnosis.idusuario, NO_DIMENSION), func.coalesce(Diagnosis.idcliente, NO_DIMENSION)
+        ]
+        return self.bienimed_db.query(*columns, func.max(Diagnosis.idpaciente)).filter(
+            Diagnosis.idconsulta.isnot(None), *conditions
+        ).group_by(*columns)
+
+    def _insert_consultations(self, rows: List[Tuple[int, date, int, int, Optional[int]]]) -> None:
+        for batch in _chunks(rows, WRITE_BATCH_SIZE):
+            self.db.execute(text("""
+                INSERT INTO clinical_consultations (consultation_id, activity_date, user_id, client_id, patient_id)
+                VALUES (:consultation_id, :activity_date, :user_id, :client_id, :patient_id)
+            """), [
+                {"consultation_id": consultation_id, "activity_date": _as_date(day), "user_id": user_id,
+                 "client_id": client_id, "patient_id": patient_id}
+                for consultation_id, day, user_id, client_id, patient_id in batch
+            ])
+
+    def _read_state(self, source: str) -> Optional[Tuple[int, Optional[date]]]:
+        row = self.db.execute(text("""
+            SELECT last_id, last_activity_date FROM clinical_rollup_state WHERE source = :source
+        """), {"source": source}).fetchone()
+        return (row[0], _as_date(row[1])) if row else None
+
+    def _claim_state(
+        self,
+        source: str,
+        state: Optional[Tuple[int, Optional[date]]],
+        upper_id: int,
+        last_activity_date: Optional[date]
+    ) -> bool:
+        """
+        Avanzar la marca de agua de la tabla al inicio de la transacción. Si
+        otro proceso ya la movió desde que se leyó, no se actualiza nada y se
+        retorna False.
+        """
+        params = {"source": source, "upper_id": upper_id, "last_activity_date": last_activity_date}
+        if state is None:
+            self.db.execute(text("DELETE FROM clinical_rollup_state WHERE source = :source"), params)
+            self.db.execute(text("""
+                INSERT INTO clinical_rollup_state (source, last_id, last_activity_date, updated_at)
+                VALUES (:source, :upper_id, :last_activity_date, CURRENT_TIMESTAMP)
+            """), params)
+            return True
+        result = self.db.execute(text("""
+            UPDATE clinical_rollup_state
+            SET last_id = :upper_id, last_activity_date = :last_activity_date, updated_at = CURRENT_TIMESTAMP
+            WHERE source = :source AND last_id = :last_id
+        """), {**params, "last_id": state[0]})
+        return result.rowcount == 1
+
+    # -- Consultas ----------------------------------------------------------
+
+    @staticmethod
+    def _filters(
+        start_date: Optional[date],
+        end_date: Optional[date],
+        user_ids: Optional[Sequence[int]],
+        client_id: Optional[int]
+    ) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Condiciones de rango de fechas y dimensiones. `user_ids` son los médicos
+        que dejan pasar los filtros de centro, área y médico (None = todos).
+        """
+        conditions, params = [], {}
+        if start_date:
+            conditions.append("activity_date >= :start_date")
+            params["start_date"] = start_date
+        if end_date:
+            conditions.append("activity_date <= :end_date")
+            params["end_date"] = end_date
+        if user_ids is not None:
+            conditions.append("user_id IN :user_ids")
+            params["user_ids"] = list(user_ids)
+        if client_id:
+            conditions.append("client_id = :client_id")
+            params["client_id"] = client_id
+        return conditions, params
+
+    def _query(self, sql: str, conditions: List[str], params: Dict[str, Any]):
+        statement = text(sql.format(where=" AND ".join(conditions) or "1 = 1"))
+        if "user_ids" in params:
+            statement = statement.bindparams(bindparam("user_ids", expanding=True))
+        return self.db.execute(statement, params)
+
+    def get_top_items(
+        self,
+        source: str,
+        limit: int = 10,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        client_id: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """Elementos más frecuentes de una tabla como (elemento, total)"""
+        conditions, params = self._filters(start_date, end_date, user_ids, client_id)
+        conditions += ["source = :source", f"item_id <> {NO_DIMENSION}"]
+        rows = self._query("""
+            SELECT item_id, SUM(row_count) AS total
+            FROM clinical_activity_rollups
+            WHERE {where}
+            GROUP BY item_id
+            ORDER BY total DESC, item_id
+            LIMIT :limit
+        """, conditions, {**params, "source": source, "limit": limit})
+        return [(row[0], int(row[1])) for row in rows]
+
+    def count_by_source(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        client_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Total de registros de cada tabla de origen en el rango"""
+        conditions, params = self._filters(start_date, end_date, user_ids, client_id)
+        totals = dict.fromkeys(CLINICAL_SOURCES, 0)
+        for source, total in self._query("""
+            SELECT source, SUM(row_count) FROM clinical_activity_rollups WHERE {where} GROUP BY source
+        """, conditions, params):
+            totals[source] = int(total or 0)
+        return totals
+
+    def get_daily_totals(
+        self,
+        source: str,
+        dimension: str = "user_id",
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> List[Tuple[date, int, int]]:
+        """Registros de una tabla por día y médico (`user_id`) o elemento (`item_id`) como (día, clave, total)"""
+        if dimension not in ("user_id", "item_id"):
+            raise ValueError(f"Dimensión no válida: {dimension}. Opciones: user_id, item_id")
+        conditions, params = self._filters(start_date, end_date, None, None)
+        conditions.append("source = :source")
+        rows = self._query(f"""
+            SELECT activity_date, {dimension}, SUM(row_count)
+            FROM clinical_activity_rollups
+            WHERE {{where}}
+            GROUP BY activity_date, {dimension}
+        """, conditions, {**params, "source": source})
+        return [(_as_date(day), key, int(total)) for day, key, total in rows]
+
+    def count_consultations(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        client_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Consultas y pacientes distintos con al menos un diagnóstico en el rango"""
+        conditions, params = self._filters(start_date, end_date, user_ids, client_id)
+        row = self._query("""
+            SELECT COUNT(DISTINCT consultation_id), COUNT(DISTINCT patient_id)
+            FROM clinical_consultations WHERE {where}
+        """, conditions, params).fetchone()
+        return {"consultations": int(row[0] or 0), "patients": int(row[1] or 0)}
+
+    def get_patient_flow(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        client_id: Optional[int] = None,
+        top_n: int = 10
+    ) -> Dict[str, Any]:
+        """Rankings y conteos del análisis de flujo de pacientes leídos de los agregados"""
+        self.require_built()
+        filters = {"start_date": start_date, "end_date": end_date, "user_ids": user_ids, "client_id": client_id}
+        counts = self.count_by_source(**filters)
+        return {
+            "most_common_diagnoses": dict(self.get_top_items("diagnoses", top_n, **filters)),
+            "most_common_procedures": dict(self.get_top_items("procedures", top_n, **filters)),
+            "most_common_referrals": dict(self.get_top_items("referrals", top_n, **filters)),
+            "lab_orders_count": counts["lab_orders"],
+            "imaging_orders_count": counts["imaging_orders"],
+            "total_consultations": self.count_consultations(**filters)["consultations"],
+        }
+
+    def get_user_activity(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        user_ids: Optional[Sequence[int]] = None,
+        client_id: Optional[int] = None
+    ) -> Dict[int, Dict[str, int]]:
+        """Diagnósticos, procedimientos y recetas por médico: {idusuario: {métrica: total}}"""
+        self.require_built()
+        metrics = {source: metric for metric, source in PERFORMANCE_SOURCES.items()}
+        conditions, params = self._filters(start_date, end_date, user_ids, client_id)
+        conditions.append("source IN ('diagnoses', 'procedures', 'prescriptions')")
+        activity: Dict[int, Dict[str, int]] = {}
+        for source, user_id, total in self._query("""
+            SELECT source, user_id, SUM(row_count)
+            FROM clinical_activity_rollups
+            WHERE {where}
+            GROUP BY source, user_id
+        """, conditions, params):
+            activity.setdefault(user_id, dict.fromkeys(PERFORMANCE_SOURCES, 0))[metrics[source]] = int(total)
+        return activity
+
+    def get_user_activity_by_period(
+        self,
+        user_ids: Sequence[int],
+        period: str = "month",
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        client_id: Optional[int] = None
+    ) -> Dict[int, Dict[str, Dict[str, int]]]:
+        """
+        Desglose por periodo ("month" o "year") de las métricas de un grupo de
+        médicos: {idusuario: {"2024-01": {métrica: total}}}.
+        """
+        if period not in PERFORMANCE_PERIODS:
+            raise ValueError(f"Periodo no válido: {period}. Opciones: {', '.join(PERFORMANCE_PERIODS)}")
+        if not user_ids:
+            return {}
+        self.require_built()
+        metrics = {source: metric for metric, source in PERFORMANCE_SOURCES.items()}
+        conditions, params = self._filters(start_date, end_date, user_ids, client_id)
+        conditions.append("source IN ('diagnoses', 'procedures', 'prescriptions')")
+
+        breakdown: Dict[int, Dict[str, Dict[str, int]]] = {}
+        for source, user_id, day, total in self._query("""
+            SELECT source, user_id, activity_date, SUM(row_count)
+            FROM clinical_activity_rollups
+            WHERE {where}
+            GROUP BY source, user_id, activity_date
+        """, conditions, params):
+            day = _as_date(day)
+            key = f"{day.year:04d}-{day.month:02d}" if period == "month" else f"{day.year:04d}"
+            totals = breakdown.setdefault(user_id, {}).setdefault(key, dict.fromkeys(PERFORMANCE_METRICS, 0))
+            totals[metrics[source]] += int(total)
+            if source != "prescriptions":
+                totals["total_consultations"] += int(total)
+        return {user_id: dict(sorted(periods.items())) for user_id, periods in breakdown.items()}
+
+    def get_state(self) -> Dict[str, Any]:
+        """Marca de agua actual de cada tabla de origen"""
+        rows = self.db.execute(text("""
+            SELECT source, last_id, last_activity_date, updated_at FROM clinical_rollup_state
+        """)).fetchall()
+        return {
+            source: {
+                "last_id": last_id,
+                "last_activity_date": _as_date(last_activity_date).isoformat() if last_activity_date else None,
+                "updated_at": updated_at.isoformat() if hasattr(updated_at, "isoformat") else updated_at
+            }
+            for source, last_id, last_activity_date, updated_at in rows
+        }
+
+    def close(self):
+        """Cerrar la sesión de Bienimed si la abrió este servicio"""
+        if self._owns_bienimed_db and self.bienimed_db:
+            self.bienimed_db.close()
+
+
+class ClinicalRollupScheduler:
+    """
+    Actualiza los agregados de actividad clínica en un hilo de fondo cada
+    `interval_seconds`. La primera pasada, al iniciar la aplicación, hace la
+    construcción inicial que esperan las lecturas (ver require_built).
+    """
+
+    def __init__(self, interval_seconds: int = 300):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Iniciar el hilo (no hace nada si el intervalo es 0 o ya está corriendo)"""
+        if self.interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="clinical-rollups", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detener el hilo esperando a que termine la pasada en curso"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Ejecutar una actualización con sesiones propias; los errores se registran"""
+        db = create_db_session()
+        service = ClinicalRollupService(db)
+        try:
+            self.last_result = service.refresh()
+            self.last_error = None
+            return self.last_result
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error("Error refreshing clinical rollups", error=str(e))
+            return None
+        finally:
+            service.close()
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+
+clinical_rollup_scheduler = ClinicalRollupScheduler(settings.CLINICAL_ROLLUP_INTERVAL)
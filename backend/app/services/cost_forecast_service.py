@@ -0,0 +1,83 @@
+"""
+Pronóstico de costo de la atención por centro
+Ajusta el mismo ETS(A,Ad,A) del pronóstico de demanda (demand_forecast_service)
+sobre el monto facturado diario de cada centro, leído de los agregados diarios
+de revenue_rollups.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+from datetime import date, timedelta
+import time
+import structlog
+
+from app.core.cache import SnapshotCache
+from app.core.config import settings
+from app.core.database import create_db_session
+from app.integrations.bienimed.database import BienimedSessionLocal
+from app.services.demand_forecast_service import build_predictions, build_series, current_model, fit_series_models
+from app.services.revenue_rollup_service import NO_DIMENSION, RevenueRollupService
+
+logger = structlog.get_logger()
+
+# Nombre del modelo de costo en el registro
+COST_MODEL = "cost_forecast"
+
+
+def load_daily_cost(history_days: int) -> Dict[str, Any]:
+    """
+    Monto facturado diario por centro hasta ayer: matriz centros × días, ids
+    y nombres. Las facturas sin centro no forman serie. Lanza RollupsNotReady
+    mientras los agregados de facturación no tienen su primera construcción.
+    """
+    end_date = date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=history_days - 1)
+    db, bienimed_db = create_db_session(), BienimedSessionLocal()
+    try:
+        rows = RevenueRollupService(db, bienimed_db).get_daily_totals(start_date, end_date)
+    finally:
+        bienimed_db.close()
+        db.close()
+
+    events: Dict[int, Dict[date, float]] = {}
+    for day, center_id, revenue in rows:
+        if center_id != NO_DIMENSION:
+            by_day = events.setdefault(center_id, {})
+            by_day[day] = by_day.get(day, 0.0) + revenue
+
+    data = build_series(events, end_date)
+    data["names"] = [f"Centro {center_id}" for center_id in data["keys"]]
+    return data
+
+
+def fit_cost_models() -> Dict[str, Any]:
+    """Cargar la facturación diaria y ajustar los modelos de todos los centros"""
+    started = time.perf_counter()
+    model = fit_series_models(load_daily_cost(settings.DEMAND_FORECAST_HISTORY_DAYS))
+    logger.info(
+        "Cost forecast models fitted",
+        centers=len(model["keys"]),
+        history_days=model["days"],
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+    )
+    return model
+
+
+# Parámetros ajustados en el proceso cuando no hay una versión publicada
+cost_model_snapshot = SnapshotCache(
+    fit_cost_models,
+    ttl_seconds=settings.DEMAND_FORECAST_REFIT_SECONDS,
+    max_stale_seconds=settings.DEMAND_FORECAST_MAX_STALE,
+    name="cost-forecast"
+)
+
+
+def predict_cost(horizon: int = 30, center_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Monto facturado pronosticado de cada centro para los próximos `horizon`
+    días (ver build_predictions). Lanza ValueError si el horizonte no es
+    válido.
+    """
+    return build_predictions(
+        current_model(COST_MODEL, cost_model_snapshot), horizon, center_ids,
+        "center_id", "center_name", "predicted_cost", integer=False
+    )
@@ -0,0 +1,613 @@
+"""
+Pronóstico de demanda por especialidad
+Ajusta Holt-Winters aditivo con tendencia amortiguada y estacionalidad semanal
+(ETS(A,Ad,A)) sobre la actividad clínica diaria real: diagnósticos y
+procedimientos por la especialidad del médico que los registró y referencias
+por la especialidad referida, leídos de clinical_activity_rollups. Todas las
+especialidades y todas las combinaciones de parámetros se ajustan a la vez con
+NumPy; los parámetros y estados finales quedan en una instantánea y cada
+request solo evalúa el pronóstico para su horizonte. Los modelos entrenados
+fuera de línea (train_models.py) se publican en model_registry y tienen
+prioridad sobre el ajuste dentro del proceso.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+import itertools
+import threading
+import time
+import numpy as np
+import structlog
+
+from app.core.cache import SnapshotCache
+from app.core.config import settings
+from app.core.model_registry import ModelArtifact, model_registry
+from app.core.database import create_db_session
+from app.integrations.bienimed.database import BienimedSessionLocal
+from app.integrations.bienimed.models.catalog import SpecialtyCatalog
+from app.integrations.bienimed.services.doctor_service import DoctorService
+from app.services.clinical_rollup_service import ClinicalRollupService
+
+logger = structlog.get_logger()
+
+# Estacionalidad semanal sobre datos diarios
+SEASON_LENGTH = 7
+# Amortiguación de la tendencia (phi): evita extrapolar la pendiente sin límite
+DAMPING = 0.98
+# Rejilla de parámetros de suavizado (alpha: nivel, beta: tendencia, gamma: estacionalidad)
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+BETAS = (0.0, 0.01, 0.05)
+GAMMAS = (0.0, 0.05, 0.1, 0.2)
+# Historia mínima: dos temporadas para inicializar y al menos una para evaluar
+MIN_HISTORY_DAYS = 3 * SEASON_LENGTH
+# Cobertura nominal de los intervalos de confianza
+INTERVAL_LEVEL = 0.95
+# Horizonte máximo en días
+MAX_HORIZON_DAYS = 365
+# Espera entre reajustes en segundo plano de un modelo desactualizado
+STALE_REFIT_RETRY_SECONDS = 300
+
+
+def _parameter_grid() -> np.ndarray:
+    """Combinaciones admisibles (alpha, beta, gamma): beta <= alpha y gamma <= 1 - alpha"""
+    grid = [
+        (alpha, beta, gamma)
+        for alpha, beta, gamma in itertools.product(ALPHAS, BETAS, GAMMAS)
+        if beta <= alpha and gamma <= 1 - alpha
+    ]
+    return np.array(grid)
+
+
+def fit_holt_winters(series: np.ndarray, phi: float = DAMPING, season_length: int = SEASON_LENGTH) -> Dict[str, np.ndarray]:
+    """
+    Ajustar ETS(A,Ad,A) a cada fila de `series` (especialidades × días).
+
+    Recorre los días una sola vez evaluando a la vez todas las combinaciones
+    de la rejilla para todas las series (arreglos de combinaciones ×
+    especialidades) y elige, por especialidad, la de menor error cuadrático
+    de pronóstico a un paso. Retorna parámetros, estados finales y la
+    desviación estándar de los residuos.
+    """
+    grid = _parameter_grid()
+    alpha, beta, gamma = (grid[:, i][:, None] for i in range(3))
+    n_series, n_days = series.shape
+    m = season_length
+
+    # Inicialización clásica con las dos primeras temporadas
+    first, second = series[:, :m].mean(axis=1), series[:, m:2 * m].mean(axis=1)
+    level = np.broadcast_to(first, (len(grid), n_series)).copy()
+    trend = np.broadcast_to((second - first) / m, (len(grid), n_series)).copy()
+    seasonal = np.broadcast_to(series[:, :m] - first[:, None], (len(grid), n_series, m)).copy()
+
+    sse = np.zeros((len(grid), n_series))
+    for t in range(n_days):
+        slot = t % m
+        error = series[:, t] - (level + phi * trend + seasonal[:, :, slot])
+        # La primera temporada se usó para inicializar: no cuenta en el ajuste
+        if t >= m:
+            sse += error * error
+        level = level + phi * trend + alpha * error
+        trend = phi * trend + beta * error
+        seasonal[:, :, slot] += gamma * error
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(n_series)
+    return {
+        "alpha": grid[best, 0],
+        "beta": grid[best, 1],
+        "gamma": grid[best, 2],
+        "level": level[best, columns],
+        "trend": trend[best, columns],
+        "seasonal": seasonal[best, columns],
+        "sigma": np.sqrt(sse[best, columns] / (n_days - m)),
+    }
+
+
+def forecast_holt_winters(
+    model: Dict[str, Any],
+    horizon: int,
+    phi: float = DAMPING,
+    season_length: int = SEASON_LENGTH
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluar el pronóstico de `horizon` días de todas las series ajustadas:
+    media diaria, componente sin estacionalidad y los pesos acumulados
+    C_i = Σ_{j<=i} c_j, con c_j = alpha + beta·phi_j + gamma·[j mod m = 0], que
+    usa window_forecast para los intervalos de cualquier ventana de días.
+    """
+    m = season_length
+    steps = np.arange(1, horizon + 1)
+    # phi_h = phi + phi² + ... + phi^h
+    damped = np.cumsum(phi ** steps)
+    slots = (model["days"] - 1 + steps) % m
+
+    alpha, beta, gamma = (model[name][:, None] for name in ("alpha", "beta", "gamma"))
+    base = model["level"][:, None] + damped * model["trend"][:, None]
+
+    # c_j para j = 1..H-1 y sus acumulados C_0 = 0, ..., C_{H-1}
+    lags = steps[:-1]
+    c = alpha + beta * damped[:-1] + gamma * (lags % m == 0)
+    return {
+        "mean": base + model["seasonal"][:, slots],
+        "base": base,
+        "weights": np.concatenate([np.zeros((c.shape[0], 1)), np.cumsum(c, axis=1)], axis=1),
+        "sigma": model["sigma"],
+    }
+
+
+def window_forecast(
+    forecast: Dict[str, np.ndarray],
+    first: int,
+    last: int,
+    rows: Optional[np.ndarray] = None,
+    level: float = INTERVAL_LEVEL
+) -> Dict[str, np.ndarray]:
+    """
+    Total pronosticado de los días `first`..`last` (1 = mañana, inclusive)
+    de las filas `rows` (todas por defecto), con intervalo de confianza.
+
+    El error de la suma es Σ_k coef_k·ε_k sobre las innovaciones k = 1..last,
+    con coef_k = [k >= first] + C_{last-k} - [k < first]·C_{first-1-k}, así que
+    su varianza es sigma² · Σ_k coef_k². Con first = last es la varianza
+    diaria de ETS(A,Ad,A) y con first = 1, la del total del horizonte.
+    """
+    if rows is None:
+        rows = np.arange(len(forecast["sigma"]))
+    weights = forecast["weights"][rows]
+    k = np.arange(1, last + 1)
+    before = k < first
+    coef = np.broadcast_to((~before).astype(float), (len(rows), last)) + weights[:, last - k]
+    coef[:, before] -= weights[:, first - 1 - k[before]]
+    sd = forecast["sigma"][rows] * np.sqrt((coef * coef).sum(axis=1))
+
+    mean = forecast["mean"][rows, first - 1:last].sum(axis=1)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    return {
+        "value": np.clip(mean, 0, None),
+        "lower": np.clip(mean - z * sd, 0, None),
+        "upper": mean + z * sd,
+        "trend_only": np.clip(forecast["base"][rows, first - 1:last].sum(axis=1), 0, None),
+    }
+
+
+def build_series(events: Dict[int, Dict[date, float]], end_date: date) -> Dict[str, Any]:
+    """
+    Matriz series × días desde el primer día con datos de cualquier serie
+    hasta `end_date`, a partir de {clave: {día: valor}}.
+    """
+    first_day = min((min(by_day) for by_day in events.values()), default=end_date)
+    n_days = (end_date - first_day).days + 1
+    keys = sorted(events)
+    series = np.zeros((len(keys), max(n_days, 0)))
+    for row, key in enumerate(keys):
+        for day, value in events[key].items():
+            series[row, (day - first_day).days] = value
+    return {"keys": keys, "series": series, "first_day": first_day, "last_day": end_date}
+
+
+def load_daily_demand(history_days: int) -> Dict[str, Any]:
+    """
+    Demanda diaria por especialidad hasta ayer (el día en curso está
+    incompleto): matriz especialidades × días, ids y nombres. Lanza
+    RollupsNotReady mientras los agregados clínicos no tienen su primera
+    construcción.
+    """
+    end_date = date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=history_days - 1)
+    db, bienimed_db = create_db_session(), BienimedSessionLocal()
+    try:
+        rollups = ClinicalRollupService(db, bienimed_db)
+        rollups.require_built()
+        specialties_by_user = DoctorService(bienimed_db).get_user_specialties()
+        names = dict(bienimed_db.query(SpecialtyCatalog.id, SpecialtyCatalog.nombre))
+
+        events: Dict[int, Dict[date, float]] = {}
+        for source in ("diagnoses", "procedures"):
+            for day, user_id, total in rollups.get_daily_totals(source, "user_id", start_date, end_date):
+                specialty_id = specialties_by_user.get(user_id)
+                if specialty_id:
+                    by_day = events.setdefault(specialty_id, {})
+                    by_day[day] = by_day.get(day, 0) + total
+        for day, specialty_id, total in rollups.get_daily_totals("referrals", "item_id", start_date, end_date):
+            if specialty_id:
+                by_day = events.setdefault(specialty_id, {})
+                by_day[day] = by_day.get(day, 0) + total
+    finally:
+        bienimed_db.close()
+        db.close()
+
+    data = build_series(events, end_date)
+    data["names"] = [names.get(specialty_id) or f"Especialidad {specialty_id}" for specialty_id in data["keys"]]
+    return data
+
+
+def fit_series_models(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ajustar los modelos de todas las series de `data` (ver build_series, con
+    "names" alineado a "keys"). Sin historia suficiente el modelo queda sin
+    series.
+    """
+    series = data["series"]
+    model: Dict[str, Any] = {**data, "days": series.shape[1], "fitted_at": datetime.now().isoformat()}
+    if series.shape[1] >= MIN_HISTORY_DAYS and len(data["keys"]):
+        model.update(fit_holt_winters(series))
+        # Promedio diario reciente (últimas 8 semanas) como referencia
+        model["recent_daily_mean"] = series[:, -8 * SEASON_LENGTH:].mean(axis=1)
+    else:
+        model["keys"], model["names"] = [], []
+    return model
+
+
+def fit_demand_models() -> Dict[str, Any]:
+    """Cargar la historia y ajustar los modelos de todas las especialidades (carga de la instantánea)"""
+    started = time.perf_counter()
+    model = fit_series_models(load_daily_demand(settings.DEMAND_FORECAST_HISTORY_DAYS))
+    logger.info(
+        "Demand forecast models fitted",
+        specialties=len(model["keys"]),
+        history_days=model["days"],
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+    )
+    return model
+
+
+# -- Artefactos (model_registry) ----------------------------------------------
+
+# Arreglos por serie que se guardan en el artefacto
+MODEL_ARRAYS = ("alpha", "beta", "gamma", "level", "trend", "seasonal", "sigma", "recent_daily_mean")
+
+
+def model_to_artifact(model: Dict[str, Any]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Separar un modelo ajustado en arreglos (para mapear en memoria) y metadatos JSON"""
+    arrays = {"keys": np.asarray(model["keys"], dtype=np.int64)}
+    if len(model["keys"]):
+        arrays.update({name: np.asarray(model[name], dtype=np.float64) for name in MODEL_ARRAYS})
+    meta = {
+        "names": list(model["names"]),
+        "days": int(model["days"]),
+        "first_day": model["first_day"].isoformat(),
+        "last_day": model["last_day"].isoformat(),
+        "fitted_at": model["fitted_at"],
+        "summary": {"series": len(model["keys"]), "history_days": int(model["days"])},
+    }
+    return arrays, meta
+
+
+def model_from_artifact(artifact: ModelArtifact) -> Dict[str, Any]:
+    """Modelo con la forma de fit_series_models a partir de una versión cargada"""
+    meta = artifact.meta
+    return {
+        **artifact.arrays,
+        "names": meta["names"],
+        "days": meta["days"],
+        "first_day": date.fromisoformat(meta["first_day"]),
+        "last_day": date.fromisoformat(meta["last_day"]),
+        "fitted_at": meta["fitted_at"],
+        "version": artifact.version,
+    }
+
+
+def train_and_publish(name: str, fit: Callable[[], Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """Ajustar un modelo y publicarlo como la versión activa del registro"""
+    model = fit()
+    arrays, meta = model_to_artifact(model)
+    version = model_registry.publish(name, arrays, meta)
+    model_registry.prune(name)
+    return version, model
+
+
+# Nombre del modelo de demanda en el registro
+DEMAND_MODEL = "demand_forecast"
+
+# Parámetros ajustados en el proceso cuando no hay una versión publicada
+demand_model_snapshot = SnapshotCache(
+    fit_demand_models,
+    ttl_seconds=settings.DEMAND_FORECAST_REFIT_SECONDS,
+    max_stale_seconds=settings.DEMAND_FORECAST_MAX_STALE,
+    name="demand-forecast"
+)
+
+
+def current_model(name: str, snapshot: SnapshotCache) -> Dict[str, Any]:
+    """
+    Versión activa del registro si hay una publicada (memoria compartida
+    entre workers); si no, los parámetros ajustados en el proceso. Si la
+    historia del modelo quedó más de una temporada atrás de hoy se reajusta
+    en segundo plano y, mientras tanto, se sirve marcado con "stale".
+    """
+    artifact = model_registry.get(name)
+    model = model_from_artifact(artifact) if artifact is not None else snapshot.get()
+    if forecast_offset(model) > SEASON_LENGTH:
+        _refit_in_background(name, snapshot)
+        return {**model, "stale": True}
+    return model
+
+
+def forecast_offset(model: Dict[str, Any]) -> int:
+    """
+    Días entre el último día de historia del modelo y hoy (0 si la historia
+    llega hasta ayer). Los pronósticos empiezan hoy: se omiten esos pasos.
+    """
+    return max(0, (date.today() - model["last_day"]).days - 1)
+
+
+# Último intento de reajuste en segundo plano por modelo (time.monotonic())
+_stale_refits: Dict[str, float] = {}
+_stale_refits_lock = threading.Lock()
+
+
+def _refit_in_background(name: str, snapshot: SnapshotCache) -> None:
+    """Reajustar un modelo desactualizado en un hilo; a lo sumo un intento cada STALE_REFIT_RETRY_SECONDS"""
+    with _stale_refits_lock:
+        now = time.monotonic()
+        if now - _stale_refits.get(name, -STALE_REFIT_RETRY_SECONDS) < STALE_REFIT_RETRY_SECONDS:
+            return
+        _stale_refits[name] = now
+
+    def run():
+        try:
+            refit_models(name, snapshot)
+        except Exception as e:
+            logger.error("Error refitting stale forecast model", model=name, error=str(e))
+
+    logger.warning("Forecast model is stale, refitting in background", model=name)
+    threading.Thread(target=run, name=f"refit-{name}", daemon=True).start()
+
+
+def refit_models(name: str, snapshot: SnapshotCache) -> Dict[str, Any]:
+    """
+    Reajustar con los datos más recientes: si el modelo se sirve desde el
+    registro se publica una versión nueva (todos los workers cambian a ella);
+    si no, se recalcula la instantánea del proceso.
+    """
+    if model_registry.current_version(name) is not None:
+        return train_and_publish(name, snapshot.loader)[1]
+    return snapshot.refresh()
+
+
+def horizon_period(horizon: int) -> str:
+    """Periodo (TimePeriod) más cercano a un horizonte en días"""
+    for days, period in ((1, "daily"), (7, "weekly"), (31, "monthly"), (92, "quarterly")):
+        if horizon <= days:
+            return period
+    return "yearly"
+
+
+# Inicio del periodo de calendario que contiene un día ('weekly' empieza en lunes)
+PERIOD_STARTS: Dict[str, Callable[[date], date]] = {
+    "daily": lambda day: day,
+    "weekly": lambda day: day - timedelta(days=day.weekday()),
+    "monthly": lambda day: day.replace(day=1),
+    "quarterly": lambda day: day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1),
+    "yearly": lambda day: day.replace(month=1, day=1),
+}
+
+
+def period_windows(last_day: date, horizon: int, time_period: str) -> List[Tuple[int, int, date, date]]:
+    """
+    Ventanas (primer paso, último paso, primer día, último día) de los
+    periodos de calendario que cubren los `horizon` días siguientes a
+    `last_day`; el primero y el último pueden ser parciales.
+    """
+    if time_period not in PERIOD_STARTS:
+        raise ValueError(f"Periodo no válido: {time_period}. Opciones: {', '.join(PERIOD_STARTS)}")
+    period_start = PERIOD_STARTS[time_period]
+    windows: List[Tuple[int, int, date, date]] = []
+    for step in range(1, horizon + 1):
+        day = last_day + timedelta(days=step)
+        if windows and period_start(day) == period_start(windows[-1][3]):
+            windows[-1] = (windows[-1][0], step, windows[-1][2], day)
+        else:
+            windows.append((step, step, day, day))
+    return windows
+
+
+def _validate_horizon(horizon: int) -> None:
+    if not 1 <= horizon <= MAX_HORIZON_DAYS:
+        raise ValueError(f"El horizonte debe estar entre 1 y {MAX_HORIZON_DAYS} días")
+
+
+def _evaluate(
+    model: Dict[str, Any],
+    forecast: Dict[str, np.ndarray],
+    model_rows: np.ndarray,
+    forecast_rows: np.ndarray,
+    horizon: int,
+    time_period: str,
+    fields: Tuple[str, str, str],
+    integer: bool,
+    prediction_date: str,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Predicciones de varias filas con el mismo horizonte y periodo. Cada
+    ventana se evalúa una vez para todas las filas. `offset` son los pasos
+    entre el fin de la historia y hoy (ver forecast_offset): `forecast` debe
+    cubrir offset + horizon pasos.
+    """
+    key_field, name_field, value_field = fields
+    total = window_forecast(forecast, offset + 1, offset + horizon, forecast_rows)
+    start_day = model["last_day"] + timedelta(days=offset)
+    windows = period_windows(start_day, horizon, time_period)
+    evaluated = [
+        window_forecast(forecast, offset + first, offset + last, forecast_rows) for first, last, _, _ in windows
+    ]
+
+    predictions = []
+    for i, row in enumerate(model_rows):
+        value, lower, upper = (float(total[name][i]) for name in ("value", "lower", "upper"))
+        trend_only = float(total["trend_only"][i])
+        points = []
+        for (first, last, first_day, last_day), window in zip(windows, evaluated):
+            point = {
+                "date": first_day.isoformat(),
+                "value": round(float(window["value"][i]), 2),
+                "lower": round(float(window["lower"][i]), 2),
+                "upper": round(float(window["upper"][i]), 2),
+            }
+            if time_period != "daily":
+                point["end_date"] = last_day.isoformat()
+            points.append(point)
+        predictions.append({
+            key_field: int(model["keys"][row]),
+            name_field: model["names"][row],
+            value_field: int(round(value)) if integer else round(value, 2),
+            # Precisión relativa: 1 - semiancho del intervalo / pronóstico (0 si el intervalo supera al pronóstico)
+            "confidence_level": round(max(0.0, 1 - (upper - lower) / (2 * value)), 3) if value > 0 else 0.0,
+            "confidence_interval": {
+                "level": INTERVAL_LEVEL,
+                "lower": int(np.floor(lower)) if integer else round(lower, 2),
+                "upper": int(np.ceil(upper)) if integer else round(upper, 2),
+            },
+            "prediction_date": prediction_date,
+            "prediction_horizon": horizon,
+            "time_period": horizon_period(horizon),
+            "forecast_period": time_period,
+            "forecast": points,
+            "factors": {
+                "historical_average": round(float(model["recent_daily_mean"][row]) * horizon, 1),
+                "seasonal_factor": round(value / trend_only, 2) if trend_only > 0 else 1.0,
+                "variability": round(float(model["sigma"][row]), 2),
+                "trend_per_day": round(float(model["trend"][row]), 3),
+                "model": {
+                    "method": "holt_winters_damped_additive",
+                    "alpha": float(model["alpha"][row]),
+                    "beta": float(model["beta"][row]),
+                    "gamma": float(model["gamma"][row]),
+                    "phi": DAMPING,
+                    "season_length": SEASON_LENGTH,
+                    "history_days": model["days"],
+                    "history_end": model["last_day"].isoformat(),
+                    "forecast_start": (start_day + timedelta(days=1)).isoformat(),
+                    "stale": bool(model.get("stale")),
+                    "fitted_at": model["fitted_at"],
+                    "version": model.get("version"),
+                },
+            },
+        })
+    return predictions
+
+
+def _forecast_rows(model: Dict[str, Any], rows: np.ndarray, horizon: int) -> Dict[str, np.ndarray]:
+    """Pronóstico de las filas pedidas; el modelo (posiblemente mapeado en memoria) no se modifica"""
+    subset = {name: np.asarray(model[name][rows]) for name in ("alpha", "beta", "gamma", "level", "trend", "seasonal", "sigma")}
+    return forecast_holt_winters({**subset, "days": model["days"]}, horizon)
+
+
+def build_predictions(
+    model: Dict[str, Any],
+    horizon: int,
+    keys: Optional[Sequence[int]],
+    key_field: str,
+    name_field: str,
+    value_field: str,
+    integer: bool = True,
+    time_period: str = "daily"
+) -> List[Dict[str, Any]]:
+    """
+    Pronóstico de las series del modelo (todas o las de `keys`) para los
+    `horizon` días a partir de hoy, ordenado de mayor a menor, con intervalo de
+    confianza del total y pronóstico por día (o por `time_period`). `integer`
+    redondea el total y el intervalo a enteros (conteos). Lanza ValueError si
+    el horizonte o el periodo no son válidos.
+    """
+    _validate_horizon(horizon)
+    if not len(model["keys"]):
+        return []
+
+    rows = np.arange(len(model["keys"]))
+    if keys:
+        wanted = set(keys)
+        rows = np.array([row for row, key in enumerate(model["keys"]) if int(key) in wanted], dtype=int)
+        if not len(rows):
+            return []
+    offset = forecast_offset(model)
+    forecast = _forecast_rows(model, rows, offset + horizon)
+    predictions = _evaluate(
+        model, forecast, rows, np.arange(len(rows)), horizon, time_period,
+        (key_field, name_field, value_field), integer, datetime.now().isoformat(), offset
+    )
+    predictions.sort(key=lambda prediction: (-prediction[value_field], prediction[key_field]))
+    return predictions
+
+
+def build_batch_predictions(
+    model: Dict[str, Any],
+    requests: Sequence[Tuple[int, int, Optional[str]]],
+    key_field: str,
+    name_field: str,
+    value_field: str,
+    integer: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Predicciones de varias configuraciones (clave, horizonte, periodo) en el
+    orden recibido. El pronóstico se evalúa una sola vez con el mayor
+    horizonte para todas las claves pedidas y cada combinación de horizonte
+    y periodo se calcula para todas sus claves a la vez. Sin periodo se
+    pronostica por día. Las claves sin modelo retornan un error en su
+    posición. Lanza ValueError si algún horizonte o periodo no es válido.
+    """
+    for _, horizon, time_period in requests:
+        _validate_horizon(horizon)
+        if time_period is not None and time_period not in PERIOD_STARTS:
+            raise ValueError(f"Periodo no válido: {time_period}. Opciones: {', '.join(PERIOD_STARTS)}")
+
+    row_by_key = {int(key): row for row, key in enumerate(model["keys"])}
+    rows = sorted({row_by_key[key] for key, _, _ in requests if key in row_by_key})
+    results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+    if rows:
+        rows = np.array(rows, dtype=int)
+        position = {row: i for i, row in enumerate(rows)}
+        offset = forecast_offset(model)
+        forecast = _forecast_rows(model, rows, offset + max(horizon for _, horizon, _ in requests))
+
+        # Índices de la entrada agrupados por (horizonte, periodo) y clave
+        groups: Dict[Tuple[int, str], Dict[int, List[int]]] = {}
+        for index, (key, horizon, time_period) in enumerate(requests):
+            if key in row_by_key:
+                groups.setdefault((horizon, time_period or "daily"), {}).setdefault(row_by_key[key], []).append(index)
+
+        prediction_date = datetime.now().isoformat()
+        for (horizon, time_period), indices_by_row in groups.items():
+            model_rows = np.array(list(indices_by_row), dtype=int)
+            predictions = _evaluate(
+                model, forecast, model_rows, np.array([position[row] for row in model_rows], dtype=int),
+                horizon, time_period, (key_field, name_field, value_field), integer, prediction_date, offset
+            )
+            for row, prediction in zip(model_rows, predictions):
+                for index in indices_by_row[row]:
+                    results[index] = prediction
+
+    for index, (key, horizon, time_period) in enumerate(requests):
+        if results[index] is None:
+            results[index] = {
+                key_field: key,
+                "prediction_horizon": horizon,
+                "forecast_period": time_period or "daily",
+                "error": "Sin historia suficiente para pronosticar",
+            }
+    return results
+
+
+def predict_demand(horizon: int = 30, specialty_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Demanda pronosticada de cada especialidad para los próximos `horizon`
+    días (ver build_predictions). Lanza ValueError si el horizonte no es
+    válido.
+    """
+    return build_predictions(
+        current_model(DEMAND_MODEL, demand_model_snapshot), horizon, specialty_ids,
+        "specialty_id", "specialty_name", "predicted_demand"
+    )
+
+
+def predict_demand_batch(requests: Sequence[Tuple[int, int, Optional[str]]]) -> List[Dict[str, Any]]:
+    """
+    Demanda pronosticada para varias configuraciones (especialidad,
+    horizonte, periodo) en una sola evaluación (ver build_batch_predictions).
+    """
+    return build_batch_predictions(
+        current_model(DEMAND_MODEL, demand_model_snapshot), requests,
+        "specialty_id", "specialty_name", "predicted_demand"
+    )
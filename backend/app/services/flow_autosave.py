@@ -0,0 +1,163 @@
+"""
+Autoguardado de flujos con debounce
+Agrupa actualizaciones sucesivas del editor (por ejemplo, arrastrar nodos)
+en una sola escritura por flujo
+"""
+
+from typing import Any, Dict, Optional
+import threading
+import time
+import structlog
+
+from app.core.config import settings
+from app.core.database import create_db_session
+from app.services.medical_flow_service import MedicalFlowService
+
+logger = structlog.get_logger()
+
+
+class FlowAutosaveBuffer:
+    """
+    Cambios pendientes por flujo que se escriben tras un periodo sin actividad.
+
+    Cada envío reinicia el temporizador del flujo; `max_wait_ms` garantiza que
+    un arrastre continuo se guarde igualmente de forma periódica. El payload se
+    valida antes de enviarlo aquí (MedicalFlowService.validate_update); si la
+    escritura falla los cambios vuelven a quedar pendientes y se reintentan.
+    """
+
+    def __init__(self, debounce_ms: int = 1000, max_wait_ms: int = 5000):
+        self.debounce_ms = debounce_ms
+        self.max_wait_ms = max_wait_ms
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._first_submit: Dict[str, float] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+
+    def submit(self, flow_id: str, flow_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Acumular cambios de un flujo y programar su escritura"""
+        with self._lock:
+            pending = self._pending.setdefault(flow_id, {})
+            self._merge(pending, flow_data)
+            now = time.monotonic()
+            first = self._first_submit.setdefault(flow_id, now)
+
+            # Esperar el debounce, sin superar la espera máxima desde el primer cambio
+            remaining_ms = self.max_wait_ms - (now - first) * 1000
+            delay_ms = max(0.0, min(self.debounce_ms, remaining_ms))
+            self._schedule(flow_id, delay_ms)
+
+            return {
+                "flowId": flow_id,
+                "pending": True,
+                "pendingNodes": len(pending.get("nodes", {})),
+                "flushInMs": int(delay_ms)
+            }
+
+    def take(self, flow_id: str, flow_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Retirar los cambios pendientes de un flujo, combinados con `flow_data`.
+
+        Se usa antes de un guardado explícito para que un autoguardado atrasado
+        no sobrescriba lo que el usuario acaba de guardar.
+        """
+        with self._lock:
+            pending = self._pop(flow_id) or {}
+        if flow_data:
+            self._merge(pending, flow_data)
+        return self._to_payload(pending)
+
+    def restore(self, flow_id: str, flow_data: Dict[str, Any]) -> None:
+        """
+        Volver a dejar pendientes cambios cuya escritura falló. Los cambios
+        enviados después tienen prioridad; si no hay otro guardado programado
+        se reintenta tras `max_wait_ms`.
+        """
+        with self._lock:
+            restored: Dict[str, Any] = {}
+            self._merge(restored, flow_data)
+            newer = self._pending.get(flow_id)
+            if newer:
+                self._merge(restored, self._to_payload(newer))
+            self._pending[flow_id] = restored
+            if flow_id not in self._timers:
+                self._first_submit[flow_id] = time.monotonic()
+                self._schedule(flow_id, self.max_wait_ms)
+
+    def flush(self, flow_id: str) -> Optional[Dict[str, Any]]:
+        """Escribir los cambios pendientes de un flujo (si falla, quedan pendientes)"""
+        with self._lock:
+            pending = self._pop(flow_id)
+        if not pending:
+            return None
+
+        payload = self._to_payload(pending)
+        db = create_db_session()
+        try:
+            result = MedicalFlowService(db).update_flow(flow_id, payload)
+            logger.info(
+                "Flow autosave flushed",
+                flow_id=flow_id,
+                changed_nodes=result.get("changedNodes") if result else None
+            )
+            return result
+        except ValueError as e:
+            # Se valida al recibir; solo llega aquí si el payload se combinó mal
+            logger.error("Invalid flow autosave discarded", flow_id=flow_id, error=str(e))
+            return None
+        except Exception as e:
+            logger.error("Error flushing flow autosave", flow_id=flow_id, error=str(e))
+            self.restore(flow_id, payload)
+            return None
+        finally:
+            db.close()
+
+    def flush_all(self) -> None:
+        """Escribir todos los cambios pendientes (al apagar la aplicación)"""
+        with self._lock:
+            flow_ids = list(self._pending)
+        for flow_id in flow_ids:
+            self.flush(flow_id)
+
+    def _schedule(self, flow_id: str, delay_ms: float) -> None:
+        """(Re)programar la escritura de un flujo; se llama con el lock tomado"""
+        timer = self._timers.pop(flow_id, None)
+        if timer:
+            timer.cancel()
+        timer = threading.Timer(delay_ms / 1000, self.flush, args=(flow_id,))
+        timer.daemon = True
+        self._timers[flow_id] = timer
+        timer.start()
+
+    def _pop(self, flow_id: str) -> Optional[Dict[str, Any]]:
+        timer = self._timers.pop(flow_id, None)
+        if timer:
+            timer.cancel()
+        self._first_submit.pop(flow_id, None)
+        return self._pending.pop(flow_id, None)
+
+    @staticmethod
+    def _merge(pending: Dict[str, Any], flow_data: Dict[str, Any]) -> None:
+        """Combinar un payload de update_flow: los nodos se combinan por id, el resto se reemplaza"""
+        for key, value in flow_data.items():
+            if key == "nodes" and isinstance(value, list):
+                nodes = pending.setdefault("nodes", {})
+                for node in value:
+                    if isinstance(node, dict) and "id" in node:
+                        nodes.setdefault(node["id"], {}).update(node)
+            else:
+                pending[key] = value
+
+    @staticmethod
+    def _to_payload(pending: Dict[str, Any]) -> Dict[str, Any]:
+        payload = dict(pending)
+        if "nodes" in payload:
+            payload["nodes"] = list(payload["nodes"].values())
+        return payload
+
+
+# Instancia compartida por todos los requests del proceso
+flow_autosave_buffer = FlowAutosaveBuffer(
+    debounce_ms=settings.FLOW_AUTOSAVE_DEBOUNCE_MS,
+    max_wait_ms=settings.FLOW_AUTOSAVE_MAX_WAIT_MS
+)
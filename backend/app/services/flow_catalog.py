@@ -0,0 +1,481 @@
+"""
+Catálogo de flujos médicos en memoria
+Instantánea inmutable de todos los flujos activos: atributos de nodos en
+arreglos tipados, conexiones en formato CSR y textos internados. La comparten
+la búsqueda, la analítica de rutas y la simulación.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text, bindparam
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+import numpy as np
+import threading
+import time
+import structlog
+
+from app.core.config import settings
+from app.core.result_cache import result_cache
+
+logger = structlog.get_logger()
+
+# Código de texto para valores nulos
+NO_STRING = -1
+# Espacios del caché de resultados calculados desde el catálogo; se vacían al cambiar la instantánea
+DERIVED_CACHE_NAMESPACES = ("medical_flows:path_analytics",)
+
+
+class StringPool:
+    """
+    Textos internados: cada valor distinto se guarda una vez y se referencia
+    con un entero. Solo crece, así que varias instantáneas pueden compartirlo
+    sin copiarlo; los textos de flujos reemplazados se descartan en la
+    siguiente reconstrucción completa.
+    """
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._values: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def intern_many(self, values: Iterable[Optional[str]]) -> np.ndarray:
+        return np.fromiter((self.intern(value) for value in values), dtype=np.int32)
+
+    def get(self, code: int) -> Optional[str]:
+        return self._values[code] if code >= 0 else None
+
+
+class FlowVersion(NamedTuple):
+    """
+    Versión de un flujo: `revision` se incrementa en cada guardado (updated_at
+    tiene resolución de un segundo y no distingue dos guardados seguidos)
+    """
+    revision: int
+    updated_at: Optional[datetime]
+
+
+def _version(value: Optional[datetime]) -> np.datetime64:
+    """updated_at como datetime64 (UTC sin zona, como lo guarda MySQL)"""
+    if value is None:
+        return np.datetime64("NaT", "us")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "us")
+
+
+def _float_array(values: Iterable[Any], dtype=np.float64) -> np.ndarray:
+    """Arreglo numérico con NaN para los nulos"""
+    return np.fromiter((np.nan if value is None else float(value) for value in values), dtype=dtype)
+
+
+def _readonly(**arrays: np.ndarray) -> Dict[str, np.ndarray]:
+    for array in arrays.values():
+        array.flags.writeable = False
+    return arrays
+
+
+# Columnas por flujo y por nodo de la instantánea
+FLOW_COLUMNS = ("name", "description", "specialty", "source_system", "flow_type",
+                "average_duration", "estimated_cost", "updated_at", "revision", "node_ptr")
+NODE_COLUMNS = ("label", "step_type", "order_index", "duration", "cost_min", "cost_max",
+                "cost_avg", "position_x", "position_y", "edge_ptr")
+
+
+class FlowCatalogSnapshot:
+    """
+    Instantánea inmutable del catálogo de flujos.
+
+    Los nodos de cada flujo son contiguos: los del flujo `f` ocupan
+    `node_ptr[f]:node_ptr[f + 1]`. Las conexiones salientes del nodo `n` son
+    `edge_dst[edge_ptr[n]:edge_ptr[n + 1]]` (índices globales de nodo). Los
+    textos se guardan como códigos del `StringPool` compartido.
+    """
+
+    def __init__(
+        self,
+        strings: StringPool,
+        flow_ids: np.ndarray,
+        flows: Dict[str, np.ndarray],
+        node_ids: np.ndarray,
+        nodes: Dict[str, np.ndarray],
+        edge_dst: np.ndarray,
+        edge_type: np.ndarray
+    ):
+        self.strings = strings
+        self.flow_ids = flow_ids
+        self.flows = flows
+        self.node_ids = node_ids
+        self.nodes = nodes
+        self.edge_dst = edge_dst
+        self.edge_type = edge_type
+        self._flow_index = {flow_id.decode(): position for position, flow_id in enumerate(flow_ids)}
+        for array in (flow_ids, node_ids, edge_dst, edge_type):
+            array.flags.writeable = False
+
+    # -- Construcción -----------------------------------------------------
+
+    @classmethod
+    def from_rows(
+        cls,
+        strings: StringPool,
+        flow_rows: Sequence[Sequence[Any]],
+        node_rows: Sequence[Sequence[Any]],
+        edge_rows: Sequence[Sequence[Any]]
+    ) -> "FlowCatalogSnapshot":
+        """
+        Construir desde filas de la base de datos:
+
+        - flujos: (id, name, description, specialty_name, source_system,
+          flow_type, average_duration, estimated_cost, updated_at, revision)
+        - nodos: (id, flow_id, step_type_id, label, order_index,
+          duration_minutes, cost_min, cost_max, cost_avg, position_x, position_y)
+        - conexiones: (flow_id, source_node_id, target_node_id, edge_type)
+
+        Se ignoran nodos de flujos ausentes y conexiones rotas o entre flujos.
+        """
+        flow_index = {row[0]: position for position, row in enumerate(flow_rows)}
+        node_rows = [row for row in node_rows if row[1] in flow_index]
+
+        # Nodos agrupados por flujo y ordenados por order_index
+        node_flow = np.fromiter((flow_index[row[1]] for row in node_rows), dtype=np.int64, count=len(node_rows))
+        order_index = np.fromiter((row[4] or 0 for row in node_rows), dtype=np.int32, count=len(node_rows))
+        order = np.lexsort((order_index, node_flow))
+        node_rows = [node_rows[i] for i in order]
+        node_flow = node_flow[order]
+        node_position = {row[0]: position for position, row in enumerate(node_rows)}
+
+        pairs: Dict[Tuple[int, int], int] = {}
+        for flow_id, source_id, target_id, edge_type in edge_rows:
+            source, target = node_position.get(source_id), node_position.get(target_id)
+            if source is not None and target is not None and source != target \
+                    and node_flow[source] == node_flow[target]:
+                pairs.setdefault((source, target), strings.intern(edge_type))
+        # Ordenadas por origen para formar la CSR
+        edges = np.array(
+            [(source, target, edge_type) for (source, target), edge_type in sorted(pairs.items())],
+            dtype=np.int64
+        ).reshape(-1, 3)
+
+        n_nodes = len(node_rows)
+        edge_ptr = np.concatenate(([0], np.cumsum(np.bincount(edges[:, 0], minlength=n_nodes)))).astype(np.int64)
+        node_ptr = np.concatenate(([0], np.cumsum(np.bincount(node_flow, minlength=len(flow_rows))))).astype(np.int64)
+
+        flows = _readonly(
+            name=strings.intern_many(row[1] for row in flow_rows),
+            description=strings.intern_many(row[2] for row in flow_rows),
+            specialty=strings.intern_many(row[3] for row in flow_rows),
+            source_system=strings.intern_many(row[4] for row in flow_rows),
+            flow_type=strings.intern_many(row[5] for row in flow_rows),
+            average_duration=_float_array((row[6] for row in flow_rows), np.float32),
+            estimated_cost=_float_array(row[7] for row in flow_rows),
+            updated_at=np.array([_version(row[8]) for row in flow_rows], dtype="datetime64[us]"),
+            revision=np.fromiter((row[9] or 0 for row in flow_rows), dtype=np.int64, count=len(flow_rows)),
+            node_ptr=node_ptr
+        )
+        nodes = _readonly(
+            label=strings.intern_many(row[3] for row in node_rows),
+            step_type=strings.intern_many(row[2] for row in node_rows),
+            order_index=np.fromiter((row[4] or 0 for row in node_rows), dtype=np.int32, count=n_nodes),
+            duration=_float_array((row[5] or 0 for row in node_rows), np.float32),
+            cost_min=_float_array(row[6] or 0 for row in node_rows),
+            cost_max=_float_array(row[7] or 0 for row in node_rows),
+            cost_avg=_float_array(row[8] or 0 for row in node_rows),
+            position_x=_float_array((row[9] for row in node_rows), np.float32),
+            position_y=_float_array((row[10] for row in node_rows), np.float32),
+            edge_ptr=edge_ptr
+        )
+        return cls(
+            strings,
+            np.array([row[0] for row in flow_rows], dtype=bytes),
+            flows,
+            np.array([row[0] for row in node_rows], dtype=bytes),
+            nodes,
+            edges[:, 1].astype(np.int32),
+            edges[:, 2].astype(np.int32)
+        )
+
+    def with_flow(self, replacement: "FlowCatalogSnapshot", flow_id: str) -> "FlowCatalogSnapshot":
+        """
+        Nueva instantánea con un flujo reemplazado (o agregado al final) por el
+        flujo de `replacement`, o quitado si `replacement` no lo contiene.
+        Solo se copian los arreglos; el resto de flujos no se vuelve a leer.
+        """
+        position = self._flow_index.get(flow_id)
+        new_position = replacement._flow_index.get(flow_id)
+        if position is None and new_position is None:
+            return self
+
+        if position is None:
+            position = len(self.flow_ids)
+            node_start = node_end = len(self.node_ids)
+            flow_end = position
+        else:
+            node_start, node_end = (int(v) for v in self.flows["node_ptr"][position:position + 2])
+            flow_end = position + 1
+        edge_start, edge_end = int(self.nodes["edge_ptr"][node_start]), int(self.nodes["edge_ptr"][node_end])
+
+        if new_position is None:
+            segment_flows = slice(0, 0)
+            segment_nodes = slice(0, 0)
+        else:
+            segment_flows = slice(new_position, new_position + 1)
+            segment_nodes = slice(*(int(v) for v in replacement.flows["node_ptr"][new_position:new_position + 2]))
+        segment_edges = slice(
+            int(replacement.nodes["edge_ptr"][segment_nodes.start]) if segment_nodes.stop > segment_nodes.start else 0,
+            int(replacement.nodes["edge_ptr"][segment_nodes.stop]) if segment_nodes.stop > segment_nodes.start else 0
+        )
+        node_delta = (segment_nodes.stop - segment_nodes.start) - (node_end - node_start)
+        edge_delta = (segment_edges.stop - segment_edges.start) - (edge_end - edge_start)
+
+        flows = {}
+        for column in FLOW_COLUMNS:
+            if column == "node_ptr":
+                continue
+            flows[column] = np.concatenate((
+                self.flows[column][:position], replacement.flows[column][segment_flows], self.flows[column][flow_end:]
+            ))
+        flows["node_ptr"] = np.concatenate((
+            self.flows["node_ptr"][:position + 1],
+            [node_start + segment_nodes.stop - segment_nodes.start] if new_position is not None else [],
+            self.flows["node_ptr"][flow_end + 1:] + node_delta
+        )).astype(np.int64)
+
+        nodes = {}
+        for column in NODE_COLUMNS:
+            if column == "edge_ptr":
+                continue
+            nodes[column] = np.concatenate((
+                self.nodes[column][:node_start], replacement.nodes[column][segment_nodes], self.nodes[column][node_end:]
+            ))
+        nodes["edge_ptr"] = np.concatenate((
+            self.nodes["edge_ptr"][:node_start],
+            replacement.nodes["edge_ptr"][segment_nodes] - segment_edges.start + edge_start,
+            self.nodes["edge_ptr"][node_end:] + edge_delta
+        )).astype(np.int64)
+
+        edge_dst = np.concatenate((
+            self.edge_dst[:edge_start],
+            replacement.edge_dst[segment_edges] - segment_nodes.start + node_start,
+            self.edge_dst[edge_end:] + node_delta
+        )).astype(np.int32)
+        edge_type = np.concatenate((
+            self.edge_type[:edge_start], replacement.edge_type[segment_edges], self.edge_type[edge_end:]
+        ))
+
+        return FlowCatalogSnapshot(
+            self.strings,
+            np.concatenate((self.flow_ids[:position], replacement.flow_ids[segment_flows], self.flow_ids[flow_end:])),
+            _readonly(**flows),
+            np.concatenate((self.node_ids[:node_start], replacement.node_ids[segment_nodes], self.node_ids[node_end:])),
+            _readonly(**nodes),
+            edge_dst,
+            edge_type
+        )
+
+    # -- Lectura ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.flow_ids)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    def flow_position(self, flow_id: str) -> Optional[int]:
+        return self._flow_index.get(flow_id)
+
+    def flow_id(self, position: int) -> str:
+        return self.flow_ids[position].decode()
+
+    def flow_version(self, flow_id: str) -> Optional[FlowVersion]:
+        """Versión (revision, updated_at) del flujo en la instantánea (None si no está)"""
+        position = self._flow_index.get(flow_id)
+        if position is None:
+            return None
+        value = self.flows["updated_at"][position]
+        return FlowVersion(int(self.flows["revision"][position]), None if np.isnat(value) else value.astype(datetime))
+
+    def string(self, code: int) -> Optional[str]:
+        return self.strings.get(int(code))
+
+    def node_range(self, position: int) -> Tuple[int, int]:
+        return int(self.flows["node_ptr"][position]), int(self.flows["node_ptr"][position + 1])
+
+    def node_labels(self, position: int) -> List[str]:
+        start, end = self.node_range(position)
+        return [self.strings.get(int(code)) for code in self.nodes["label"][start:end]]
+
+    def edge_sources(self) -> np.ndarray:
+        """Nodo origen de cada conexión (expansión de edge_ptr)"""
+        return np.repeat(np.arange(self.node_count, dtype=np.int64), np.diff(self.nodes["edge_ptr"]))
+
+    def node_flows(self) -> np.ndarray:
+        """Posición del flujo de cada nodo (expansión de node_ptr)"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.flows["node_ptr"]))
+
+    def subgraph(self, positions: Sequence[int]) -> Dict[str, np.ndarray]:
+        """
+        Arreglos de un subconjunto de flujos con índices locales: posición de
+        flujo (0..k-1) por nodo, índices globales de los nodos y conexiones.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        node_ptr = self.flows["node_ptr"]
+        sizes = node_ptr[positions + 1] - node_ptr[positions]
+        starts = np.repeat(node_ptr[positions] - np.cumsum(sizes) + sizes, sizes)
+        node_index = starts + np.arange(int(sizes.sum()))
+        node_flow = np.repeat(np.arange(positions.size, dtype=np.int64), sizes)
+
+        edge_ptr = self.nodes["edge_ptr"]
+        degrees = edge_ptr[node_index + 1] - edge_ptr[node_index]
+        edge_starts = np.repeat(edge_ptr[node_index] - np.cumsum(degrees) + degrees, degrees)
+        edge_index = edge_starts + np.arange(int(degrees.sum()))
+
+        # Índices globales -> locales (los nodos de cada flujo son contiguos)
+        local = np.full(self.node_count, -1, dtype=np.int64) if node_index.size else np.empty(0, dtype=np.int64)
+        local[node_index] = np.arange(node_index.size)
+        return {
+            "node_index": node_index,
+            "node_flow": node_flow,
+            "src": np.repeat(np.arange(node_index.size, dtype=np.int64), degrees),
+            "dst": local[self.edge_dst[edge_index]]
+        }
+
+    def nbytes(self) -> int:
+        """Bytes ocupados por los arreglos (sin contar el StringPool compartido)"""
+        arrays = [self.flow_ids, self.node_ids, self.edge_dst, self.edge_type,
+                  *self.flows.values(), *self.nodes.values()]
+        return int(sum(array.nbytes for array in arrays))
+
+
+class FlowCatalog:
+    """
+    Contenedor de la instantánea vigente. Se construye desde la base de datos
+    la primera vez, se reconstruye completa al vencer `max_age_seconds` y se
+    actualiza flujo por flujo con `refresh_flow`. Los lectores obtienen la
+    instantánea con `snapshot()` y nunca la ven cambiar.
+    """
+
+    def __init__(self, max_age_seconds: int = 600):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.RLock()
+        self._snapshot: Optional[FlowCatalogSnapshot] = None
+        self._built_at: Optional[float] = None
+
+    @property
+    def is_built(self) -> bool:
+        return self._snapshot is not None
+
+    def snapshot(self, db: Session) -> FlowCatalogSnapshot:
+        """Instantánea vigente, construyéndola si no existe o venció"""
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self.build(db)
+        return self._snapshot
+
+    def _is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return bool(self.max_age_seconds) and time.monotonic() - self._built_at > self.max_age_seconds
+
+    def build(self, db: Session) -> FlowCatalogSnapshot:
+        """Construir la instantánea con todos los flujos activos"""
+        started = time.perf_counter()
+        snapshot = FlowCatalogSnapshot.from_rows(StringPool(), *self._load_rows(db))
+        with self._lock:
+            self._snapshot = snapshot
+            self._built_at = time.monotonic()
+        self._invalidate_derived()
+
+        logger.info(
+            "Flow catalog built",
+            flows=len(snapshot),
+            nodes=snapshot.node_count,
+            megabytes=round(snapshot.nbytes() / 1024 / 1024, 1),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+        return snapshot
+
+    def refresh_flow(self, db: Session, flow_id: str) -> Optional[FlowCatalogSnapshot]:
+        """Releer un flujo y publicar una nueva instantánea con él (o sin él si ya no está activo)"""
+        if not self.is_built:
+            return None
+        with self._lock:
+            current = self._snapshot
+            replacement = FlowCatalogSnapshot.from_rows(current.strings, *self._load_rows(db, [flow_id]))
+            self._snapshot = current.with_flow(replacement, flow_id)
+            snapshot = self._snapshot
+        self._invalidate_derived()
+        return snapshot
+
+    @staticmethod
+    def _invalidate_derived() -> None:
+        for namespace in DERIVED_CACHE_NAMESPACES:
+            result_cache.invalidate(namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "built": snapshot is not None,
+            "flows": len(snapshot) if snapshot else 0,
+            "nodes": snapshot.node_count if snapshot else 0,
+            "edges": int(snapshot.edge_dst.size) if snapshot else 0,
+            "strings": len(snapshot.strings) if snapshot else 0,
+            "bytes": snapshot.nbytes() if snapshot else 0
+        }
+
+    @staticmethod
+    def _load_rows(db: Session, flow_ids: Optional[List[str]] = None) -> Tuple[list, list, list]:
+        """Filas de flujos, nodos y conexiones (de todos los activos o de `flow_ids`)"""
+        flow_filter = "f.is_active = 1" + (" AND f.id IN :flow_ids" if flow_ids is not None else "")
+        params = {"flow_ids": flow_ids} if flow_ids is not None else {}
+
+        def query(sql: str) -> list:
+            statement = text(sql.format(flow_filter=flow_filter))
+            if flow_ids is not None:
+                statement = statement.bindparams(bindparam("flow_ids", expanding=True))
+            return db.execute(statement, params).fetchall()
+
+        flows = query("""
+            SELECT f.id, f.name, f.description, COALESCE(s.name, f.specialty_name) as specialty_name,
+                   f.source_system, f.flow_type, f.average_duration, f.estimated_cost, f.updated_at,
+                   f.revision
+            FROM flows f
+            LEFT JOIN specialties_normalized s ON f.specialty_id = s.id
+            WHERE {flow_filter}
+            ORDER BY f.id
+        """)
+        nodes = query("""
+            SELECT fn.id, fn.flow_id, fn.step_type_id, fn.label, fn.order_index, fn.duration_minutes,
+                   fn.cost_min, fn.cost_max, fn.cost_avg, fn.position_x, fn.position_y
+            FROM flow_nodes fn
+            JOIN flows f ON f.id = fn.flow_id
+            WHERE {flow_filter}
+        """)
+        edges = query("""
+            SELECT e.flow_id, e.source_node_id, e.target_node_id, e.edge_type
+            FROM flow_edges_rel e
+            JOIN flows f ON f.id = e.flow_id
+            WHERE {flow_filter}
+        """)
+        return flows, nodes, edges
+
+
+# Instancia compartida por la búsqueda, la analítica de rutas y la simulación
+flow_catalog = FlowCatalog(max_age_seconds=settings.FLOW_CATALOG_TTL)
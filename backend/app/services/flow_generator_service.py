@@ -246,7 +246,7 @@ class FlowGeneratorService:
     def _close_services(self):
         """Cerrar conexiones de servicios"""
         try:
-            self.analytics_service._close_services()
+            self.analytics_service.close()
             if self.db:
                 self.db.close()
         except:
@@ -0,0 +1,258 @@
+"""
+Historial de métricas de flujos por especialidad
+Guarda una vez al día las métricas de los flujos activos de cada especialidad
+(costo y duración promedio, cantidad de flujos y de pasos) en
+flow_metrics_history, que solo crece. El análisis de tendencias toma el último
+día registrado de cada periodo (día, semana, mes, trimestre o año) y compara
+periodos consecutivos, así que el resultado solo cambia cuando se agrega una
+instantánea y se puede guardar en caché.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, List, Optional, Sequence
+from datetime import date, timedelta
+import threading
+import numpy as np
+import structlog
+
+from app.core.config import settings
+from app.core.database import create_db_session
+from app.core.result_cache import result_cache
+from app.services.demand_forecast_service import PERIOD_STARTS
+
+logger = structlog.get_logger()
+
+# Métricas del historial y su nombre en el análisis de tendencias
+FLOW_METRICS = {
+    "avg_cost": "Costo Promedio por Flujo",
+    "avg_duration": "Duración Promedio por Flujo (min)",
+    "flow_count": "Flujos Activos",
+    "step_count": "Pasos Totales",
+}
+# Periodos que se muestran en la evolución de cada métrica
+TREND_PERIODS = 12
+# Cambio porcentual por debajo del cual la métrica se considera estable
+STABLE_CHANGE_PCT = 2.0
+# Con al menos 4 periodos, un ajuste lineal peor que esto (R²) es una serie volátil
+VOLATILE_STRENGTH = 0.3
+# Espacio del caché de resultados que se lee de este historial
+TREND_CACHE_NAMESPACE = "analytics:trend_analysis"
+
+
+def _as_date(value: Any) -> date:
+    """DATE devuelve texto en algunos motores"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _trend_strength(values: np.ndarray) -> float:
+    """
+    Qué tan bien describe una recta la serie (R² del ajuste lineal, 0-1).
+    Con dos puntos, 1 si cambió y 0 si no.
+    """
+    if len(values) < 2:
+        return 0.0
+    if len(values) == 2:
+        return 1.0 if values[1] != values[0] else 0.0
+    x = np.arange(len(values))
+    spread = ((values - values.mean()) ** 2).sum()
+    if spread == 0:
+        return 0.0
+    slope, intercept = np.polyfit(x, values, 1)
+    residual = ((values - (slope * x + intercept)) ** 2).sum()
+    return float(max(0.0, 1 - residual / spread))
+
+
+class FlowMetricsHistoryService:
+    """Instantáneas diarias de las métricas de flujos y análisis de tendencias sobre ellas"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def capture(self, snapshot_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Guardar las métricas actuales de cada especialidad como la instantánea
+        del día. Si el día ya tiene instantánea no se escribe nada (el
+        historial no se modifica); entre procesos, el primero que inserta gana.
+        """
+        day = snapshot_date or date.today()
+        if self.db.execute(
+            text("SELECT 1 FROM flow_metrics_history WHERE snapshot_date = :day LIMIT 1"), {"day": day}
+        ).first():
+            return {"snapshot_date": day.isoformat(), "inserted": 0}
+
+        rows = [
+            {
+                "snapshot_date": day,
+                "specialty_id": specialty_id,
+                "specialty_name": specialty_name,
+                "flow_count": int(flow_count),
+                "step_count": int(step_count or 0),
+                "avg_cost": round(float(avg_cost), 2) if avg_cost is not None else None,
+                "avg_duration": round(float(avg_duration), 2) if avg_duration is not None else None,
+            }
+            for specialty_id, specialty_name, flow_count, step_count, avg_cost, avg_duration in self._current_metrics()
+        ]
+        if rows:
+            try:
+                self.db.execute(text("""
+                    INSERT INTO flow_metrics_history
+                        (snapshot_date, specialty_id, specialty_name, flow_count, step_count, avg_cost, avg_duration)
+                    VALUES
+                        (:snapshot_date, :specialty_id, :specialty_name, :flow_count, :step_count, :avg_cost, :avg_duration)
+                """), rows)
+                self.db.commit()
+            except IntegrityError:
+                # Otro proceso guardó la instantánea del día
+                self.db.rollback()
+                return {"snapshot_date": day.isoformat(), "inserted": 0}
+            result_cache.invalidate(TREND_CACHE_NAMESPACE)
+        logger.info("Flow metrics snapshot captured", snapshot_date=day.isoformat(), specialties=len(rows))
+        return {"snapshot_date": day.isoformat(), "inserted": len(rows)}
+
+    def _current_metrics(self) -> List[Any]:
+        """Métricas de los flujos activos por especialidad (los pasos se cuentan por flujo antes de unir)"""
+        return self.db.execute(text("""
+            SELECT
+                COALESCE(f.specialty_id, 'general') AS specialty_id,
+                MAX(COALESCE(f.specialty_name, 'General')) AS specialty_name,
+                COUNT(*) AS flow_count,
+                SUM(COALESCE(n.node_count, 0)) AS step_count,
+                AVG(f.estimated_cost) AS avg_cost,
+                AVG(f.average_duration) AS avg_duration
+            FROM flows f
+            LEFT JOIN (
+                SELECT flow_id, COUNT(*) AS node_count FROM flow_nodes GROUP BY flow_id
+            ) n ON n.flow_id = f.id
+            WHERE f.is_active = 1
+              AND f.specialty_name IS NOT NULL
+              AND f.specialty_name != 'Sin especialidad'
+            GROUP BY COALESCE(f.specialty_id, 'general')
+        """)).fetchall()
+
+    def get_trends(
+        self,
+        time_period: str = "monthly",
+        specialty_ids: Optional[Sequence[str]] = None,
+        periods: int = TREND_PERIODS,
+        today: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Tendencia de cada métrica y especialidad en los últimos `periods`
+        periodos: valor del periodo actual contra el anterior (último día
+        registrado de cada uno), fuerza de la tendencia (R² del ajuste lineal)
+        y evolución. Lanza ValueError si el periodo no es válido.
+        """
+        if time_period not in PERIOD_STARTS:
+            raise ValueError(f"Periodo no válido: {time_period}. Opciones: {', '.join(PERIOD_STARTS)}")
+        period_start = PERIOD_STARTS[time_period]
+        first_period = period_start(today or date.today())
+        for _ in range(periods - 1):
+            first_period = period_start(first_period - timedelta(days=1))
+
+        query = """
+            SELECT snapshot_date, specialty_id, specialty_name, avg_cost, avg_duration, flow_count, step_count
+            FROM flow_metrics_history
+            WHERE snapshot_date >= :first_period
+        """
+        params: Dict[str, Any] = {"first_period": first_period}
+        statement = text(query + " ORDER BY specialty_id, snapshot_date")
+        if specialty_ids:
+            statement = text(query + " AND specialty_id IN :specialty_ids ORDER BY specialty_id, snapshot_date").bindparams(
+                bindparam("specialty_ids", expanding=True)
+            )
+            params["specialty_ids"] = [str(specialty_id) for specialty_id in specialty_ids]
+
+        # Último día registrado de cada periodo por especialidad (las filas vienen en orden de fecha)
+        by_specialty: Dict[str, Dict[date, Any]] = {}
+        names: Dict[str, str] = {}
+        for row in self.db.execute(statement, params):
+            by_specialty.setdefault(row[1], {})[period_start(_as_date(row[0]))] = row
+            names[row[1]] = row[2]
+
+        analyses = []
+        for specialty_id, by_period in by_specialty.items():
+            starts = sorted(by_period)
+            last_snapshot = _as_date(by_period[starts[-1]][0])
+            for offset, (metric, metric_name) in enumerate(FLOW_METRICS.items(), start=3):
+                points = [(start, by_period[start][offset]) for start in starts if by_period[start][offset] is not None]
+                if not points:
+                    continue
+                values = np.array([float(value) for _, value in points])
+                changes = np.diff(values)
+                current = values[-1]
+                previous = values[-2] if len(values) > 1 else current
+                change_percentage = float(changes[-1] / previous * 100) if len(values) > 1 and previous else 0.0
+                strength = _trend_strength(values)
+                if len(values) < 2 or abs(change_percentage) < STABLE_CHANGE_PCT:
+                    direction = "stable"
+                elif len(values) >= 4 and strength < VOLATILE_STRENGTH:
+                    direction = "volatile"
+                else:
+                    direction = "increasing" if change_percentage > 0 else "decreasing"
+                analyses.append({
+                    "specialty_id": specialty_id,
+                    "specialty_name": names[specialty_id],
+                    "metric": metric,
+                    "metric_name": metric_name,
+                    "current_value": round(float(current), 2),
+                    "previous_value": round(float(previous), 2),
+                    "change_percentage": round(change_percentage, 1),
+                    "trend_direction": direction,
+                    "trend_strength": round(strength, 3),
+                    "analysis_period": time_period,
+                    "data_points": [{"period": start.isoformat(), "value": round(float(value), 2)} for (start, _), value in zip(points, values)],
+                    "analysis_date": last_snapshot.isoformat(),
+                })
+        analyses.sort(key=lambda analysis: (analysis["specialty_name"], list(FLOW_METRICS).index(analysis["metric"])))
+        return analyses
+
+
+class FlowMetricsSnapshotScheduler:
+    """Toma la instantánea diaria de métricas de flujos en un hilo de fondo (revisa cada `interval_seconds`)"""
+
+    def __init__(self, interval_seconds: int = 3600):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Iniciar el hilo (no hace nada si el intervalo es 0 o ya está corriendo)"""
+        if self.interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="flow-metrics-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detener el hilo esperando a que termine la pasada en curso"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Tomar la instantánea del día con una sesión propia; los errores se registran"""
+        db = create_db_session()
+        try:
+            self.last_result = FlowMetricsHistoryService(db).capture()
+            self.last_error = None
+            return self.last_result
+        except Exception as e:
+            db.rollback()
+            self.last_error = str(e)
+            logger.error("Error capturing flow metrics snapshot", error=str(e))
+            return None
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+
+flow_metrics_snapshot_scheduler = FlowMetricsSnapshotScheduler(settings.FLOW_METRICS_SNAPSHOT_INTERVAL)
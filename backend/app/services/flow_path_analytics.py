@@ -0,0 +1,259 @@
+"""
+Analítica de rutas sobre el grafo de flujos médicos
+Ruta crítica (mayor duración), rutas de menor y mayor costo y ramificaciones,
+calculadas para todo el catálogo a la vez con arreglos de NumPy
+"""
+
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import time
+import structlog
+
+from app.services.flow_catalog import flow_catalog
+
+logger = structlog.get_logger()
+
+
+def build_chain_edges(node_flow: np.ndarray, flows_with_edges: np.ndarray) -> np.ndarray:
+    """
+    Conexiones implícitas para flujos sin conexiones guardadas: cada nodo se
+    conecta con el siguiente según order_index.
+
+    `node_flow` debe venir ordenado por flujo y order_index. Retorna un arreglo
+    (2, k) con origen y destino.
+    """
+    if node_flow.size < 2:
+        return np.empty((2, 0), dtype=np.int64)
+    same_flow = node_flow[:-1] == node_flow[1:]
+    without_edges = ~flows_with_edges[node_flow[:-1]]
+    src = np.flatnonzero(same_flow & without_edges)
+    return np.vstack((src, src + 1))
+
+
+def topological_levels(n_nodes: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """
+    Nivel topológico de cada nodo (algoritmo de Kahn por niveles).
+
+    Todos los flujos se procesan juntos como un solo grafo disjunto; el número
+    de iteraciones es la profundidad del flujo más largo. Los nodos que forman
+    parte de un ciclo (o dependen de uno) quedan con nivel -1.
+    """
+    out_degree = np.bincount(src, minlength=n_nodes)
+    remaining = np.bincount(dst, minlength=n_nodes)
+
+    # Adyacencia en formato CSR: conexiones ordenadas por origen
+    order = np.argsort(src, kind="stable")
+    targets_by_src = dst[order]
+    indptr = np.concatenate(([0], np.cumsum(out_degree)))
+
+    level = np.full(n_nodes, -1, dtype=np.int32)
+    frontier = np.flatnonzero(remaining == 0)
+    current = 0
+    while frontier.size:
+        level[frontier] = current
+        counts = out_degree[frontier]
+        total = int(counts.sum())
+        if total == 0:
+            break
+        # Posiciones en la CSR de todas las conexiones salientes del frente
+        starts = np.repeat(indptr[frontier] - np.cumsum(counts) + counts, counts)
+        targets = targets_by_src[starts + np.arange(total)]
+        remaining -= np.bincount(targets, minlength=n_nodes)
+        frontier = np.unique(targets[remaining[targets] == 0])
+        current += 1
+    return level
+
+
+def compute_path_metrics(
+    node_flow: np.ndarray,
+    durations: np.ndarray,
+    costs: np.ndarray,
+    src: np.ndarray,
+    dst: np.ndarray,
+    n_flows: int
+) -> Dict[str, np.ndarray]:
+    """
+    Métricas de rutas de todos los flujos a la vez.
+
+    Una ruta va de un nodo sin entradas a un nodo sin salidas de su flujo. Las
+    rutas se relajan nivel por nivel: todas las conexiones cuyo origen está en
+    el mismo nivel topológico se procesan en una sola operación vectorizada.
+
+    Retorna arreglos por nodo (predecesores de cada ruta) y por flujo (nodo
+    final de cada ruta, totales, número de rutas y puntos de ramificación).
+    El nodo final es -1 en flujos vacíos o con ciclos.
+    """
+    n_nodes = node_flow.size
+    level = topological_levels(n_nodes, src, dst)
+    in_degree = np.bincount(dst, minlength=n_nodes)
+    out_degree = np.bincount(src, minlength=n_nodes)
+
+    is_source = in_degree == 0
+    critical = np.where(is_source, durations, -np.inf)
+    cheapest = np.where(is_source, costs, np.inf)
+    expensive = np.where(is_source, costs, -np.inf)
+    path_count = is_source.astype(np.float64)
+    critical_pred = np.full(n_nodes, -1, dtype=np.int64)
+    cheapest_pred = np.full(n_nodes, -1, dtype=np.int64)
+    expensive_pred = np.full(n_nodes, -1, dtype=np.int64)
+
+    # Conexiones del subgrafo acíclico, agrupadas por el nivel de su origen
+    acyclic = (level[src] >= 0) & (level[dst] >= 0)
+    edge_src, edge_dst = src[acyclic], dst[acyclic]
+    order = np.argsort(level[edge_src], kind="stable")
+    edge_src, edge_dst = edge_src[order], edge_dst[order]
+    bounds = np.searchsorted(level[edge_src], np.arange(level.max(initial=-1) + 2))
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        s, d = edge_src[start:end], edge_dst[start:end]
+
+        candidate = critical[s] + durations[d]
+        np.maximum.at(critical, d, candidate)
+        best = candidate == critical[d]
+        critical_pred[d[best]] = s[best]
+
+        candidate = cheapest[s] + costs[d]
+        np.minimum.at(cheapest, d, candidate)
+        best = candidate == cheapest[d]
+        cheapest_pred[d[best]] = s[best]
+
+        candidate = expensive[s] + costs[d]
+        np.maximum.at(expensive, d, candidate)
+        best = candidate == expensive[d]
+        expensive_pred[d[best]] = s[best]
+
+        path_count += np.bincount(d, weights=path_count[s], minlength=n_nodes)
+
+    has_cycle = np.bincount(node_flow[level < 0], minlength=n_flows) > 0
+    sinks = np.flatnonzero((out_degree == 0) & (level >= 0) & ~has_cycle[node_flow])
+    sink_flow = node_flow[sinks]
+
+    def best_sink(values: np.ndarray, largest: bool) -> np.ndarray:
+        """Nodo final con el mejor valor de cada flujo (-1 si no tiene)"""
+        result = np.full(n_flows, -1, dtype=np.int64)
+        if sinks.size:
+            keys = -values[sinks] if largest else values[sinks]
+            order = np.lexsort((keys, sink_flow))
+            flows, first = np.unique(sink_flow[order], return_index=True)
+            result[flows] = sinks[order[first]]
+        return result
+
+    return {
+        "level": level,
+        "critical": critical,
+        "cheapest": cheapest,
+        "expensive": expensive,
+        "critical_pred": critical_pred,
+        "cheapest_pred": cheapest_pred,
+        "expensive_pred": expensive_pred,
+        "critical_sink": best_sink(critical, largest=True),
+        "cheapest_sink": best_sink(cheapest, largest=False),
+        "expensive_sink": best_sink(expensive, largest=True),
+        "path_count": np.bincount(sink_flow, weights=path_count[sinks], minlength=n_flows),
+        "branch_points": np.bincount(node_flow, weights=out_degree > 1, minlength=n_flows).astype(np.int64),
+        "node_count": np.bincount(node_flow, minlength=n_flows),
+        "edge_count": np.bincount(node_flow[src], minlength=n_flows),
+        "has_cycle": has_cycle
+    }
+
+
+def trace_path(pred: np.ndarray, sink: int) -> List[int]:
+    """Recorrer los predecesores desde el nodo final hasta el inicio de la ruta"""
+    path = []
+    node = int(sink)
+    while node >= 0:
+        path.append(node)
+        node = int(pred[node])
+    path.reverse()
+    return path
+
+
+class FlowPathAnalytics:
+    """Calcula las métricas de rutas sobre la instantánea del catálogo de flujos"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def analyze(
+        self,
+        flow_ids: Optional[Sequence[str]] = None,
+        include_paths: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Métricas de rutas por flujo: ruta crítica, rutas de menor y mayor costo
+        (según cost_avg), número de rutas y puntos de ramificación.
+
+        Sin `flow_ids` analiza todos los flujos activos. Los flujos sin
+        conexiones guardadas se tratan como una cadena según order_index.
+        Con `include_paths=False` omite los IDs de nodos de cada ruta.
+        """
+        started = time.perf_counter()
+        snapshot = flow_catalog.snapshot(self.db)
+        if flow_ids is None:
+            positions = np.arange(len(snapshot))
+        else:
+            positions = np.array([
+                position for position in (snapshot.flow_position(flow_id) for flow_id in flow_ids)
+                if position is not None
+            ], dtype=np.int64)
+        if positions.size == 0:
+            return []
+
+        graph = snapshot.subgraph(positions)
+        node_index, node_flow = graph["node_index"], graph["node_flow"]
+        flows_with_edges = np.zeros(positions.size, dtype=bool)
+        flows_with_edges[node_flow[graph["src"]]] = True
+        # Los nodos de cada flujo vienen ordenados por order_index
+        chain = build_chain_edges(node_flow, flows_with_edges)
+
+        metrics = compute_path_metrics(
+            node_flow,
+            snapshot.nodes["duration"][node_index].astype(np.float64),
+            snapshot.nodes["cost_avg"][node_index],
+            np.concatenate((graph["src"], chain[0])),
+            np.concatenate((graph["dst"], chain[1])),
+            positions.size
+        )
+
+        def path_result(kind: str, total: np.ndarray, value_key: str, flow: int) -> Optional[Dict[str, Any]]:
+            sink = metrics[f"{kind}_sink"][flow]
+            if sink < 0:
+                return None
+            result = {value_key: float(total[sink])}
+            if include_paths:
+                result["nodeIds"] = [
+                    snapshot.node_ids[node_index[node]].decode()
+                    for node in trace_path(metrics[f"{kind}_pred"], sink)
+                ]
+            return result
+
+        stored_duration = snapshot.flows["average_duration"]
+        stored_cost = snapshot.flows["estimated_cost"]
+        results = []
+        for flow, position in enumerate(positions):
+            results.append({
+                "flowId": snapshot.flow_id(position),
+                "name": snapshot.string(snapshot.flows["name"][position]),
+                "nodeCount": int(metrics["node_count"][flow]),
+                "edgeCount": int(metrics["edge_count"][flow]),
+                "implicitEdges": not flows_with_edges[flow],
+                "hasCycle": bool(metrics["has_cycle"][flow]),
+                "pathCount": int(metrics["path_count"][flow]),
+                "branchPoints": int(metrics["branch_points"][flow]),
+                "criticalPath": path_result("critical", metrics["critical"], "durationMinutes", flow),
+                "cheapestPath": path_result("cheapest", metrics["cheapest"], "cost", flow),
+                "mostExpensivePath": path_result("expensive", metrics["expensive"], "cost", flow),
+                "storedAverageDuration": None if np.isnan(stored_duration[position]) else int(stored_duration[position]),
+                "storedEstimatedCost": None if np.isnan(stored_cost[position]) else float(stored_cost[position])
+            })
+
+        logger.info(
+            "Flow path analytics computed",
+            flows=int(positions.size),
+            nodes=int(node_index.size),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+        return results
@@ -0,0 +1,338 @@
+"""
+Índice invertido en memoria para la búsqueda de flujos médicos
+Tokenización en español con eliminación de acentos y búsqueda por prefijo
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Iterable, Tuple
+import numpy as np
+import bisect
+import re
+import threading
+import time
+import unicodedata
+import structlog
+
+from app.core.config import settings
+from app.services.flow_catalog import FlowCatalogSnapshot, flow_catalog
+
+logger = structlog.get_logger()
+
+# Palabras vacías del español que no aportan a la búsqueda
+SPANISH_STOPWORDS = frozenset({
+    "a", "al", "con", "de", "del", "e", "el", "en", "es", "la", "las", "lo",
+    "los", "o", "para", "por", "se", "sin", "su", "sus", "u", "un", "una",
+    "uno", "unos", "unas", "y"
+})
+
+# Peso de cada campo en el ranking
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "specialty": 2.0,
+    "node": 1.0,
+    "description": 0.5
+}
+
+# Factor aplicado cuando el término coincide solo por prefijo
+PREFIX_MATCH_FACTOR = 0.6
+# Longitud mínima para expandir un término por prefijo
+MIN_PREFIX_LENGTH = 2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_text(value: Optional[str]) -> str:
+    """Pasar a minúsculas y eliminar acentos ("Cardiología" -> "cardiologia")"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem_token(token: str) -> str:
+    """
+    Reducción ligera de plurales en español (consultas -> consulta, exámenes ->
+    examen). La "e" final también se quita para que el singular y el plural den
+    la misma raíz (paciente y pacientes -> pacient, clase y clases -> clas).
+    """
+    if len(token) > 5 and token.endswith("es") and token[-3] not in "aeiou":
+        token = token[:-2]
+    elif len(token) > 4 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Tokenizar texto en español: sin acentos, sin palabras vacías y con plurales reducidos"""
+    return [
+        stem_token(token)
+        for token in _TOKEN_RE.findall(fold_text(value))
+        if token not in SPANISH_STOPWORDS
+    ]
+
+
+class FlowSearchIndex:
+    """
+    Índice invertido de flujos sobre nombre, descripción, especialidad y
+    etiquetas de nodos. Se construye una vez desde la base de datos y se
+    actualiza flujo por flujo cuando se modifican.
+
+    Cada flujo recibe un número de documento; las listas de cada término se
+    guardan como arreglos de NumPy para puntuar todo el catálogo con
+    operaciones vectorizadas.
+    """
+
+    def __init__(self, max_age_seconds: int = 600):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.RLock()
+        # término -> {documento: peso}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # término -> (documentos, pesos), regenerado cuando cambia la lista del término
+        self._posting_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # documento -> {término: peso}, para reindexar un flujo sin recorrer todo el índice
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_ids: List[str] = []
+        self._doc_index: Dict[str, int] = {}
+        self._sorted_terms: List[str] = []
+        self._terms_dirty = False
+        self._built_at: Optional[float] = None
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def build(self, db: Session) -> None:
+        """Construir el índice completo con los flujos activos del catálogo en memoria"""
+        started = time.perf_counter()
+        snapshot = flow_catalog.snapshot(db)
+
+        # Ordenados por nombre para que los empates de puntaje salgan en orden alfabético
+        positions = sorted(
+            range(len(snapshot)),
+            key=lambda position: (snapshot.string(snapshot.flows["name"][position]) or "", snapshot.flow_id(position))
+        )
+
+        postings: Dict[str, Dict[int, float]] = {}
+        doc_terms: Dict[int, Dict[str, float]] = {}
+        doc_ids: List[str] = []
+        for doc, position in enumerate(positions):
+            terms = self._weigh_terms(*self._catalog_fields(snapshot, position))
+            doc_ids.append(snapshot.flow_id(position))
+            doc_terms[doc] = terms
+            for term, weight in terms.items():
+                postings.setdefault(term, {})[doc] = weight
+
+        with self._lock:
+            self._postings = postings
+            self._posting_arrays = {}
+            self._doc_terms = doc_terms
+            self._doc_ids = doc_ids
+            self._doc_index = {flow_id: doc for doc, flow_id in enumerate(doc_ids)}
+            self._sorted_terms = sorted(postings)
+            self._terms_dirty = False
+            self._built_at = time.monotonic()
+
+        logger.info(
+            "Flow search index built",
+            flows=len(doc_terms),
+            terms=len(postings),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+
+    @staticmethod
+    def _catalog_fields(snapshot: FlowCatalogSnapshot, position: int) -> Tuple[Optional[str], Optional[str], Optional[str], List[str]]:
+        """Nombre, descripción, especialidad y etiquetas de nodos de un flujo del catálogo"""
+        return (
+            snapshot.string(snapshot.flows["name"][position]),
+            snapshot.string(snapshot.flows["description"][position]),
+            snapshot.string(snapshot.flows["specialty"][position]),
+            [label for label in snapshot.node_labels(position) if label]
+        )
+
+    def ensure_built(self, db: Session) -> None:
+        """Construir el índice si no existe o si superó su antigüedad máxima"""
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self.build(db)
+
+    def _is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return bool(self.max_age_seconds) and time.monotonic() - self._built_at > self.max_age_seconds
+
+    def refresh_flow(self, db: Session, flow_id: str) -> None:
+        """
+        Reindexar un flujo desde el catálogo en memoria (o quitarlo si ya no
+        está activo). El catálogo debe haberse actualizado antes con el cambio.
+        """
+        if not self.is_built:
+            return
+
+        snapshot = flow_catalog.snapshot(db)
+        position = snapshot.flow_position(flow_id)
+        if position is None:
+            self.remove_flow(flow_id)
+            return
+        self.index_flow(flow_id, *self._catalog_fields(snapshot, position))
+
+    def index_flow(
+        self,
+        flow_id: str,
+        name: Optional[str],
+        description: Optional[str],
+        specialty_name: Optional[str],
+        node_labels: Iterable[str] = ()
+    ) -> None:
+        """Agregar o reemplazar un flujo en el índice"""
+        terms = self._weigh_terms(name, description, specialty_name, node_labels)
+        with self._lock:
+            doc = self._doc_index.get(flow_id)
+            if doc is None:
+                doc = len(self._doc_ids)
+                self._doc_ids.append(flow_id)
+                self._doc_index[flow_id] = doc
+            else:
+                self._remove_terms(doc)
+
+            self._doc_terms[doc] = terms
+            for term, weight in terms.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    self._postings[term] = posting = {}
+                    self._terms_dirty = True
+                posting[doc] = weight
+                self._posting_arrays.pop(term, None)
+
+    def remove_flow(self, flow_id: str) -> None:
+        """Quitar un flujo del índice (su número de documento queda libre de términos)"""
+        with self._lock:
+            doc = self._doc_index.get(flow_id)
+            if doc is not None:
+                self._remove_terms(doc)
+                self._doc_terms.pop(doc, None)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Buscar flujos que contengan todos los términos de la consulta.
+
+        Cada término coincide exactamente o como prefijo. Retorna pares
+        (flow_id, puntaje) ordenados por relevancia y luego por nombre.
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            if self._terms_dirty:
+                self._sorted_terms = sorted(self._postings)
+                self._terms_dirty = False
+
+            doc_count = len(self._doc_ids)
+            total = np.zeros(doc_count, dtype=np.float32)
+            matched = np.ones(doc_count, dtype=bool)
+
+            for term in query_terms:
+                docs, weights = self._match_term(term)
+                if docs.size == 0:
+                    return []
+                # Puntaje del término por documento: el mejor entre sus coincidencias
+                term_scores = np.zeros(doc_count, dtype=np.float32)
+                np.maximum.at(term_scores, docs, weights)
+                total += term_scores
+                matched &= term_scores > 0
+
+            candidates = np.flatnonzero(matched)
+            if candidates.size == 0:
+                return []
+
+            scores = total[candidates]
+            if limit and candidates.size > limit:
+                # Conservar el top-k (con empates en el límite) antes de ordenar
+                threshold = np.partition(scores, candidates.size - limit)[candidates.size - limit]
+                keep = scores >= threshold
+                candidates, scores = candidates[keep], scores[keep]
+
+            # Mayor puntaje primero; a igual puntaje, orden del documento (alfabético)
+            order = np.lexsort((candidates, -scores))
+            if limit:
+                order = order[:limit]
+
+            doc_ids = self._doc_ids
+            return [(doc_ids[candidates[i]], float(scores[i])) for i in order]
+
+    def _match_term(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Documentos y pesos para un término de la consulta (coincidencia exacta o por prefijo)"""
+        parts = []
+        if term in self._postings:
+            parts.append(self._posting_array(term))
+
+        if len(term) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self._sorted_terms, term)
+            for position in range(start, len(self._sorted_terms)):
+                candidate = self._sorted_terms[position]
+                if not candidate.startswith(term):
+                    break
+                if candidate == term or candidate not in self._postings:
+                    continue
+                docs, weights = self._posting_array(candidate)
+                parts.append((docs, weights * PREFIX_MATCH_FACTOR))
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def _posting_array(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._posting_arrays.get(term)
+        if arrays is None:
+            posting = self._postings[term]
+            arrays = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            )
+            self._posting_arrays[term] = arrays
+        return arrays
+
+    def _remove_terms(self, doc: int) -> None:
+        for term in self._doc_terms.get(doc, {}):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc, None)
+            self._posting_arrays.pop(term, None)
+            if not posting:
+                del self._postings[term]
+
+    @staticmethod
+    def _weigh_terms(
+        name: Optional[str],
+        description: Optional[str],
+        specialty_name: Optional[str],
+        node_labels: Iterable[str]
+    ) -> Dict[str, float]:
+        """Peso de cada término de un flujo: el mayor peso entre los campos donde aparece"""
+        terms: Dict[str, float] = {}
+        fields = (
+            ("name", [name]),
+            ("specialty", [specialty_name]),
+            ("node", node_labels),
+            ("description", [description])
+        )
+        for field, values in fields:
+            weight = FIELD_WEIGHTS[field]
+            for value in values:
+                for token in tokenize(value):
+                    if weight > terms.get(token, 0.0):
+                        terms[token] = weight
+        return terms
+
+
+# Instancia compartida por todos los requests del proceso
+flow_search_index = FlowSearchIndex(max_age_seconds=settings.FLOW_SEARCH_INDEX_TTL)
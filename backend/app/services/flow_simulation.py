@@ -0,0 +1,242 @@
+"""
+Simulación Monte Carlo de costo y duración de flujos médicos
+Cada iteración recorre el flujo eligiendo una rama en cada bifurcación y
+muestrea el costo de cada paso visitado con una distribución triangular
+(cost_min, cost_avg, cost_max). Todas las iteraciones avanzan un paso a la vez
+y los costos se muestrean por nodo, con operaciones vectorizadas
+"""
+
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from app.core.cache import VersionedCache
+from app.core.config import settings
+from app.services.flow_catalog import FlowCatalogSnapshot
+from app.services.flow_path_analytics import build_chain_edges, topological_levels
+
+# Percentiles reportados para costo y duración
+SIMULATION_PERCENTILES = (50, 90, 99)
+# Celdas (nodos x iteraciones) de la matriz de visitas procesadas por bloque
+SIMULATION_CHUNK_CELLS = 20_000_000
+
+# Resultados por flujo y versión: {(iteraciones, semilla, probabilidades): resultado}
+flow_simulation_cache = VersionedCache(max_entries=settings.FLOW_SIMULATION_CACHE_MAX_ENTRIES)
+
+
+class FlowSimulator:
+    """
+    Simulador de un flujo (ver `from_catalog` y `from_flow`).
+
+    Las probabilidades de rama se indican por nodo de origen:
+    {source_node_id: {target_node_id: probabilidad}}. Las ramas no indicadas
+    se reparten la probabilidad restante por partes iguales; sin indicaciones
+    todas las ramas son equiprobables.
+    """
+
+    def __init__(
+        self,
+        node_ids: List[str],
+        durations: np.ndarray,
+        cost_min: np.ndarray,
+        cost_avg: np.ndarray,
+        cost_max: np.ndarray,
+        src: np.ndarray,
+        dst: np.ndarray,
+        branch_probabilities: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        """
+        Nodos ordenados por order_index, con sus atributos en arreglos paralelos
+        y conexiones (src, dst) en índices locales. Sin conexiones, los nodos
+        se recorren en cadena según su orden.
+        """
+        self.node_ids = list(node_ids)
+        n_nodes = len(self.node_ids)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        cost_min, cost_avg, cost_max = (np.asarray(values, dtype=np.float64) for values in (cost_min, cost_avg, cost_max))
+        # Nodos sin rango cargado (mínimo o máximo en 0) usan el promedio como valor fijo
+        self.cost_mode = cost_avg
+        self.cost_low = np.where(cost_min > 0, np.minimum(cost_min, cost_avg), cost_avg)
+        self.cost_high = np.where(cost_max > 0, np.maximum(cost_max, cost_avg), cost_avg)
+
+        if src.size == 0:
+            src, dst = build_chain_edges(np.zeros(n_nodes, dtype=np.int64), np.zeros(1, dtype=bool))
+
+        level = topological_levels(n_nodes, src, dst)
+        if n_nodes and (level < 0).any():
+            raise ValueError("El flujo tiene ciclos y no se puede simular")
+        self.sources = np.flatnonzero(np.bincount(dst, minlength=n_nodes) == 0)
+
+        branch_probabilities = branch_probabilities or {}
+        unknown = set(branch_probabilities) - set(self.node_ids)
+        if unknown:
+            raise ValueError(f"Nodos desconocidos en branchProbabilities: {', '.join(sorted(unknown))}")
+
+        # Tablas (nodo x rama) con destinos y probabilidades acumuladas de cada
+        # rama. La fila extra `n_nodes` es un nodo absorbente al que pasan los
+        # recorridos que llegan a un nodo final (no cuenta como visita).
+        self.out_degree = np.bincount(src, minlength=n_nodes + 1)
+        max_branches = max(int(self.out_degree.max(initial=0)), 1)
+        self.branch_targets = np.full((n_nodes + 1, max_branches), n_nodes, dtype=np.int64)
+        self.branch_cumulative = np.full((n_nodes + 1, max_branches), np.inf)
+        for source in np.unique(src):
+            targets = dst[src == source]
+            probabilities = self._branch_weights(
+                self.node_ids[source], [self.node_ids[t] for t in targets],
+                branch_probabilities.get(self.node_ids[source], {})
+            )
+            self.branch_targets[source, :targets.size] = targets
+            self.branch_cumulative[source, :targets.size] = np.cumsum(probabilities)
+
+    @classmethod
+    def from_flow(
+        cls,
+        flow: Dict[str, Any],
+        branch_probabilities: Optional[Dict[str, Dict[str, float]]] = None
+    ) -> "FlowSimulator":
+        """Simulador de un flujo armado (documento de `get_flow_details`)"""
+        nodes = sorted(flow.get("nodes", []), key=lambda node: (node.get("orderIndex") or 0, node["id"]))
+        index = {node["id"]: position for position, node in enumerate(nodes)}
+        pairs = sorted({
+            (index[edge["sourceNodeId"]], index[edge["targetNodeId"]])
+            for edge in flow.get("edges", [])
+            if edge.get("sourceNodeId") in index and edge.get("targetNodeId") in index
+            and edge["sourceNodeId"] != edge["targetNodeId"]
+        })
+        src, dst = (np.array(values, dtype=np.int64) for values in zip(*pairs)) if pairs \
+            else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        return cls(
+            [node["id"] for node in nodes],
+            [node.get("durationMinutes") or 0 for node in nodes],
+            [node.get("costMin") or 0 for node in nodes],
+            [node.get("costAvg") or 0 for node in nodes],
+            [node.get("costMax") or 0 for node in nodes],
+            src, dst,
+            branch_probabilities
+        )
+
+    @classmethod
+    def from_catalog(
+        cls,
+        snapshot: FlowCatalogSnapshot,
+        flow_id: str,
+        branch_probabilities: Optional[Dict[str, Dict[str, float]]] = None
+    ) -> Optional["FlowSimulator"]:
+        """Simulador de un flujo de la instantánea del catálogo (None si no está)"""
+        position = snapshot.flow_position(flow_id)
+        if position is None:
+            return None
+        graph = snapshot.subgraph([position])
+        nodes = graph["node_index"]
+        return cls(
+            [node_id.decode() for node_id in snapshot.node_ids[nodes]],
+            snapshot.nodes["duration"][nodes],
+            snapshot.nodes["cost_min"][nodes],
+            snapshot.nodes["cost_avg"][nodes],
+            snapshot.nodes["cost_max"][nodes],
+            graph["src"], graph["dst"],
+            branch_probabilities
+        )
+
+    @staticmethod
+    def _branch_weights(source_id: str, target_ids: List[str], given: Dict[str, float]) -> np.ndarray:
+        """Probabilidad de cada rama: las indicadas y el resto repartido por igual"""
+        unknown = set(given) - set(target_ids)
+        if unknown:
+            raise ValueError(f"El nodo {source_id} no tiene conexión hacia: {', '.join(sorted(unknown))}")
+        try:
+            values = {target: float(p) for target, p in given.items()}
+        except (TypeError, ValueError):
+            raise ValueError(f"Probabilidades no numéricas para el nodo {source_id}")
+        if any(p < 0 for p in values.values()) or sum(values.values()) > 1 + 1e-9:
+            raise ValueError(f"Las probabilidades del nodo {source_id} deben ser positivas y sumar como máximo 1")
+
+        unspecified = [target for target in target_ids if target not in values]
+        remainder = max(0.0, 1.0 - sum(values.values()))
+        weights = np.array([
+            values.get(target, remainder / len(unspecified) if unspecified else 0.0)
+            for target in target_ids
+        ])
+        total = weights.sum()
+        if total <= 0:
+            raise ValueError(f"Las probabilidades del nodo {source_id} suman 0")
+        return weights / total
+
+    def run(self, iterations: int, seed: Optional[int] = None) -> Dict[str, Any]:
+        """Ejecutar la simulación y resumir costo, duración y probabilidad de visita por nodo"""
+        rng = np.random.default_rng(seed)
+        n_nodes = len(self.node_ids)
+        if n_nodes == 0:
+            raise ValueError("El flujo no tiene nodos")
+
+        chunk = max(1, SIMULATION_CHUNK_CELLS // (n_nodes + 1))
+        cost = np.zeros(iterations)
+        duration = np.zeros(iterations)
+        visits = np.zeros(n_nodes, dtype=np.int64)
+        for start in range(0, iterations, chunk):
+            end = min(start + chunk, iterations)
+            visited = self._walk(rng, end - start)
+            visits += visited.sum(axis=1)
+
+            # Costo y duración se acumulan nodo por nodo solo en los recorridos que lo visitaron
+            for node in range(n_nodes):
+                if not visits[node]:
+                    continue
+                low, mode, high = self.cost_low[node], self.cost_mode[node], self.cost_high[node]
+                samples = rng.triangular(low, mode, high, end - start) if high > low else mode
+                np.add(cost[start:end], samples, out=cost[start:end], where=visited[node])
+                np.add(duration[start:end], self.durations[node], out=duration[start:end], where=visited[node])
+
+        return {
+            "iterations": iterations,
+            "seed": seed,
+            "cost": self._summarize(cost),
+            "duration": self._summarize(duration),
+            "nodeVisitProbability": {
+                node_id: round(float(count) / iterations, 4)
+                for node_id, count in zip(self.node_ids, visits)
+            }
+        }
+
+    def _walk(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """
+        Matriz de visitas (nodos x iteraciones) de `size` recorridos.
+
+        Todos los recorridos avanzan un paso a la vez; un camino en un grafo
+        acíclico tiene como máximo n_nodes pasos. Con varios nodos de inicio,
+        cada recorrido empieza en uno al azar.
+        """
+        n_nodes = len(self.node_ids)
+        visited = np.zeros((n_nodes + 1, size), dtype=bool)
+        flat_visited = visited.reshape(-1)
+        rows = np.arange(size)
+        current = self.sources[rng.integers(0, self.sources.size, size)]
+        for _ in range(n_nodes):
+            flat_visited[current * size + rows] = True
+
+            # Sin bifurcación se avanza a la única rama (o al nodo absorbente);
+            # en las bifurcaciones se sortea la rama
+            following = self.branch_targets[current, 0]
+            branching = np.flatnonzero(self.out_degree[current] > 1)
+            if branching.size:
+                nodes = current[branching]
+                u = rng.random(branching.size)
+                choice = np.zeros(branching.size, dtype=np.int64)
+                for column in range(self.branch_cumulative.shape[1] - 1):
+                    choice += u >= self.branch_cumulative[nodes, column]
+                choice = np.minimum(choice, self.out_degree[nodes] - 1)
+                following[branching] = self.branch_targets[nodes, choice]
+            current = following
+            if (current == n_nodes).all():
+                break
+        return visited[:n_nodes]
+
+    @staticmethod
+    def _summarize(values: np.ndarray) -> Dict[str, float]:
+        percentiles = np.percentile(values, SIMULATION_PERCENTILES)
+        summary = {
+            "mean": round(float(values.mean()), 2),
+            "min": round(float(values.min()), 2),
+            "max": round(float(values.max()), 2)
+        }
+        summary.update({f"p{p}": round(float(v), 2) for p, v in zip(SIMULATION_PERCENTILES, percentiles)})
+        return summary
@@ -0,0 +1,200 @@
+"""
+Servicio de estadísticas de flujos médicos
+Mantiene la tabla flow_statistics_summary con agregados por dimensión, de modo
+que la consulta de estadísticas no depende del número de nodos del catálogo
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, Any, List, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+# Dimensiones del resumen y la clave con la que se exponen en la respuesta
+STATISTICS_DIMENSIONS = {
+    "specialty": "bySpecialty",
+    "source_system": "bySourceSystem",
+    "flow_type": "byFlowType"
+}
+TOTAL_DIMENSION = "total"
+
+# Columnas acumulables del resumen
+SUMMARY_COUNTERS = ("flow_count", "node_count", "edge_count", "duration_sum", "cost_sum")
+
+
+class FlowStatisticsService:
+    """Lectura y mantenimiento incremental del resumen de estadísticas de flujos"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Obtener las estadísticas desde el resumen precalculado.
+
+        El resumen se construye la primera vez que se consulta; después se
+        mantiene con cada cambio de flujo (ver `apply_delta`).
+        """
+        rows = self._read_summary()
+        if not any(row[0] == TOTAL_DIMENSION for row in rows):
+            self.rebuild()
+            rows = self._read_summary()
+
+        stats: Dict[str, Any] = {key: [] for key in STATISTICS_DIMENSIONS.values()}
+        stats.update(self._summary_to_dict(None))
+
+        for dimension, value, flows, nodes, edges, duration_sum, cost_sum, updated_at in rows:
+            entry = self._summary_to_dict((flows, nodes, edges, duration_sum, cost_sum))
+            if dimension == TOTAL_DIMENSION:
+                stats.update(entry)
+                stats["updatedAt"] = updated_at.isoformat() if updated_at else None
+            elif dimension in STATISTICS_DIMENSIONS and flows:
+                stats[STATISTICS_DIMENSIONS[dimension]].append({"name": value or None, **entry})
+
+        for key in STATISTICS_DIMENSIONS.values():
+            stats[key].sort(key=lambda entry: (-entry["totalFlows"], entry["name"] or ""))
+        return stats
+
+    def rebuild(self) -> Dict[str, Any]:
+        """
+        Recalcular el resumen completo con agregados SQL.
+
+        Usar después de cargas o migraciones que modifican flows, flow_nodes o
+        flow_edges_rel por fuera del servicio.
+        """
+        # Una fila por combinación de dimensiones; las dimensiones se acumulan en Python
+        groups = self.db.execute(text("""
+            SELECT COALESCE(s.name, f.specialty_name, '') as specialty,
+                   COALESCE(f.source_system, '') as source_system,
+                   COALESCE(f.flow_type, '') as flow_type,
+                   COUNT(*) as flow_count,
+                   COALESCE(SUM(n.node_count), 0) as node_count,
+                   COALESCE(SUM(e.edge_count), 0) as edge_count,
+                   COALESCE(SUM(f.average_duration), 0) as duration_sum,
+                   COALESCE(SUM(f.estimated_cost), 0) as cost_sum
+            FROM flows f
+            LEFT JOIN specialties_normalized s ON f.specialty_id = s.id
+            LEFT JOIN (
+                SELECT flow_id, COUNT(*) as node_count FROM flow_nodes GROUP BY flow_id
+            ) n ON n.flow_id = f.id
+            LEFT JOIN (
+                SELECT flow_id, COUNT(*) as edge_count FROM flow_edges_rel GROUP BY flow_id
+            ) e ON e.flow_id = f.id
+            WHERE f.is_active = 1
+            GROUP BY COALESCE(s.name, f.specialty_name, ''),
+                     COALESCE(f.source_system, ''),
+                     COALESCE(f.flow_type, '')
+        """)).fetchall()
+
+        summary: Dict[Tuple[str, str], List[float]] = {(TOTAL_DIMENSION, ""): [0] * len(SUMMARY_COUNTERS)}
+        for specialty, source_system, flow_type, *counters in groups:
+            keys = {"specialty": specialty, "source_system": source_system, "flow_type": flow_type}
+            for key in self._summary_keys(keys):
+                totals = summary.setdefault(key, [0] * len(SUMMARY_COUNTERS))
+                for position, value in enumerate(counters):
+                    totals[position] += value or 0
+
+        try:
+            self.db.execute(text("DELETE FROM flow_statistics_summary"))
+            self.db.execute(text(f"""
+                INSERT INTO flow_statistics_summary
+                    (dimension, dimension_value, {', '.join(SUMMARY_COUNTERS)}, updated_at)
+                VALUES
+                    (:dimension, :dimension_value, {', '.join(':' + c for c in SUMMARY_COUNTERS)}, CURRENT_TIMESTAMP)
+            """), [
+                {"dimension": dimension, "dimension_value": value, **dict(zip(SUMMARY_COUNTERS, totals))}
+                for (dimension, value), totals in summary.items()
+            ])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        logger.info("Flow statistics summary rebuilt", rows=len(summary), groups=len(groups))
+        return {"rows": len(summary)}
+
+    def apply_delta(self, keys: Dict[str, Optional[str]], **deltas: float) -> None:
+        """
+        Sumar variaciones a las filas del total y de cada dimensión del flujo.
+
+        `keys` son los valores de specialty, source_system y flow_type del flujo;
+        `deltas` usa los nombres de SUMMARY_COUNTERS (por ejemplo duration_sum=-15).
+        No confirma la transacción: se ejecuta dentro de la del cambio que la origina.
+        Si el resumen aún no existe no hace nada; se construirá en la próxima lectura.
+        """
+        deltas = {column: value for column, value in deltas.items() if value}
+        unknown = set(deltas) - set(SUMMARY_COUNTERS)
+        if unknown:
+            raise ValueError(f"Contadores desconocidos: {', '.join(sorted(unknown))}")
+        if not deltas:
+            return
+
+        summary_keys = self._summary_keys({
+            dimension: keys.get(dimension) or "" for dimension in STATISTICS_DIMENSIONS
+        })
+        params: Dict[str, Any] = dict(deltas)
+        conditions = []
+        for position, (dimension, value) in enumerate(summary_keys):
+            conditions.append(f"(dimension = :dimension_{position} AND dimension_value = :value_{position})")
+            params[f"dimension_{position}"] = dimension
+            params[f"value_{position}"] = value
+
+        set_clauses = [f"{column} = {column} + :{column}" for column in deltas]
+        set_clauses.append("updated_at = CURRENT_TIMESTAMP")
+        result = self.db.execute(text(f"""
+            UPDATE flow_statistics_summary
+            SET {', '.join(set_clauses)}
+            WHERE {' OR '.join(conditions)}
+        """), params)
+
+        if result.rowcount < len(summary_keys):
+            self._insert_missing_keys(summary_keys, deltas)
+
+    def _insert_missing_keys(self, summary_keys: List[Tuple[str, str]], deltas: Dict[str, float]) -> None:
+        """Crear las filas de dimensión que aún no existen (solo si el resumen ya fue construido)"""
+        existing = {
+            (row[0], row[1]) for row in self.db.execute(text("""
+                SELECT dimension, dimension_value FROM flow_statistics_summary
+            """))
+        }
+        if (TOTAL_DIMENSION, "") not in existing:
+            return
+
+        for dimension, value in summary_keys:
+            if (dimension, value) in existing:
+                continue
+            self.db.execute(text(f"""
+                INSERT INTO flow_statistics_summary
+                    (dimension, dimension_value, {', '.join(SUMMARY_COUNTERS)}, updated_at)
+                VALUES
+                    (:dimension, :dimension_value, {', '.join(':' + c for c in SUMMARY_COUNTERS)}, CURRENT_TIMESTAMP)
+            """), {
+                "dimension": dimension,
+                "dimension_value": value,
+                **{column: deltas.get(column, 0) for column in SUMMARY_COUNTERS}
+            })
+
+    def _read_summary(self) -> List[Any]:
+        return self.db.execute(text(f"""
+            SELECT dimension, dimension_value, {', '.join(SUMMARY_COUNTERS)}, updated_at
+            FROM flow_statistics_summary
+        """)).fetchall()
+
+    @staticmethod
+    def _summary_keys(keys: Dict[str, str]) -> List[Tuple[str, str]]:
+        """Filas del resumen afectadas por un flujo: el total y una por dimensión"""
+        return [(TOTAL_DIMENSION, "")] + [
+            (dimension, keys[dimension]) for dimension in STATISTICS_DIMENSIONS
+        ]
+
+    @staticmethod
+    def _summary_to_dict(counters: Optional[Tuple]) -> Dict[str, Any]:
+        flows, nodes, edges, duration_sum, cost_sum = counters or (0, 0, 0, 0, 0)
+        return {
+            "totalFlows": int(flows or 0),
+            "totalNodes": int(nodes or 0),
+            "totalEdges": int(edges or 0),
+            "averageDuration": float(duration_sum or 0) / flows if flows else 0,
+            "averageCost": float(cost_sum or 0) / flows if flows else 0
+        }
@@ -4,13 +4,69 @@ Proporciona acceso a los 20 flujos médicos completos migrados
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List, Optional, Dict, Any
+from sqlalchemy import text, bindparam
+from typing import List, Optional, Dict, Any, Tuple
 import structlog
+import base64
+import json
+import uuid
 from datetime import datetime
 
+from app.core.cache import VersionedCache
+from app.core.config import settings
+from app.core.result_cache import cached
+from app.services.flow_catalog import FlowVersion, flow_catalog
+from app.services.flow_search_index import flow_search_index
+from app.services.flow_statistics_service import FlowStatisticsService
+from app.services.flow_path_analytics import FlowPathAnalytics
+from app.services.flow_simulation import FlowSimulator, flow_simulation_cache
+from app.services.reference_data import reference_data_cache
+
 logger = structlog.get_logger()
 
+# Documentos completos de flujo (con nodos y conexiones) por flow_id y versión (revision, updated_at)
+flow_detail_cache = VersionedCache(max_entries=settings.FLOW_DETAIL_CACHE_MAX_ENTRIES)
+# Los documentos incluyen stepTypeCode/stepTypeName: se descartan en cada recarga del catálogo
+reference_data_cache.add_reload_listener(flow_detail_cache.clear)
+
+# Partes del grafo que se pueden incluir en los listados de flujos
+FLOW_INCLUDE_OPTIONS = ("nodes", "edges")
+
+# Combinaciones de parámetros de simulación en caché por flujo
+MAX_SIMULATIONS_PER_FLOW = 20
+
+# Columnas editables -> claves usadas por el frontend
+FLOW_FIELD_KEYS = {
+    "name": "name",
+    "description": "description",
+    "average_duration": "averageDuration",
+    "estimated_cost": "estimatedCost"
+}
+NODE_FIELD_KEYS = {
+    "label": "label",
+    "description": "description",
+    "order_index": "orderIndex",
+    "duration_minutes": "durationMinutes",
+    "cost_min": "costMin",
+    "cost_max": "costMax",
+    "cost_avg": "costAvg"
+}
+REQUIRED_FIELD_KEYS = {"name", "label", "orderIndex", "position.x", "position.y"}
+FIELD_TYPES = {
+    "name": str,
+    "description": str,
+    "label": str,
+    "average_duration": int,
+    "order_index": int,
+    "duration_minutes": int,
+    "estimated_cost": float,
+    "cost_min": float,
+    "cost_max": float,
+    "cost_avg": float,
+    "position_x": int,
+    "position_y": int
+}
+
 class MedicalFlowService:
     """Servicio para operaciones con flujos médicos normalizados"""
     
@@ -18,31 +74,21 @@ class MedicalFlowService:
         self.db = db
     
     def get_specialties(self) -> List[Dict[str, Any]]:
-        """Obtener todas las especialidades médicas"""
+        """Obtener todas las especialidades médicas (desde el caché de datos de referencia)"""
         try:
-            # Query directo a la tabla specialties_normalized
-            result = self.db.execute(text("""
-                SELECT id, code, name, is_active
-                FROM specialties_normalized
-                WHERE is_active = 1
-                ORDER BY name
-            """))
-            
-            specialties = []
-            for row in result:
-                specialties.append({
-                    "id": row[0],
-                    "code": row[1],
-                    "name": row[2],
-                    "is_active": bool(row[3])
-                })
-            
-            return specialties
-            
+            return reference_data_cache.get_specialties(self.db)
         except Exception as e:
             logger.error("Error getting specialties", error=str(e))
             return []
     
+    def get_specialty_by_id(self, specialty_id: str) -> Optional[Dict[str, Any]]:
+        """Obtener una especialidad activa por ID"""
+        try:
+            return reference_data_cache.get_specialty(self.db, specialty_id)
+        except Exception as e:
+            logger.error("Error getting specialty", error=str(e))
+            return None
+    
     def get_flows_by_specialty(self, specialty_id: str) -> List[Dict[str, Any]]:
         """Obtener flujos por especialidad"""
         try:
@@ -73,41 +119,39 @@ class MedicalFlowService:
             logger.error("Error getting flows by specialty", error=str(e))
             return []
     
-    def search_flows(self, search_term: str) -> List[Dict[str, Any]]:
-        """Buscar flujos por término de búsqueda en nombre, descripción o especialidad"""
+    def search_flows(self, search_term: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Buscar flujos por nombre, descripción, especialidad o etiquetas de nodos.
+        
+        Usa el índice invertido en memoria (sin acentos, por prefijo) y retorna
+        los flujos ordenados por relevancia, con su puntaje en `searchScore`.
+        """
         try:
-            # Query directo a la tabla flows con búsqueda
-            search_pattern = f"%{search_term}%"
+            flow_search_index.ensure_built(self.db)
+            ranked = flow_search_index.search(search_term, limit=limit)
+            if not ranked:
+                return []
+            
+            flow_ids = [flow_id for flow_id, _ in ranked]
             result = self.db.execute(text("""
                 SELECT f.id, f.name, f.specialty_id, f.description, f.average_duration, 
                        f.estimated_cost, f.is_active,
                        s.name as specialty_name
                 FROM flows f
                 LEFT JOIN specialties_normalized s ON f.specialty_id = s.id
-                WHERE f.is_active = 1
-                  AND (f.name LIKE :search OR f.description LIKE :search 
-                       OR s.name LIKE :search)
-                ORDER BY s.name, f.name
-            """), {"search": search_pattern})
+                WHERE f.id IN :flow_ids AND f.is_active = 1
+            """).bindparams(bindparam("flow_ids", expanding=True)), {"flow_ids": flow_ids})
             
+            flows_by_id = {row[0]: self._flow_row_to_dict(row) for row in result}
             flows = []
-            for row in result:
-                flow_id = row[0]
-                flow_data = {
-                    "id": flow_id,
-                    "name": row[1],
-                    "specialty_id": row[2],
-                    "description": row[3],
-                    "averageDuration": row[4],
-                    "estimatedCost": float(row[5]) if row[5] else 0.0,
-                    "isActive": bool(row[6]),
-                    "specialtyName": row[7] if row[7] else None,
-                    "nodes": self.get_flow_nodes(flow_id),
-                    "edges": self.get_flow_edges(flow_id)
-                }
-                flows.append(flow_data)
+            for flow_id, score in ranked:
+                flow = flows_by_id.get(flow_id)
+                if flow:
+                    flow["searchScore"] = round(score, 3)
+                    flows.append(flow)
             
-            return flows
+            # Cargar nodos y conexiones de todos los flujos encontrados en dos consultas
+            return self._attach_graphs(flows, [flow["id"] for flow in flows])
             
         except Exception as e:
             logger.error("Error searching flows", error=str(e))
@@ -127,29 +171,255 @@ class MedicalFlowService:
                 ORDER BY s.name, f.name
             """))
             
-            flows = []
-            for row in result:
-                flow_id = row[0]
-                flow_data = {
-                    "id": flow_id,
-                    "name": row[1],
-                    "specialty_id": row[2],
-                    "description": row[3],
-                    "averageDuration": row[4],  # Cambiado para coincidir con frontend
-                    "estimatedCost": float(row[5]) if row[5] else 0.0,  # Cambiado para coincidir con frontend
-                    "isActive": bool(row[6]),  # Cambiado para coincidir con frontend
-                    "specialtyName": row[7],  # Cambiado para coincidir con frontend
-                    "nodes": self.get_flow_nodes(flow_id),
-                    "edges": self.get_flow_edges(flow_id)
-                }
-                flows.append(flow_data)
+            flows = [self._flow_row_to_dict(row) for row in result]
             
-            return flows
+            # Nodos y conexiones de todos los flujos activos en dos consultas
+            return self._attach_graphs(flows)
             
         except Exception as e:
             logger.error("Error getting all flows", error=str(e))
             return []
     
+    def list_flows(
+        self,
+        specialty_id: Optional[str] = None,
+        source_system: Optional[str] = None,
+        min_duration: Optional[int] = None,
+        max_duration: Optional[int] = None,
+        min_cost: Optional[float] = None,
+        max_cost: Optional[float] = None,
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        include: Tuple[str, ...] = FLOW_INCLUDE_OPTIONS
+    ) -> Dict[str, Any]:
+        """
+        Listar flujos activos con filtros aplicados en SQL y paginación por cursor.
+        
+        El orden es (especialidad, nombre, id) y el cursor codifica la última fila
+        de la página anterior. Sin `limit` se retornan todos los flujos. `include`
+        indica qué partes del grafo (nodos, conexiones) se cargan.
+        
+        Lanza ValueError si el cursor no es válido.
+        """
+        after = self.decode_flow_cursor(cursor) if cursor else None
+        
+        conditions = ["f.is_active = 1"]
+        params: Dict[str, Any] = {}
+        
+        if specialty_id:
+            conditions.append("f.specialty_id = :specialty_id")
+            params["specialty_id"] = specialty_id
+        if source_system:
+            conditions.append("f.source_system = :source_system")
+            params["source_system"] = source_system
+        # Los valores nulos cuentan como 0, igual que el filtrado previo en Python
+        if min_duration is not None:
+            conditions.append("COALESCE(f.average_duration, 0) >= :min_duration")
+            params["min_duration"] = min_duration
+        if max_duration is not None:
+            conditions.append("COALESCE(f.average_duration, 0) <= :max_duration")
+            params["max_duration"] = max_duration
+        if min_cost is not None:
+            conditions.append("COALESCE(f.estimated_cost, 0) >= :min_cost")
+            params["min_cost"] = min_cost
+        if max_cost is not None:
+            conditions.append("COALESCE(f.estimated_cost, 0) <= :max_cost")
+            params["max_cost"] = max_cost
+        search_ids = None
+        if search:
+            # Los IDs que coinciden salen del índice de búsqueda; el orden sigue siendo el del cursor
+            flow_search_index.ensure_built(self.db)
+            search_ids = [flow_id for flow_id, _ in flow_search_index.search(search)]
+            if not search_ids:
+                return {"flows": [], "next_cursor": None}
+            conditions.append("f.id IN :search_ids")
+            params["search_ids"] = search_ids
+        if after:
+            # Keyset: (especialidad, nombre, id) > valores del cursor
+            conditions.append("""(
+                COALESCE(s.name, '') > :after_specialty
+                OR (COALESCE(s.name, '') = :after_specialty AND f.name > :after_name)
+                OR (COALESCE(s.name, '') = :after_specialty AND f.name = :after_name AND f.id > :after_id)
+            )""")
+            params.update({
+                "after_specialty": after[0],
+                "after_name": after[1],
+                "after_id": after[2]
+            })
+        
+        query = f"""
+            SELECT f.id, f.name, f.specialty_id, f.description, f.average_duration, 
+                   f.estimated_cost, f.is_active,
+                   s.name as specialty_name
+            FROM flows f
+            LEFT JOIN specialties_normalized s ON f.specialty_id = s.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY COALESCE(s.name, ''), f.name, f.id
+        """
+        if limit:
+            # Una fila extra indica si existe una página siguiente
+            query += " LIMIT :limit"
+            params["limit"] = limit + 1
+        
+        statement = text(query)
+        if search_ids is not None:
+            statement = statement.bindparams(bindparam("search_ids", expanding=True))
+        
+        try:
+            rows = self.db.execute(statement, params).fetchall()
+            
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = self.encode_flow_cursor(last[7] or "", last[1], last[0])
+            
+            flows = [self._flow_row_to_dict(row) for row in rows]
+            
+            if flows and include:
+                nodes_by_flow, edges_by_flow = self.get_graphs_for_flows(
+                    [flow["id"] for flow in flows]
+                )
+                for flow in flows:
+                    if "nodes" in include:
+                        flow["nodes"] = nodes_by_flow.get(flow["id"], [])
+                    if "edges" in include:
+                        flow["edges"] = edges_by_flow.get(flow["id"], [])
+            
+            return {"flows": flows, "next_cursor": next_cursor}
+            
+        except Exception as e:
+            logger.error("Error listing flows", error=str(e))
+            return {"flows": [], "next_cursor": None}
+    
+    @staticmethod
+    def encode_flow_cursor(specialty_name: str, name: str, flow_id: str) -> str:
+        """Codificar la clave de orden de un flujo como cursor opaco"""
+        payload = json.dumps([specialty_name, name, flow_id], ensure_ascii=False)
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def decode_flow_cursor(cursor: str) -> Tuple[str, str, str]:
+        """Decodificar un cursor generado por encode_flow_cursor"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        except (ValueError, UnicodeError) as e:
+            raise ValueError("Cursor inválido") from e
+        
+        if not isinstance(values, list) or len(values) != 3 or not all(isinstance(v, str) for v in values):
+            raise ValueError("Cursor inválido")
+        
+        return values[0], values[1], values[2]
+    
+    def get_graphs_for_flows(
+        self, flow_ids: Optional[List[str]] = None
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, List[Dict[str, Any]]]]:
+        """
+        Cargar nodos y conexiones de varios flujos con una consulta por tabla.
+        
+        Si no se indican IDs se cargan los grafos de todos los flujos activos.
+        Retorna dos diccionarios (nodos, conexiones) agrupados por flow_id.
+        """
+        if flow_ids is not None and not flow_ids:
+            return {}, {}
+        
+        if flow_ids is None:
+            flow_filter = "flow_id IN (SELECT id FROM flows WHERE is_active = 1)"
+            params: Dict[str, Any] = {}
+            bind = []
+        else:
+            flow_filter = "flow_id IN :flow_ids"
+            params = {"flow_ids": list(flow_ids)}
+            bind = [bindparam("flow_ids", expanding=True)]
+        
+        nodes_query = text(f"""
+            SELECT id, flow_id, step_type_id, label, description, order_index, 
+                   duration_minutes, cost_min, cost_max, cost_avg, position_x, position_y
+            FROM flow_nodes
+            WHERE {flow_filter}
+            ORDER BY flow_id, order_index
+        """).bindparams(*bind)
+        edges_query = text(f"""
+            SELECT id, flow_id, source_node_id, target_node_id, edge_type
+            FROM flow_edges_rel
+            WHERE {flow_filter}
+            ORDER BY flow_id, source_node_id, target_node_id
+        """).bindparams(*bind)
+        
+        nodes_by_flow: Dict[str, List[Dict[str, Any]]] = {}
+        for row in self.db.execute(nodes_query, params):
+            nodes_by_flow.setdefault(row[1], []).append(self._node_row_to_dict(row))
+        
+        edges_by_flow: Dict[str, List[Dict[str, Any]]] = {}
+        for row in self.db.execute(edges_query, params):
+            edges_by_flow.setdefault(row[1], []).append(self._edge_row_to_dict(row))
+        
+        return nodes_by_flow, edges_by_flow
+    
+    def _attach_graphs(
+        self, flows: List[Dict[str, Any]], flow_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Asignar nodos y conexiones a una lista de flujos ya cargados"""
+        if not flows:
+            return flows
+        
+        nodes_by_flow, edges_by_flow = self.get_graphs_for_flows(flow_ids)
+        for flow in flows:
+            flow["nodes"] = nodes_by_flow.get(flow["id"], [])
+            flow["edges"] = edges_by_flow.get(flow["id"], [])
+        
+        return flows
+    
+    @staticmethod
+    def _flow_row_to_dict(row) -> Dict[str, Any]:
+        """Convertir una fila (id, name, specialty_id, description, average_duration,
+        estimated_cost, is_active, specialty_name) al formato del frontend"""
+        return {
+            "id": row[0],
+            "name": row[1],
+            "specialty_id": row[2],
+            "description": row[3],
+            "averageDuration": row[4],  # Cambiado para coincidir con frontend
+            "estimatedCost": float(row[5]) if row[5] else 0.0,  # Cambiado para coincidir con frontend
+            "isActive": bool(row[6]),  # Cambiado para coincidir con frontend
+            "specialtyName": row[7] if row[7] else None,  # Cambiado para coincidir con frontend
+        }
+    
+    @staticmethod
+    def _node_row_to_dict(row) -> Dict[str, Any]:
+        """Convertir una fila de flow_nodes al formato del frontend"""
+        step_type = reference_data_cache.step_type(row[2])
+        return {
+            "id": row[0],
+            "flowId": row[1],
+            "stepTypeId": row[2],
+            "stepTypeCode": step_type["code"] if step_type else None,
+            "stepTypeName": step_type["name"] if step_type else None,
+            "label": row[3],
+            "description": row[4],
+            "orderIndex": row[5],
+            "durationMinutes": row[6],
+            "costMin": float(row[7]) if row[7] else 0.0,
+            "costMax": float(row[8]) if row[8] else 0.0,
+            "costAvg": float(row[9]) if row[9] else 0.0,
+            "position": {
+                "x": row[10],
+                "y": row[11]
+            }
+        }
+    
+    @staticmethod
+    def _edge_row_to_dict(row) -> Dict[str, Any]:
+        """Convertir una fila de flow_edges_rel al formato del frontend"""
+        return {
+            "id": row[0],
+            "flowId": row[1],
+            "sourceNodeId": row[2],
+            "targetNodeId": row[3],
+            "edgeType": row[4]
+        }
+    
     def get_flow_nodes(self, flow_id: str) -> List[Dict[str, Any]]:
         """Obtener nodos de un flujo específico"""
         try:
@@ -162,26 +432,7 @@ class MedicalFlowService:
                 ORDER BY order_index
             """), {"flow_id": flow_id})
             
-            nodes = []
-            for row in result:
-                nodes.append({
-                    "id": row[0],
-                    "flowId": row[1],
-                    "stepTypeId": row[2],
-                    "label": row[3],
-                    "description": row[4],
-                    "orderIndex": row[5],
-                    "durationMinutes": row[6],
-                    "costMin": float(row[7]) if row[7] else 0.0,
-                    "costMax": float(row[8]) if row[8] else 0.0,
-                    "costAvg": float(row[9]) if row[9] else 0.0,
-                    "position": {
-                        "x": row[10],
-                        "y": row[11]
-                    }
-                })
-            
-            return nodes
+            return [self._node_row_to_dict(row) for row in result]
             
         except Exception as e:
             logger.error("Error getting flow nodes", error=str(e))
@@ -198,17 +449,7 @@ class MedicalFlowService:
                 ORDER BY source_node_id, target_node_id
             """), {"flow_id": flow_id})
             
-            edges = []
-            for row in result:
-                edges.append({
-                    "id": row[0],
-                    "flowId": row[1],
-                    "sourceNodeId": row[2],
-                    "targetNodeId": row[3],
-                    "edgeType": row[4]
-                })
-            
-            return edges
+            return [self._edge_row_to_dict(row) for row in result]
             
         except Exception as e:
             logger.error("Error getting flow edges", error=str(e))
@@ -218,14 +459,43 @@ class MedicalFlowService:
         """Obtener flujo por ID con nodos y conexiones"""
         return self.get_flow_details(flow_id)
     
+    def get_flow_version(self, flow_id: str) -> Optional[FlowVersion]:
+        """
+        Obtener la versión (revision, updated_at) de un flujo con una lectura por
+        clave primaria.
+        
+        Retorna None si el flujo no existe.
+        """
+        try:
+            row = self.db.execute(text("""
+                SELECT revision, updated_at FROM flows WHERE id = :flow_id
+            """), {"flow_id": flow_id}).fetchone()
+            return FlowVersion(int(row[0] or 0), row[1]) if row else None
+        except Exception as e:
+            logger.error("Error getting flow version", error=str(e))
+            return None
+    
     def get_flow_details(self, flow_id: str) -> Optional[Dict[str, Any]]:
-        """Obtener detalles completos de un flujo"""
+        """
+        Obtener detalles completos de un flujo.
+        
+        El documento armado se guarda en caché por flow_id y versión (revision,
+        updated_at); si la versión en la base de datos no cambió se evita leer
+        nodos y conexiones.
+        El diccionario retornado es compartido y no debe modificarse.
+        """
+        version = self.get_flow_version(flow_id)
+        if version is not None:
+            hit = flow_detail_cache.get(flow_id, version)
+            if hit is not None:
+                return hit
+        
         try:
             # Obtener información del flujo
             flow_result = self.db.execute(text("""
                 SELECT f.id, f.name, f.specialty_id, f.description, f.average_duration, 
                        f.estimated_cost, f.is_active,
-                       s.name as specialty_name
+                       s.name as specialty_name, f.updated_at, f.revision
                 FROM flows f
                 LEFT JOIN specialties_normalized s ON f.specialty_id = s.id
                 WHERE f.id = :flow_id
@@ -244,10 +514,15 @@ class MedicalFlowService:
                 "estimatedCost": float(flow_row[5]) if flow_row[5] else 0.0,  # Cambiado para coincidir con frontend
                 "isActive": bool(flow_row[6]),  # Cambiado para coincidir con frontend
                 "specialtyName": flow_row[7],  # Cambiado para coincidir con frontend
+                "updatedAt": flow_row[8].isoformat() if flow_row[8] else None,
+                "revision": int(flow_row[9] or 0),
                 "nodes": self.get_flow_nodes(flow_id),
                 "edges": self.get_flow_edges(flow_id)
             }
             
+            # Se guarda con la versión leída junto al documento
+            flow_detail_cache.set(flow_id, FlowVersion(int(flow_row[9] or 0), flow_row[8]), flow_data)
+            
             return flow_data
             
         except Exception as e:
@@ -285,134 +560,412 @@ class MedicalFlowService:
             return []
     
     def update_flow(self, flow_id: str, flow_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Actualizar un flujo médico, incluyendo posiciones de nodos"""
+        """
+        Actualizar un flujo médico, incluyendo posiciones y atributos de nodos.
+        
+        Compara el payload con los valores guardados y escribe solo lo que cambió:
+        una sentencia para el flujo, una sentencia CASE para todos los nodos y,
+        si el payload trae `edges` (la lista completa), las conexiones agregadas
+        y quitadas, en una sola transacción. Retorna solo los campos modificados (no el flujo
+        completo) o None si el flujo no existe.
+        
+        Lanza ValueError si algún valor no tiene el tipo esperado; un error al
+        escribir se propaga tras deshacer la transacción.
+        """
+        flow_values = self._parse_flow_fields(flow_data)
+        node_values = self._parse_node_fields(flow_data.get('nodes'))
+        edge_values = self._parse_edges(flow_data.get('edges'))
+        
         try:
-            # Verificar que el flujo existe
-            flow_result = self.db.execute(text("""
-                SELECT id FROM flows WHERE id = :flow_id
-            """), {"flow_id": flow_id})
+            # Verificar que el flujo existe y leer los valores actuales
+            current_flow = self.db.execute(text("""
+                SELECT f.id, f.name, f.description, f.average_duration, f.estimated_cost,
+                       f.is_active, COALESCE(s.name, f.specialty_name) as specialty,
+                       f.source_system, f.flow_type
+                FROM flows f
+                LEFT JOIN specialties_normalized s ON f.specialty_id = s.id
+                WHERE f.id = :flow_id
+            """), {"flow_id": flow_id}).fetchone()
             
-            if not flow_result.fetchone():
+            if not current_flow:
                 return None
             
-            # Actualizar información del flujo si se proporciona
-            if 'name' in flow_data or 'description' in flow_data or 'averageDuration' in flow_data or 'estimatedCost' in flow_data:
-                update_fields = []
-                params = {"flow_id": flow_id}
-                
-                if 'name' in flow_data:
-                    update_fields.append("name = :name")
-                    params["name"] = flow_data['name']
-                if 'description' in flow_data:
-                    update_fields.append("description = :description")
-                    params["description"] = flow_data['description']
-                if 'averageDuration' in flow_data:
-                    update_fields.append("average_duration = :average_duration")
-                    params["average_duration"] = flow_data['averageDuration']
-                if 'estimatedCost' in flow_data:
-                    update_fields.append("estimated_cost = :estimated_cost")
-                    params["estimated_cost"] = flow_data['estimatedCost']
+            current = dict(zip(("name", "description", "average_duration", "estimated_cost"), current_flow[1:5]))
+            flow_changes = {
+                column: value for column, value in flow_values.items()
+                if not self._same_value(current[column], value)
+            }
+            node_changes = self._diff_nodes(flow_id, node_values)
+            added_edges, removed_edges = self._diff_edges(flow_id, edge_values)
+            
+            if flow_changes or node_changes or added_edges or removed_edges:
+                if node_changes:
+                    self._apply_node_changes(flow_id, node_changes)
+                if added_edges or removed_edges:
+                    self._apply_edge_changes(flow_id, added_edges, removed_edges)
                 
-                if update_fields:
-                    update_query = f"""
-                        UPDATE flows 
-                        SET {', '.join(update_fields)}
-                        WHERE id = :flow_id
-                    """
-                    self.db.execute(text(update_query), params)
-                    self.db.commit()
-            
-            # Actualizar posiciones de nodos si se proporcionan
-            if 'nodes' in flow_data and isinstance(flow_data['nodes'], list):
-                for node_data in flow_data['nodes']:
-                    if 'id' in node_data and 'position' in node_data:
-                        position = node_data['position']
-                        if isinstance(position, dict) and 'x' in position and 'y' in position:
-                            self.db.execute(text("""
-                                UPDATE flow_nodes 
-                                SET position_x = :x, position_y = :y
-                                WHERE id = :node_id AND flow_id = :flow_id
-                            """), {
-                                "x": int(position['x']),
-                                "y": int(position['y']),
-                                "node_id": node_data['id'],
-                                "flow_id": flow_id
-                            })
+                # revision es la versión usada por el caché y el ETag del flujo;
+                # un cambio de nodos también es una nueva versión del flujo
+                set_clauses = [f"{column} = :{column}" for column in flow_changes]
+                set_clauses.append("revision = revision + 1")
+                set_clauses.append("updated_at = CURRENT_TIMESTAMP")
+                self.db.execute(
+                    text(f"UPDATE flows SET {', '.join(set_clauses)} WHERE id = :flow_id"),
+                    {**flow_changes, "flow_id": flow_id}
+                )
                 
+                # Ajustar el resumen de estadísticas en la misma transacción
+                if current_flow[5]:
+                    self._update_statistics_summary(
+                        current_flow, current, flow_changes, len(added_edges) - len(removed_edges)
+                    )
                 self.db.commit()
+                
+                flow_detail_cache.invalidate(flow_id)
+                flow_simulation_cache.invalidate(flow_id)
+                flow_catalog.refresh_flow(self.db, flow_id)
+                
+                # Mantener el índice de búsqueda al día con los nuevos textos del flujo
+                labels_changed = any("label" in changes for changes in node_changes.values())
+                if "name" in flow_changes or "description" in flow_changes or labels_changed:
+                    flow_search_index.refresh_flow(self.db, flow_id)
             
-            # Retornar el flujo actualizado
-            return self.get_flow_by_id(flow_id)
+            version = self.get_flow_version(flow_id)
+            return {
+                "id": flow_id,
+                "updatedAt": version.updated_at.isoformat() if version and version.updated_at else None,
+                "revision": version.revision if version else None,
+                "changes": {
+                    "flow": {
+                        FLOW_FIELD_KEYS[column]: value
+                        for column, value in flow_changes.items()
+                    },
+                    "nodes": [
+                        {"id": node_id, **self._node_changes_to_dict(changes)}
+                        for node_id, changes in node_changes.items()
+                    ],
+                    "edges": {
+                        "added": [
+                            {"source": source, "target": target, "type": edge_type}
+                            for (source, target), edge_type in added_edges.items()
+                        ],
+                        "removed": len(removed_edges)
+                    }
+                },
+                "changedNodes": len(node_changes)
+            }
             
         except Exception as e:
             logger.error("Error updating flow", error=str(e))
             self.db.rollback()
+            raise
+    
+    def validate_update(self, flow_id: str, flow_data: Dict[str, Any]) -> bool:
+        """
+        Validar un payload de update_flow sin escribir nada: retorna False si el
+        flujo no existe y lanza ValueError si algún valor no es válido.
+        """
+        self._parse_flow_fields(flow_data)
+        self._parse_node_fields(flow_data.get('nodes'))
+        self._parse_edges(flow_data.get('edges'))
+        return self.get_flow_version(flow_id) is not None
+    
+    def _update_statistics_summary(
+        self, flow_row, current: Dict[str, Any], flow_changes: Dict[str, Any], edge_delta: int = 0
+    ) -> None:
+        """Aplicar al resumen de estadísticas la variación de duración, costo y conexiones del flujo"""
+        deltas = {
+            summary_column: float(flow_changes[column] or 0) - float(current[column] or 0)
+            for column, summary_column in (("average_duration", "duration_sum"), ("estimated_cost", "cost_sum"))
+            if column in flow_changes
+        }
+        if edge_delta:
+            deltas["edge_count"] = edge_delta
+        if deltas:
+            FlowStatisticsService(self.db).apply_delta({
+                "specialty": flow_row[6],
+                "source_system": flow_row[7],
+                "flow_type": flow_row[8]
+            }, **deltas)
+    
+    def _diff_nodes(
+        self, flow_id: str, node_values: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Columnas que realmente cambian por nodo; ignora nodos que no son del flujo"""
+        if not node_values:
+            return {}
+        
+        columns = ["label", "description", "order_index", "duration_minutes",
+                   "cost_min", "cost_max", "cost_avg", "position_x", "position_y"]
+        result = self.db.execute(text(f"""
+            SELECT id, {', '.join(columns)}
+            FROM flow_nodes
+            WHERE flow_id = :flow_id AND id IN :node_ids
+        """).bindparams(bindparam("node_ids", expanding=True)), {
+            "flow_id": flow_id,
+            "node_ids": list(node_values)
+        })
+        
+        changes: Dict[str, Dict[str, Any]] = {}
+        for row in result:
+            current = dict(zip(columns, row[1:]))
+            node_changes = {
+                column: value for column, value in node_values[row[0]].items()
+                if not self._same_value(current[column], value)
+            }
+            if node_changes:
+                changes[row[0]] = node_changes
+        return changes
+    
+    def _apply_node_changes(self, flow_id: str, node_changes: Dict[str, Dict[str, Any]]) -> None:
+        """Aplicar los cambios de todos los nodos en una sola sentencia UPDATE ... CASE"""
+        params: Dict[str, Any] = {"flow_id": flow_id, "node_ids": list(node_changes)}
+        set_clauses = []
+        
+        columns = sorted({column for changes in node_changes.values() for column in changes})
+        for column in columns:
+            whens = []
+            for position, (node_id, changes) in enumerate(node_changes.items()):
+                if column in changes:
+                    whens.append(f"WHEN :{column}_id_{position} THEN :{column}_value_{position}")
+                    params[f"{column}_id_{position}"] = node_id
+                    params[f"{column}_value_{position}"] = changes[column]
+            set_clauses.append(f"{column} = CASE id {' '.join(whens)} ELSE {column} END")
+        
+        self.db.execute(text(f"""
+            UPDATE flow_nodes
+            SET {', '.join(set_clauses)}
+            WHERE flow_id = :flow_id AND id IN :node_ids
+        """).bindparams(bindparam("node_ids", expanding=True)), params)
+    
+    def _diff_edges(
+        self, flow_id: str, edge_values: Optional[Dict[Tuple[str, str], str]]
+    ) -> Tuple[Dict[Tuple[str, str], str], List[str]]:
+        """
+        Conexiones a agregar (por par origen-destino) y ids de conexiones a
+        quitar para que el flujo tenga exactamente `edge_values`. Sin `edges`
+        en el payload no cambia nada; se ignoran pares con nodos de otro flujo.
+        """
+        if edge_values is None:
+            return {}, []
+        
+        node_ids = {row[0] for row in self.db.execute(text("""
+            SELECT id FROM flow_nodes WHERE flow_id = :flow_id
+        """), {"flow_id": flow_id})}
+        wanted = {
+            pair: edge_type for pair, edge_type in edge_values.items()
+            if pair[0] in node_ids and pair[1] in node_ids
+        }
+        
+        existing = set()
+        removed = []
+        for edge_id, source, target in self.db.execute(text("""
+            SELECT id, source_node_id, target_node_id FROM flow_edges_rel WHERE flow_id = :flow_id
+        """), {"flow_id": flow_id}):
+            if (source, target) in wanted:
+                existing.add((source, target))
+            else:
+                removed.append(edge_id)
+        added = {pair: edge_type for pair, edge_type in wanted.items() if pair not in existing}
+        return added, removed
+    
+    def _apply_edge_changes(
+        self, flow_id: str, added: Dict[Tuple[str, str], str], removed: List[str]
+    ) -> None:
+        """Quitar y agregar conexiones del flujo (los ids de conexiones nuevas se generan aquí)"""
+        if removed:
+            self.db.execute(text("""
+                DELETE FROM flow_edges_rel WHERE flow_id = :flow_id AND id IN :edge_ids
+            """).bindparams(bindparam("edge_ids", expanding=True)), {"flow_id": flow_id, "edge_ids": removed})
+        if added:
+            self.db.execute(text("""
+                INSERT INTO flow_edges_rel (id, flow_id, source_node_id, target_node_id, edge_type)
+                VALUES (:id, :flow_id, :source, :target, :edge_type)
+            """), [
+                {"id": str(uuid.uuid4()), "flow_id": flow_id, "source": source, "target": target, "edge_type": edge_type}
+                for (source, target), edge_type in added.items()
+            ])
+    
+    @staticmethod
+    def _parse_edges(edges: Any) -> Optional[Dict[Tuple[str, str], str]]:
+        """Conexiones del payload por par (origen, destino); None si el payload no trae `edges`"""
+        if not isinstance(edges, list):
+            return None
+        
+        values: Dict[Tuple[str, str], str] = {}
+        for edge in edges:
+            if not isinstance(edge, dict) or not edge.get('source') or not edge.get('target'):
+                continue
+            edge_type = MedicalFlowService._convert(edge.get('type'), str, "edges.type") or 'default'
+            if len(edge_type) > 30:
+                raise ValueError(f"Valor inválido para 'edges.type': {edge_type!r}")
+            values[(str(edge['source']), str(edge['target']))] = edge_type
+        return values
+    
+    @staticmethod
+    def _parse_flow_fields(flow_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Campos del flujo presentes en el payload, convertidos a columna -> valor"""
+        values = {}
+        for column, key in FLOW_FIELD_KEYS.items():
+            if key in flow_data:
+                values[column] = MedicalFlowService._convert(flow_data[key], FIELD_TYPES[column], key)
+        return values
+    
+    @staticmethod
+    def _parse_node_fields(nodes: Any) -> Dict[str, Dict[str, Any]]:
+        """Campos de nodos presentes en el payload, por id de nodo (el último gana)"""
+        if not isinstance(nodes, list):
+            return {}
+        
+        values: Dict[str, Dict[str, Any]] = {}
+        for node_data in nodes:
+            if not isinstance(node_data, dict) or 'id' not in node_data:
+                continue
+            
+            node_values = values.setdefault(node_data['id'], {})
+            position = node_data.get('position')
+            if isinstance(position, dict) and 'x' in position and 'y' in position:
+                node_values["position_x"] = MedicalFlowService._convert(position['x'], int, "position.x")
+                node_values["position_y"] = MedicalFlowService._convert(position['y'], int, "position.y")
+            for column, key in NODE_FIELD_KEYS.items():
+                if key in node_data:
+                    node_values[column] = MedicalFlowService._convert(node_data[key], FIELD_TYPES[column], key)
+        
+        return {node_id: v for node_id, v in values.items() if v}
+    
+    @staticmethod
+    def _convert(value: Any, field_type: type, key: str) -> Any:
+        if value is None:
+            if key in REQUIRED_FIELD_KEYS:
+                raise ValueError(f"El campo '{key}' no puede ser nulo")
             return None
+        try:
+            return field_type(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Valor inválido para '{key}': {value!r}") from e
+    
+    @staticmethod
+    def _same_value(current: Any, new: Any) -> bool:
+        if current is None or new is None:
+            return current is None and new is None
+        if isinstance(new, (int, float)) and not isinstance(new, bool):
+            return float(current) == float(new)
+        return current == new
+    
+    @staticmethod
+    def _node_changes_to_dict(changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Cambios de un nodo con las claves del frontend"""
+        data = {
+            NODE_FIELD_KEYS[column]: value
+            for column, value in changes.items()
+            if column in NODE_FIELD_KEYS
+        }
+        if "position_x" in changes or "position_y" in changes:
+            data["position"] = {
+                key: changes[column]
+                for key, column in (("x", "position_x"), ("y", "position_y"))
+                if column in changes
+            }
+        return data
     
     def get_step_types(self) -> List[Dict[str, Any]]:
-        """Obtener todos los tipos de pasos"""
+        """Obtener todos los tipos de pasos (desde el caché de datos de referencia)"""
         try:
-            result = self.db.execute(text("""
-                SELECT id, code, name
-                FROM step_types
-                ORDER BY name
-            """))
-            
-            step_types = []
-            for row in result:
-                step_types.append({
-                    "id": row[0],
-                    "code": row[1],
-                    "name": row[2]
-                })
-            
-            return step_types
+            return reference_data_cache.get_step_types(self.db)
         except Exception as e:
             logger.error("Error getting step types", error=str(e))
             return []
     
     def get_urgency_levels(self) -> List[Dict[str, Any]]:
-        """Obtener todos los niveles de urgencia"""
+        """Obtener todos los niveles de urgencia (desde el caché de datos de referencia)"""
         try:
-            result = self.db.execute(text("""
-                SELECT id, code, name
-                FROM urgency_levels
-                ORDER BY name
-            """))
-            
-            urgency_levels = []
-            for row in result:
-                urgency_levels.append({
-                    "id": row[0],
-                    "code": row[1],
-                    "name": row[2]
-                })
-            
-            return urgency_levels
+            return reference_data_cache.get_urgency_levels(self.db)
         except Exception as e:
             logger.error("Error getting urgency levels", error=str(e))
             return []
     
+    def refresh_reference_data(self) -> Dict[str, Any]:
+        """Recargar tipos de paso, niveles de urgencia y especialidades"""
+        return reference_data_cache.load(self.db)
+    
     def get_referral_criteria_by_specialty(self, specialty_id: str) -> List[Dict[str, Any]]:
         """Obtener criterios de referencia por especialidad"""
         return self.get_referral_criteria()
     
     def get_flow_statistics(self) -> Dict[str, Any]:
-        """Obtener estadísticas de flujos"""
+        """Obtener estadísticas de flujos (totales y desglose por especialidad, origen y tipo)"""
         try:
-            flows = self.get_all_flows()
-            total_nodes = sum(len(flow.get('nodes', [])) for flow in flows)
-            total_edges = sum(len(flow.get('edges', [])) for flow in flows)
-            avg_duration = sum(flow.get('averageDuration', 0) for flow in flows) / len(flows) if flows else 0
-            avg_cost = sum(flow.get('estimatedCost', 0) for flow in flows) / len(flows) if flows else 0
-            
-            return {
-                "totalFlows": len(flows),
-                "totalNodes": total_nodes,
-                "totalEdges": total_edges,
-                "averageDuration": avg_duration,
-                "averageCost": avg_cost
-            }
+            return FlowStatisticsService(self.db).get_statistics()
         except Exception as e:
             logger.error("Error getting flow statistics", error=str(e))
+            self.db.rollback()
             return {}
+    
+    def refresh_flow_statistics(self) -> Dict[str, Any]:
+        """Recalcular el resumen de estadísticas desde las tablas de flujos"""
+        service = FlowStatisticsService(self.db)
+        service.rebuild()
+        return service.get_statistics()
+    
+    # Se invalida cada vez que cambia el catálogo (ver flow_catalog.DERIVED_CACHE_NAMESPACES)
+    @cached("medical_flows:path_analytics", ttl="FLOW_ANALYTICS_CACHE_TTL")
+    def get_path_analytics(
+        self,
+        flow_ids: Optional[List[str]] = None,
+        include_paths: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Ruta crítica, rutas de costo y ramificaciones por flujo (ver FlowPathAnalytics)"""
+        return FlowPathAnalytics(self.db).analyze(flow_ids, include_paths=include_paths)
+    
+    def simulate_flow(
+        self,
+        flow_id: str,
+        iterations: int = 10_000,
+        seed: Optional[int] = None,
+        branch_probabilities: Optional[Dict[str, Dict[str, float]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Simulación Monte Carlo de costo y duración de un flujo (ver FlowSimulator).
+        
+        Los resultados se guardan en caché por versión del flujo y parámetros.
+        Retorna None si el flujo no existe; lanza ValueError si los parámetros
+        no son válidos o el flujo no se puede simular.
+        """
+        if not 1 <= iterations <= settings.FLOW_SIMULATION_MAX_ITERATIONS:
+            raise ValueError(f"iterations debe estar entre 1 y {settings.FLOW_SIMULATION_MAX_ITERATIONS}")
+        
+        version = self.get_flow_version(flow_id)
+        if version is None:
+            return None
+        
+        params_key = (iterations, seed, json.dumps(branch_probabilities or {}, sort_keys=True))
+        results = flow_simulation_cache.get(flow_id, version) or {}
+        if params_key in results:
+            return {**results[params_key], "cached": True}
+        
+        # El grafo sale del catálogo en memoria; si su copia del flujo es de otra
+        # versión se relee ese flujo. Los flujos inactivos no están en el catálogo.
+        snapshot = flow_catalog.snapshot(self.db)
+        if snapshot.flow_position(flow_id) is not None and snapshot.flow_version(flow_id) != version:
+            snapshot = flow_catalog.refresh_flow(self.db, flow_id) or snapshot
+        simulator = FlowSimulator.from_catalog(snapshot, flow_id, branch_probabilities)
+        if simulator is None:
+            flow = self.get_flow_details(flow_id)
+            if not flow:
+                return None
+            simulator = FlowSimulator.from_flow(flow, branch_probabilities)
+        
+        result = {
+            "flowId": flow_id,
+            "version": version.revision,
+            **simulator.run(iterations, seed)
+        }
+        
+        # Conservar solo las combinaciones de parámetros más recientes por flujo
+        results = dict(results)
+        results[params_key] = result
+        while len(results) > MAX_SIMULATIONS_PER_FLOW:
+            results.pop(next(iter(results)))
+        flow_simulation_cache.set(flow_id, version, results)
+        
+        return {**result, "cached": False}
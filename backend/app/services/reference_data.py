@@ -0,0 +1,166 @@
+"""
+Caché de datos de referencia de flujos médicos
+Tipos de paso, niveles de urgencia y especialidades: tablas pequeñas que casi
+no cambian y que el editor consulta en cada carga de página
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import threading
+import time
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class ReferenceDataCache:
+    """
+    Copia en memoria de los catálogos de flujos, compartida por todo el proceso.
+
+    Se carga al iniciar la aplicación y se recarga al vencer `ttl_seconds` o al
+    invalidarla explícitamente. Cada carga reemplaza el catálogo completo de una
+    vez, así que los lectores nunca ven una mezcla de datos viejos y nuevos, y
+    avisa a los cachés que guardan nombres del catálogo (ver add_reload_listener).
+    """
+
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+        self._loaded_at: Optional[float] = None
+        self._reload_listeners: List[Callable[[], None]] = []
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def step_types_version(self) -> str:
+        """
+        Huella de los tipos de paso cargados; igual en todos los procesos
+        mientras el catálogo no cambie (para incluirla en ETags)
+        """
+        data = self._data
+        return data["step_types_version"] if data else ""
+
+    def add_reload_listener(self, callback: Callable[[], None]) -> None:
+        """Registrar una función que se llama después de cada carga (inicial, por TTL o manual)"""
+        self._reload_listeners.append(callback)
+
+    def load(self, db: Session) -> Dict[str, int]:
+        """Cargar los tres catálogos desde la base de datos"""
+        specialties = [
+            {"id": row[0], "code": row[1], "name": row[2], "is_active": bool(row[3])}
+            for row in db.execute(text("""
+                SELECT id, code, name, is_active
+                FROM specialties_normalized
+                WHERE is_active = 1
+                ORDER BY name
+            """))
+        ]
+        step_types = [
+            {"id": row[0], "code": row[1], "name": row[2]}
+            for row in db.execute(text("""
+                SELECT id, code, name
+                FROM step_types
+                ORDER BY name
+            """))
+        ]
+        urgency_levels = [
+            {"id": row[0], "code": row[1], "name": row[2]}
+            for row in db.execute(text("""
+                SELECT id, code, name
+                FROM urgency_levels
+                ORDER BY name
+            """))
+        ]
+
+        data = {
+            "specialties": specialties,
+            "step_types": step_types,
+            "urgency_levels": urgency_levels,
+            "specialties_by_id": {item["id"]: item for item in specialties},
+            "step_types_by_id": {item["id"]: item for item in step_types},
+            "urgency_levels_by_id": {item["id"]: item for item in urgency_levels},
+            "step_types_version": hashlib.sha1(
+                repr([(item["id"], item["code"], item["name"]) for item in step_types]).encode("utf-8")
+            ).hexdigest()[:12]
+        }
+        with self._lock:
+            self._data = data
+            self._loaded_at = time.monotonic()
+        for callback in self._reload_listeners:
+            callback()
+
+        counts = {
+            "specialties": len(specialties),
+            "step_types": len(step_types),
+            "urgency_levels": len(urgency_levels)
+        }
+        logger.info("Reference data loaded", **counts)
+        return counts
+
+    def invalidate(self) -> None:
+        """Marcar los catálogos como vencidos; se recargan en el próximo acceso"""
+        with self._lock:
+            self._loaded_at = None
+
+    def ensure_loaded(self, db: Session) -> Dict[str, Any]:
+        """Catálogos vigentes, recargándolos si no existen o vencieron"""
+        # Dos requests concurrentes pueden recargar a la vez; el resultado es el mismo
+        if self._is_stale():
+            self.load(db)
+        return self._data
+
+    def _is_stale(self) -> bool:
+        if self._data is None or self._loaded_at is None:
+            return True
+        return bool(self.ttl_seconds) and time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def get_specialties(self, db: Session) -> List[Dict[str, Any]]:
+        """Especialidades activas ordenadas por nombre"""
+        return [dict(item) for item in self.ensure_loaded(db)["specialties"]]
+
+    def get_specialty(self, db: Session, specialty_id: str) -> Optional[Dict[str, Any]]:
+        """Especialidad activa por ID"""
+        item = self.ensure_loaded(db)["specialties_by_id"].get(specialty_id)
+        return dict(item) if item else None
+
+    def get_step_types(self, db: Session) -> List[Dict[str, Any]]:
+        """Tipos de paso ordenados por nombre"""
+        return [dict(item) for item in self.ensure_loaded(db)["step_types"]]
+
+    def get_urgency_levels(self, db: Session) -> List[Dict[str, Any]]:
+        """Niveles de urgencia ordenados por nombre"""
+        return [dict(item) for item in self.ensure_loaded(db)["urgency_levels"]]
+
+    def step_type(self, step_type_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Resolver un step_type_id con los datos ya cargados, sin consultar la base
+        de datos (para usar al convertir filas de nodos). None si no está cargado.
+        """
+        data = self._data
+        if data is None or step_type_id is None:
+            return None
+        return data["step_types_by_id"].get(step_type_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del caché"""
+        data = self._data
+        loaded_at = self._loaded_at
+        return {
+            "loaded": data is not None,
+            "age_seconds": round(time.monotonic() - loaded_at, 1) if loaded_at else None,
+            "ttl_seconds": self.ttl_seconds,
+            "specialties": len(data["specialties"]) if data else 0,
+            "step_types": len(data["step_types"]) if data else 0,
+            "urgency_levels": len(data["urgency_levels"]) if data else 0
+        }
+
+
+# Instancia compartida por todos los routers del proceso
+reference_data_cache = ReferenceDataCache(ttl_seconds=settings.REFERENCE_DATA_TTL)
@@ -0,0 +1,554 @@
+"""
+Agregados de facturación por periodo
+Mantiene revenue_rollups (día, semana y mes × centro × método de pago ×
+usuario que registró la factura) y
+revenue_patient_totals a partir de invoice_headers de Bienimed, de forma
+incremental con una marca de agua sobre invoice_headers.id y created_date
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text, func, bindparam
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import date, timedelta
+import threading
+import time
+import structlog
+
+from app.core.config import settings
+from app.core.database import create_db_session
+from app.core.result_cache import result_cache
+from app.integrations.bienimed.database import BienimedSessionLocal
+from app.integrations.bienimed.models.invoice import Invoice
+from app.services.clinical_rollup_service import RollupsNotReady
+
+logger = structlog.get_logger()
+
+# Granularidades de los agregados; 'week' empieza en lunes
+ROLLUP_GRANULARITIES = ("day", "week", "month")
+# Valor guardado cuando la factura no tiene centro, método de pago o usuario
+NO_DIMENSION = 0
+# Días recalculados por consulta a invoice_headers
+DAYS_PER_QUERY = 500
+# Pacientes leídos e insertados por lote
+PATIENT_BATCH_SIZE = 5000
+
+# Una sola actualización de agregados a la vez dentro del proceso
+_refresh_lock = threading.Lock()
+
+# (periodo, centro, método de pago, usuario) -> [facturas, monto]
+BucketTotals = Dict[Tuple[date, int, int, int], List[float]]
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Primer día del periodo que contiene `day`"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_end(start: date, granularity: str) -> date:
+    """Último día del periodo que empieza en `start`"""
+    if granularity == "week":
+        return start + timedelta(days=6)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start
+
+
+def _chunks(values: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class RevenueRollupService:
+    """Lectura y mantenimiento incremental de los agregados de facturación"""
+
+    def __init__(self, db: Session, bienimed_db: Optional[Session] = None):
+        self.db = db
+        self._owns_bienimed_db = bienimed_db is None
+        self.bienimed_db = bienimed_db or BienimedSessionLocal()
+
+    # -- Mantenimiento ----------------------------------------------------
+
+    def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Incorporar las facturas nuevas (id mayor a la marca de agua) y recalcular
+        los días que tocan, junto con los últimos REVENUE_ROLLUP_LOOKBACK_DAYS
+        días hasta el mayor created_date visto, para recoger ediciones y
+        anulaciones recientes. Las semanas y meses afectados se recalculan a
+        partir de los días.
+
+        Con `full=True` (o si aún no hay marca de agua) reconstruye todo. Los
+        totales por paciente solo suman facturas nuevas: correcciones de
+        facturas antiguas se reflejan con una reconstrucción completa.
+        """
+        with _refresh_lock:
+            started = time.perf_counter()
+            state = self._read_state()
+            upper_id = self.bienimed_db.query(func.max(Invoice.id)).scalar() or 0
+            try:
+                if full or state is None:
+                    result = self._rebuild(state, upper_id)
+                else:
+                    result = self._apply_new_invoices(state, upper_id)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+        if result["mode"] != "skipped":
+            # Las consultas de facturación guardadas ya no reflejan los agregados
+            for namespace in ("bienimed:revenue", "bienimed:dashboard_slice"):
+                result_cache.invalidate(namespace)
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Revenue rollups refreshed", **result)
+        return result
+
+    def require_built(self) -> None:
+        """
+        Las lecturas no construyen los agregados: la primera construcción la
+        hace RevenueRollupScheduler al iniciar la aplicación (o
+        POST /revenue-analytics/refresh). Mientras tanto se lanza RollupsNotReady.
+        """
+        if self._read_state() is None:
+            raise RollupsNotReady("Los agregados de facturación se están construyendo; intente más tarde")
+
+    def _rebuild(self, state: Optional[Tuple[int, Optional[date]]], upper_id: int) -> Dict[str, Any]:
+        day_totals = self._source_day_totals(Invoice.id <= upper_id)
+        if not self._claim_state(state, upper_id, max((key[0] for key in day_totals), default=None)):
+            return {"mode": "skipped", "last_invoice_id": state[0], "days": 0, "patients": 0}
+
+        self.db.execute(text("DELETE FROM revenue_rollups"))
+        for granularity in ROLLUP_GRANULARITIES:
+            self._insert_buckets(granularity, self._roll_up(day_totals, granularity))
+
+        self.db.execute(text("DELETE FROM revenue_patient_totals"))
+        patients = 0
+        query = self._patient_totals_query(Invoice.id <= upper_id).yield_per(PATIENT_BATCH_SIZE)
+        batch = []
+        for row in query:
+            batch.append({"patient_id": row[0], "invoice_count": row[1], "revenue_total": float(row[2] or 0)})
+            if len(batch) >= PATIENT_BATCH_SIZE:
+                patients += self._insert_patient_totals(batch)
+                batch = []
+        patients += self._insert_patient_totals(batch)
+
+        return {"mode": "full", "last_invoice_id": upper_id, "days": len({key[0] for key in day_totals}), "patients": patients}
+
+    def _apply_new_invoices(self, state: Tuple[int, Optional[date]], upper_id: int) -> Dict[str, Any]:
+        last_id, last_date = state
+        new_days = set()
+        if upper_id > last_id:
+            new_days = {
+                row[0] for row in self.bienimed_db.query(Invoice.created_date).filter(
+                    Invoice.id > last_id, Invoice.id <= upper_id, Invoice.created_date.isnot(None)
+                ).distinct()
+            }
+        dirty_days = set(new_days)
+        if last_date:
+            dirty_days.update(last_date - timedelta(days=offset) for offset in range(settings.REVENUE_ROLLUP_LOOKBACK_DAYS))
+
+        high_water_date = max([day for day in (last_date, *new_days) if day], default=None)
+        if not self._claim_state(state, upper_id, high_water_date):
+            return {"mode": "skipped", "last_invoice_id": last_id, "days": 0, "patients": 0}
+
+        days = sorted(dirty_days)
+        for chunk in _chunks(days, DAYS_PER_QUERY):
+            totals = self._source_day_totals(Invoice.id <= upper_id, Invoice.created_date.in_(chunk))
+            self._delete_buckets("day", chunk)
+            self._insert_buckets("day", totals)
+
+        for granularity in ("week", "month"):
+            starts = sorted({bucket_start(day, granularity) for day in days})
+            for start in starts:
+                self._delete_buckets(granularity, [start])
+                self._insert_buckets(granularity, self._stored_day_totals(start, bucket_end(start, granularity), start))
+
+        patients = 0
+        if upper_id > last_id:
+            patients = self._add_patient_totals(
+                self._patient_totals_query(Invoice.id > last_id, Invoice.id <= upper_id).all()
+            )
+
+        return {"mode": "incremental", "last_invoice_id": upper_id, "new_invoices": upper_id - last_id,
+                "days": len(days), "patients": patients}
+
+    def _source_day_totals(self, *conditions) -> BucketTotals:
+        """Facturas vigentes agrupadas por día, centro, método de pago y usuario (en Bienimed)"""
+        rows = self.bienimed_db.query(
+            Invoice.created_date, Invoice.id_center, Invoice.id_payment_method, Invoice.id_created_by,
+            func.count(Invoice.id), func.coalesce(func.sum(Invoice.total), 0)
+        ).filter(
+            Invoice.created_date.isnot(None), Invoice.delete_at.is_(None), *conditions
+        ).group_by(Invoice.created_date, Invoice.id_center, Invoice.id_payment_method, Invoice.id_created_by)
+
+        totals: BucketTotals = {}
+        for day, center_id, payment_method_id, user_id, count, revenue in rows:
+            # NULL y 0 comparten la fila del agregado
+            key = (day, center_id or NO_DIMENSION, payment_method_id or NO_DIMENSION, user_id or NO_DIMENSION)
+            entry = totals.setdefault(key, [0, 0.0])
+            entry[0] += count
+            entry[1] += float(revenue or 0)
+        return totals
+
+    def _stored_day_totals(self, first_day: date, last_day: date, start: date) -> BucketTotals:
+        """Días ya agregados entre dos fechas, sumados en un solo periodo que empieza en `start`"""
+        rows = self.db.execute(text("""
+            SELECT center_id, payment_method_id, user_id, SUM(invoice_count), SUM(revenue_total)
+            FROM revenue_rollups
+            WHERE granularity = 'day' AND bucket_start BETWEEN :first_day AND :last_day
+            GROUP BY center_id, payment_method_id, user_id
+        """), {"first_day": first_day, "last_day": last_day})
+        return {
+            (start, center_id, payment_method_id, user_id): [int(count), float(revenue)]
+            for center_id, payment_method_id, user_id, count, revenue in rows
+        }
+
+    @staticmethod
+    def _roll_up(day_totals: BucketTotals, granularity: str) -> BucketTotals:
+        """Sumar los totales diarios en periodos de la granularidad indicada"""
+        if granularity == "day":
+            return day_totals
+        totals: BucketTotals = {}
+        for (day, *dimensions), (count, revenue) in day_totals.items():
+            entry = totals.setdefault((bucket_start(day, granularity), *dimensions), [0, 0.0])
+            entry[0] += count
+            entry[1] += revenue
+        return totals
+
+    def _delete_buckets(self, granularity: str, starts: List[date]) -> None:
+        self.db.execute(text("""
+            DELETE FROM revenue_rollups
+            WHERE granularity = :granularity AND bucket_start IN :starts
+        """).bindparams(bindparam("starts", expanding=True)), {"granularity": granularity, "starts": starts})
+
+    def _insert_buckets(self, granularity: str, totals: BucketTotals) -> None:
+        if not totals:
+            return
+        self.db.execute(text("""
+            INSERT INTO revenue_rollups
+                (granularity, bucket_start, center_id, payment_method_id, user_id, invoice_count, revenue_total, updated_at)
+            VALUES
+                (:granularity, :bucket_start, :center_id, :payment_method_id, :user_id, :invoice_count, :revenue_total,
+                 CURRENT_TIMESTAMP)
+        """), [
+            {
+                "granularity": granularity,
+                "bucket_start": start,
+                "center_id": center_id,
+                "payment_method_id": payment_method_id,
+                "user_id": user_id,
+                "invoice_count": count,
+                "revenue_total": round(revenue, 2)
+            }
+            for (start, center_id, payment_method_id, user_id), (count, revenue) in totals.items()
+        ])
+
+    def _patient_totals_query(self, *conditions):
+        return self.bienimed_db.query(
+            Invoice.id_patient, func.count(Invoice.id), func.coalesce(func.sum(Invoice.total), 0)
+        ).filter(
+            Invoice.id_patient.isnot(None), Invoice.delete_at.is_(None), *conditions
+        ).group_by(Invoice.id_patient)
+
+    def _insert_patient_totals(self, rows: List[Dict[str, Any]]) -> int:
+        if rows:
+            self.db.execute(text("""
+                INSERT INTO revenue_patient_totals (patient_id, invoice_count, revenue_total)
+                VALUES (:patient_id, :invoice_count, :revenue_total)
+            """), rows)
+        return len(rows)
+
+    def _add_patient_totals(self, rows: List[Any]) -> int:
+        """Sumar las facturas nuevas a los totales por paciente, creando los que faltan"""
+        for batch in _chunks(rows, PATIENT_BATCH_SIZE):
+            deltas = [
+                {"patient_id": patient_id, "invoice_count": count, "revenue_total": float(revenue or 0)}
+                for patient_id, count, revenue in batch
+            ]
+            existing = {
+                row[0] for row in self.db.execute(text("""
+                    SELECT patient_id FROM revenue_patient_totals WHERE patient_id IN :patient_ids
+                """).bindparams(bindparam("patient_ids", expanding=True)), {"patient_ids": [d["patient_id"] for d in deltas]})
+            }
+            updates = [delta for delta in deltas if delta["patient_id"] in existing]
+            if updates:
+                self.db.execute(text("""
+                    UPDATE revenue_patient_totals
+                    SET invoice_count = invoice_count + :invoice_count,
+                        revenue_total = revenue_total + :revenue_total
+                    WHERE patient_id = :patient_id
+                """), updates)
+            self._insert_patient_totals([delta for delta in deltas if delta["patient_id"] not in existing])
+        return len(rows)
+
+    def _read_state(self) -> Optional[Tuple[int, Optional[date]]]:
+        row = self.db.execute(text("""
+            SELECT last_invoice_id, last_created_date FROM revenue_rollup_state WHERE id = 1
+        """)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _claim_state(self, state: Optional[Tuple[int, Optional[date]]], upper_id: int, last_created_date: Optional[date]) -> bool:
+        """
+        Avanzar la marca de agua al inicio de la transacción. Si otro proceso ya
+        la movió desde que se leyó, no se actualiza nada y se retorna False.
+        """
+        params = {"upper_id": upper_id, "last_created_date": last_created_date}
+        if state is None:
+            self.db.execute(text("DELETE FROM revenue_rollup_state"))
+            self.db.execute(text("""
+                INSERT INTO revenue_rollup_state (id, last_invoice_id, last_created_date, updated_at)
+                VALUES (1, :upper_id, :last_created_date, CURRENT_TIMESTAMP)
+            """), params)
+            return True
+        result = self.db.execute(text("""
+            UPDATE revenue_rollup_state
+            SET last_invoice_id = :upper_id, last_created_date = :last_created_date, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1 AND last_invoice_id = :last_invoice_id
+        """), {**params, "last_invoice_id": state[0]})
+        return result.rowcount == 1
+
+    # -- Consultas ----------------------------------------------------------
+
+    def get_revenue(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        granularity: str = "month",
+        center_id: Optional[int] = None,
+        payment_method_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Facturación por periodo, centro y método de pago en un rango de fechas
+        (inclusive) leída de los agregados, filtrable por centro, método de
+        pago y usuario que registró la factura. Los periodos completos salen de su
+        granularidad; los extremos parciales del rango, de los días.
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"Granularidad no válida: {granularity}. Opciones: {', '.join(ROLLUP_GRANULARITIES)}")
+        if start_date and end_date and start_date > end_date:
+            raise ValueError("start_date no puede ser posterior a end_date")
+        self.require_built()
+
+        by_period: Dict[date, List[float]] = {}
+        by_center: Dict[int, List[float]] = {}
+        by_payment_method: Dict[int, List[float]] = {}
+        for period, center, payment_method, count, revenue in self._read_range(
+            granularity, start_date, end_date, center_id, payment_method_id, user_id
+        ):
+            for totals, key in ((by_period, period), (by_center, center), (by_payment_method, payment_method)):
+                entry = totals.setdefault(key, [0, 0.0])
+                entry[0] += int(count)
+                entry[1] += float(revenue)
+
+        def entries(totals: Dict[Any, List[float]], key_name: str) -> List[Dict[str, Any]]:
+            return sorted((
+                {key_name: key or None, "invoice_count": count, "revenue": round(revenue, 2)}
+                for key, (count, revenue) in totals.items()
+            ), key=lambda entry: -entry["revenue"])
+
+        return {
+            "granularity": granularity,
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None,
+            "invoice_count": sum(count for count, _ in by_period.values()),
+            "total_revenue": round(sum(revenue for _, revenue in by_period.values()), 2),
+            "periods": [
+                {"period": period.isoformat(), "invoice_count": count, "revenue": round(revenue, 2)}
+                for period, (count, revenue) in sorted(by_period.items())
+            ],
+            "by_center": entries(by_center, "center_id"),
+            "by_payment_method": entries(by_payment_method, "payment_method_id")
+        }
+
+    def _read_range(
+        self,
+        granularity: str,
+        start_date: Optional[date],
+        end_date: Optional[date],
+        center_id: Optional[int],
+        payment_method_id: Optional[int],
+        user_id: Optional[int] = None
+    ) -> List[Tuple[date, int, int, int, float]]:
+        """Filas (periodo, centro, método de pago, facturas, monto) que cubren el rango"""
+        filters = (center_id, payment_method_id, user_id)
+        if granularity == "day":
+            return self._read_buckets("day", start_date, end_date, *filters)
+
+        # Periodos completamente dentro del rango
+        full_start = start_date
+        if start_date and bucket_start(start_date, granularity) != start_date:
+            full_start = bucket_end(bucket_start(start_date, granularity), granularity) + timedelta(days=1)
+        full_end = end_date
+        if end_date and bucket_end(bucket_start(end_date, granularity), granularity) != end_date:
+            full_end = bucket_start(end_date, granularity) - timedelta(days=1)
+
+        if full_start and full_end and full_start > full_end:
+            # El rango no cubre ningún periodo completo
+            edges = [(start_date, end_date)]
+            rows = []
+        else:
+            edges = []
+            if full_start != start_date:
+                edges.append((start_date, full_start - timedelta(days=1)))
+            if full_end != end_date:
+                edges.append((full_end + timedelta(days=1), end_date))
+            rows = self._read_buckets(granularity, full_start, full_end, *filters)
+
+        for first_day, last_day in edges:
+            rows.extend(
+                (bucket_start(day, granularity), center, payment_method, count, revenue)
+                for day, center, payment_method, count, revenue
+                in self._read_buckets("day", first_day, last_day, *filters)
+            )
+        return rows
+
+    def _read_buckets(
+        self,
+        granularity: str,
+        first_start: Optional[date],
+        last_start: Optional[date],
+        center_id: Optional[int],
+        payment_method_id: Optional[int],
+        user_id: Optional[int] = None
+    ) -> List[Tuple[date, int, int, int, float]]:
+        conditions = ["granularity = :granularity"]
+        params: Dict[str, Any] = {"granularity": granularity}
+        for condition, name, value in (
+            ("bucket_start >= :first_start", "first_start", first_start),
+            ("bucket_start <= :last_start", "last_start", last_start),
+            ("center_id = :center_id", "center_id", center_id),
+            ("payment_method_id = :payment_method_id", "payment_method_id", payment_method_id),
+            ("user_id = :user_id", "user_id", user_id),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params[name] = value
+        return [tuple(row) for row in self.db.execute(text(f"""
+            SELECT bucket_start, center_id, payment_method_id, invoice_count, revenue_total
+            FROM revenue_rollups
+            WHERE {' AND '.join(conditions)}
+        """), params)]
+
+    def get_daily_totals(self, start_date: date, end_date: date) -> List[Tuple[date, int, float]]:
+        """Filas (día, centro, monto) de los agregados diarios en un rango (inclusive)"""
+        self.require_built()
+        return [(row[0], row[1], float(row[2])) for row in self.db.execute(text("""
+            SELECT bucket_start, center_id, SUM(revenue_total)
+            FROM revenue_rollups
+            WHERE granularity = 'day' AND bucket_start >= :start_date AND bucket_start <= :end_date
+            GROUP BY bucket_start, center_id
+        """), {"start_date": start_date, "end_date": end_date})]
+
+    def get_top_patients(
+        self,
+        limit: int = 10,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        center_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[int, float]:
+        """
+        Pacientes con mayor facturación. Sin rango de fechas ni filtros se lee
+        de revenue_patient_totals; si no, se agrega en Bienimed sobre las
+        facturas filtradas.
+        """
+        if start_date is None and end_date is None and not center_id and not user_id:
+            self.require_built()
+            rows = self.db.execute(text("""
+                SELECT patient_id, revenue_total
+                FROM revenue_patient_totals
+                ORDER BY revenue_total DESC, patient_id
+                LIMIT :limit
+            """), {"limit": limit})
+        else:
+            total = func.coalesce(func.sum(Invoice.total), 0)
+            query = self.bienimed_db.query(Invoice.id_patient, total).filter(
+                Invoice.id_patient.isnot(None), Invoice.delete_at.is_(None)
+            )
+            if start_date:
+                query = query.filter(Invoice.created_date >= start_date)
+            if end_date:
+                query = query.filter(Invoice.created_date <= end_date)
+            if center_id:
+                query = query.filter(Invoice.id_center == center_id)
+            if user_id:
+                query = query.filter(Invoice.id_created_by == user_id)
+            rows = query.group_by(Invoice.id_patient).order_by(total.desc(), Invoice.id_patient).limit(limit)
+        return {patient_id: round(float(revenue), 2) for patient_id, revenue in rows}
+
+    def get_state(self) -> Dict[str, Any]:
+        """Marca de agua actual de los agregados"""
+        row = self.db.execute(text("""
+            SELECT last_invoice_id, last_created_date, updated_at FROM revenue_rollup_state WHERE id = 1
+        """)).fetchone()
+        if not row:
+            return {"built": False}
+        return {
+            "built": True,
+            "last_invoice_id": row[0],
+            "last_created_date": row[1].isoformat() if row[1] else None,
+            "updated_at": row[2].isoformat() if row[2] else None
+        }
+
+    def close(self):
+        """Cerrar la sesión de Bienimed si la abrió este servicio"""
+        if self._owns_bienimed_db and self.bienimed_db:
+            self.bienimed_db.close()
+
+
+class RevenueRollupScheduler:
+    """
+    Actualiza los agregados de facturación en un hilo de fondo cada
+    `interval_seconds`. La primera pasada, al iniciar la aplicación, hace la
+    construcción inicial que esperan las lecturas (ver require_built).
+    """
+
+    def __init__(self, interval_seconds: int = 300):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Iniciar el hilo (no hace nada si el intervalo es 0 o ya está corriendo)"""
+        if self.interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="revenue-rollups", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detener el hilo esperando a que termine la pasada en curso"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Ejecutar una actualización con sesiones propias; los errores se registran"""
+        db = create_db_session()
+        service = RevenueRollupService(db)
+        try:
+            self.last_result = service.refresh()
+            self.last_error = None
+            return self.last_result
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error("Error refreshing revenue rollups", error=str(e))
+            return None
+        finally:
+            service.close()
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+
+revenue_rollup_scheduler = RevenueRollupScheduler(settings.REVENUE_ROLLUP_INTERVAL)
@@ -7,17 +7,18 @@ from app.services.patient_flow_service import PatientFlowService
 from app.services.catalog_service import CatalogService
 from app.schemas.patient_flow import PatientFlowCreate, FlowStepNode, FlowEdge
 from app.core.database import create_db_session
-from app.integrations.bienimed.database import get_bienimed_db
+from app.integrations.bienimed.database import BienimedSessionLocal
 import uuid
 import json
 from datetime import datetime
 
 class UniqueFlowGeneratorService:
     def __init__(self):
-        self.analytics_service = BienimedAnalyticsService()
         self.db = create_db_session()
         self.flow_service = PatientFlowService(self.db)
-        self.bienimed_db = next(get_bienimed_db())
+        self.bienimed_db = BienimedSessionLocal()
+        # Analítica y catálogos comparten la misma sesión (una conexión) de Bienimed
+        self.analytics_service = BienimedAnalyticsService(self.bienimed_db)
         self.catalog_service = CatalogService(self.bienimed_db)
     
     def generate_unique_diagnosis_flows(self, limit: int = 10) -> List[Dict[str, Any]]:
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria del catálogo de flujos médicos
+
+Compara la memoria retenida por la representación actual (listas de
+diccionarios con el formato de `MedicalFlowService`) contra la instantánea
+compacta de `FlowCatalogSnapshot` (arreglos tipados, CSR y textos internados)
+para un catálogo sintético. No requiere base de datos.
+
+Uso:
+    python benchmark_flow_catalog_memory.py [numero_de_nodos]
+"""
+
+import sys
+import os
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from app.services.flow_catalog import FlowCatalogSnapshot, StringPool
+from app.services.medical_flow_service import MedicalFlowService
+
+NODES_PER_FLOW = (6, 20)
+STEP_TYPES = 8
+LABELS = ["Consulta inicial", "Laboratorio", "Imagenología", "Interconsulta", "Procedimiento",
+          "Hospitalización", "Control", "Alta", "Farmacia", "Terapia"]
+SPECIALTIES = ["Cardiología", "Pediatría", "Oncología", "Traumatología", "Medicina Interna"]
+
+
+def generate_rows(n_nodes: int, seed: int = 11):
+    """
+    Filas sintéticas con el formato de las consultas del servicio. Cada
+    llamada crea textos nuevos, como ocurre al leerlos de la base de datos.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(*NODES_PER_FLOW, size=n_nodes // NODES_PER_FLOW[0])
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), n_nodes) + 1]
+    sizes[-1] -= int(sizes.sum()) - n_nodes
+    updated_at = datetime(2024, 1, 1)
+
+    flow_rows, node_rows, edge_rows = [], [], []
+    node = 0
+    for flow, size in enumerate(sizes.tolist()):
+        flow_id = f"flow-{flow:08d}-0000-0000-000000000000"
+        flow_rows.append((
+            flow_id, f"Flujo {LABELS[flow % len(LABELS)]} {flow}", f"Descripción del flujo {flow}",
+            SPECIALTIES[flow % len(SPECIALTIES)], "bienimed", "standard",
+            size * 30, size * 150.0, updated_at + timedelta(minutes=flow), flow % 5
+        ))
+        ids = [f"node-{node + i:08d}-0000-0000-000000000000" for i in range(size)]
+        for i, node_id in enumerate(ids):
+            node_rows.append((
+                node_id, flow_id, (node + i) % STEP_TYPES + 1, f"{LABELS[(node + i) % len(LABELS)]}",
+                i, 30, 100.0, 200.0, 150.0, float(i * 120), 100.0
+            ))
+            if i + 1 < size:
+                edge_rows.append((flow_id, node_id, ids[i + 1], "default"))
+        node += size
+    return flow_rows, node_rows, edge_rows
+
+
+def build_dicts(flow_rows, node_rows, edge_rows):
+    """Representación actual: un diccionario por flujo, nodo y conexión"""
+    flows = [
+        MedicalFlowService._flow_row_to_dict((row[0], row[1], 1, row[2], row[6], row[7], 1, row[3]))
+        for row in flow_rows
+    ]
+    nodes = [
+        MedicalFlowService._node_row_to_dict(row[:4] + (None,) + row[4:])
+        for row in node_rows
+    ]
+    edges = [
+        MedicalFlowService._edge_row_to_dict((f"edge-{i:08d}",) + row)
+        for i, row in enumerate(edge_rows)
+    ]
+    return flows, nodes, edges
+
+
+def build_snapshot(flow_rows, node_rows, edge_rows):
+    """Representación compacta del catálogo"""
+    return FlowCatalogSnapshot.from_rows(StringPool(), flow_rows, node_rows, edge_rows)
+
+
+def measure(builder, n_nodes: int):
+    """Memoria retenida y pico al leer las filas y construir la representación"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = generate_rows(n_nodes)
+    representation = builder(*rows)
+    elapsed = time.perf_counter() - started
+    del rows
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return representation, retained, peak, elapsed
+
+
+def run_benchmark(n_nodes: int) -> bool:
+    print(f"Catálogo sintético: {n_nodes} nodos")
+
+    dicts, dict_bytes, dict_peak, dict_elapsed = measure(build_dicts, n_nodes)
+    n_flows, n_edges = len(dicts[0]), len(dicts[2])
+    del dicts
+    snapshot, snapshot_bytes, snapshot_peak, snapshot_elapsed = measure(build_snapshot, n_nodes)
+
+    print(f"   - Flujos: {n_flows}, conexiones: {n_edges}")
+    print(f"   - Listas de diccionarios: {dict_bytes / 2**20:8.1f} MiB "
+          f"(pico {dict_peak / 2**20:.1f} MiB, {dict_elapsed:.1f} s)")
+    print(f"   - Instantánea compacta:   {snapshot_bytes / 2**20:8.1f} MiB "
+          f"(pico {snapshot_peak / 2**20:.1f} MiB, {snapshot_elapsed:.1f} s)")
+    print(f"     arreglos: {snapshot.nbytes() / 2**20:.1f} MiB, textos internados: {len(snapshot.strings)}")
+    print(f"   - Reducción: {dict_bytes / max(snapshot_bytes, 1):.1f}x")
+    return snapshot_bytes < dict_bytes
+
+
+if __name__ == "__main__":
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print("Benchmark de memoria del catálogo de flujos médicos")
+    if run_benchmark(nodes):
+        sys.exit(0)
+    print("La instantánea no reduce la memoria")
+    sys.exit(1)
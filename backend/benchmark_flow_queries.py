@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de regresión: número de consultas SQL al hidratar flujos médicos
+
+Verifica que cargar nodos y conexiones de N flujos use un número constante de
+consultas (una por tabla), sin importar cuántos flujos haya en el catálogo.
+
+Uso:
+    python benchmark_flow_queries.py
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, text
+
+from app.core.database import engine, create_db_session
+from app.services.medical_flow_service import MedicalFlowService
+
+# Consultas esperadas: flujos + nodos + conexiones
+EXPECTED_LIST_QUERIES = 3
+# Consultas esperadas al hidratar un conjunto de IDs: nodos + conexiones
+EXPECTED_GRAPH_QUERIES = 2
+
+
+class QueryCounter:
+    """Cuenta las sentencias ejecutadas por el engine mientras está activo"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+        return False
+
+
+def run_benchmark() -> bool:
+    """Ejecutar el benchmark y retornar True si no hay regresiones"""
+    # Evitar que el echo de SQL en modo DEBUG ensucie la salida
+    engine.echo = False
+    db = create_db_session()
+    ok = True
+
+    try:
+        service = MedicalFlowService(db)
+        flow_ids = [row[0] for row in db.execute(text(
+            "SELECT id FROM flows WHERE is_active = 1 ORDER BY id"
+        ))]
+        print(f"Flujos activos en catálogo: {len(flow_ids)}")
+
+        # 1. Hidratación por conjunto de IDs con tamaños crecientes
+        sizes = sorted({n for n in (1, 10, 50, 100, 500, len(flow_ids)) if 0 < n <= len(flow_ids)})
+        for size in sizes:
+            with QueryCounter() as counter:
+                started = time.perf_counter()
+                nodes_by_flow, edges_by_flow = service.get_graphs_for_flows(flow_ids[:size])
+                elapsed_ms = (time.perf_counter() - started) * 1000
+
+            status = "OK" if counter.count == EXPECTED_GRAPH_QUERIES else "REGRESIÓN"
+            ok = ok and counter.count == EXPECTED_GRAPH_QUERIES
+            print(f"   - {size:>6} flujos: {counter.count} consultas, "
+                  f"{sum(len(n) for n in nodes_by_flow.values())} nodos, "
+                  f"{sum(len(e) for e in edges_by_flow.values())} conexiones, "
+                  f"{elapsed_ms:.1f} ms [{status}]")
+
+        # 2. Listados completos usados por GET /api/v1/medical-flows/flows
+        for label, call in (
+            ("get_all_flows()", service.get_all_flows),
+            ("search_flows('a')", lambda: service.search_flows("a")),
+        ):
+            with QueryCounter() as counter:
+                started = time.perf_counter()
+                flows = call()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+
+            status = "OK" if counter.count <= EXPECTED_LIST_QUERIES else "REGRESIÓN"
+            ok = ok and counter.count <= EXPECTED_LIST_QUERIES
+            print(f"   - {label}: {len(flows)} flujos, {counter.count} consultas, "
+                  f"{elapsed_ms:.1f} ms [{status}]")
+
+    finally:
+        db.close()
+
+    return ok
+
+
+if __name__ == "__main__":
+    print("Benchmark de consultas para hidratación de flujos médicos")
+    if run_benchmark():
+        print("Número de consultas constante")
+        sys.exit(0)
+    print("El número de consultas crece con el número de flujos")
+    sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las consultas de facturación sobre los agregados precalculados
+
+Actualiza revenue_rollups con las facturas de Bienimed y mide las consultas de
+facturación de todo el histórico y de un rango arbitrario. El tiempo depende
+del número de periodos × centros × métodos de pago, no del número de facturas.
+
+Uso:
+    python benchmark_revenue_rollups.py
+"""
+
+import sys
+import os
+import time
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import create_db_session
+from app.services.revenue_rollup_service import RevenueRollupService
+
+# Objetivo: consultas de todo el histórico en menos de 50 ms
+TARGET_MS = 50.0
+REPETITIONS = 20
+
+
+def best_ms(call) -> float:
+    timings = []
+    for _ in range(REPETITIONS):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def run_benchmark() -> bool:
+    db = create_db_session()
+    service = RevenueRollupService(db)
+    try:
+        result = service.refresh()
+        print(f"Agregados actualizados: {result}")
+
+        cases = {
+            "Histórico mensual": lambda: service.get_revenue(granularity="month"),
+            "Histórico semanal": lambda: service.get_revenue(granularity="week"),
+            "Último año (rango parcial)": lambda: service.get_revenue(
+                start_date=date.today() - timedelta(days=365) + timedelta(days=3), end_date=date.today(), granularity="month"
+            ),
+            "Top pacientes (histórico)": lambda: service.get_top_patients(10),
+        }
+        ok = True
+        for label, call in cases.items():
+            elapsed = best_ms(call)
+            print(f"   - {label}: {elapsed:.1f} ms (mejor de {REPETITIONS})")
+            ok = ok and elapsed < TARGET_MS
+        return ok
+    finally:
+        service.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    print("Benchmark de consultas de facturación sobre agregados")
+    if run_benchmark():
+        print(f"Dentro del objetivo de {TARGET_MS:.0f} ms")
+        sys.exit(0)
+    print(f"Supera el objetivo de {TARGET_MS:.0f} ms")
+    sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Verificación de la tokenización de la búsqueda de flujos médicos
+
+Comprueba que el singular y el plural de cada palabra den el mismo término
+del índice y que ambas formas encuentren los mismos flujos en un índice
+sintético. No requiere base de datos.
+
+Uso:
+    python check_flow_search_terms.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.flow_search_index import FlowSearchIndex, tokenize
+
+# (singular, plural) con las terminaciones que reduce flow_search_index.stem_token
+WORD_PAIRS = [
+    ("paciente", "pacientes"), ("cliente", "clientes"), ("control", "controles"),
+    ("examen", "exámenes"), ("imagen", "imágenes"), ("consulta", "consultas"),
+    ("urgencia", "urgencias"), ("especialidad", "especialidades"), ("hospital", "hospitales"),
+    ("cirugía", "cirugías"), ("órgano", "órganos"), ("clase", "clases"), ("base", "bases"),
+    ("mes", "meses"), ("red", "redes"), ("dolor", "dolores"), ("análisis", "análisis"),
+]
+
+# Flujos sintéticos: (id, nombre, descripción, especialidad, etiquetas de nodos)
+FLOWS = [
+    ("f1", "Control de pacientes", "Seguimiento de clientes corporativos", "Medicina General", ["Consultas"]),
+    ("f2", "Paciente con dolor torácico", None, "Cardiología", ["Exámenes de laboratorio", "Control"]),
+    ("f3", "Urgencias pediátricas", "Atención de redes de clínicas", "Pediatría", ["Imagen", "Alta"]),
+]
+
+
+def run_checks() -> bool:
+    """Ejecutar las verificaciones y retornar True si todas pasan"""
+    ok = True
+
+    print("1. Singular y plural con el mismo término")
+    for singular, plural in WORD_PAIRS:
+        stems = tokenize(singular), tokenize(plural)
+        passed = stems[0] == stems[1]
+        ok = ok and passed
+        print(f"   - {singular} / {plural}: {stems[0][0]} / {stems[1][0]} [{'OK' if passed else 'ERROR'}]")
+
+    print("2. Búsquedas en singular y plural con los mismos flujos")
+    index = FlowSearchIndex(max_age_seconds=0)
+    for flow_id, name, description, specialty, labels in FLOWS:
+        index.index_flow(flow_id, name, description, specialty, labels)
+    for singular, plural in WORD_PAIRS:
+        found = [sorted(flow_id for flow_id, _ in index.search(query)) for query in (singular, plural)]
+        if not found[0] and not found[1]:
+            continue
+        passed = found[0] == found[1]
+        ok = ok and passed
+        print(f"   - '{singular}' {found[0]} / '{plural}' {found[1]} [{'OK' if passed else 'ERROR'}]")
+
+    return ok
+
+
+if __name__ == "__main__":
+    print("Verificación de términos de la búsqueda de flujos")
+    if run_checks():
+        print("El singular y el plural encuentran los mismos flujos")
+        sys.exit(0)
+    print("Hay palabras cuyo singular y plural no coinciden")
+    sys.exit(1)
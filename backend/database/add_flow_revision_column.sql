@@ -0,0 +1,4 @@
+-- Agregar columna revision a la tabla flows
+-- Se incrementa en cada guardado del editor; el ETag y el caché de documentos
+-- de flujo la usan como versión (updated_at solo tiene resolución de un segundo)
+ALTER TABLE flows ADD COLUMN IF NOT EXISTS revision INT NOT NULL DEFAULT 0 COMMENT 'Revisión del flujo (se incrementa en cada guardado)';
@@ -0,0 +1,44 @@
+-- Índices recomendados en la base de datos de Bienimed para los filtros de
+-- analytics por centro, área, médico y cliente (idcentro, idarea, idusuario,
+-- idcliente) y para las pasadas incrementales de los agregados
+-- (clinical_rollups.sql y revenue_rollups.sql). Ejecutar una sola vez; MySQL
+-- no soporta CREATE INDEX IF NOT EXISTS.
+
+-- Médicos de un centro (resolución de idcentro / idarea a idusuario)
+CREATE INDEX idx_centros_usuarios_centro_usuario ON centros_usuarios (idcentro, idusuario);
+CREATE INDEX idx_cat_areas_centro ON cat_areas (idcentro);
+CREATE INDEX idx_medicos_usuario_estado ON medicos (idusuario, estado);
+
+-- Diagnósticos por médico o cliente en un rango de fechas, y consultas por médico
+CREATE INDEX idx_listado_diagnostico_usuario_fecha ON listado_diagnostico (idusuario, fecha);
+CREATE INDEX idx_listado_diagnostico_cliente_fecha ON listado_diagnostico (idcliente, fecha);
+CREATE INDEX idx_listado_diagnostico_consulta_usuario ON listado_diagnostico (idconsulta, idusuario);
+
+-- Procedimientos por médico o cliente en un rango de fechas
+CREATE INDEX idx_listado_procedimiento_usuario_creado ON listado_procedimiento (idusuario, creado);
+CREATE INDEX idx_listado_procedimiento_cliente_creado ON listado_procedimiento (idcliente, creado);
+
+-- Referencias: médico y cliente se toman del diagnóstico de la misma consulta
+CREATE INDEX idx_listado_referencia_consulta ON listado_referencia (idconsulta);
+CREATE INDEX idx_listado_referencia_creado ON listado_referencia (creado);
+
+-- Recetas y órdenes: médico y cliente se toman del diagnóstico de origen
+CREATE INDEX idx_recetas_medicamentos_diagnostico ON recetas_medicamentos (iddiagnostico);
+CREATE INDEX idx_recetas_medicamentos_fecha ON recetas_medicamentos (fecha_creacion);
+CREATE INDEX idx_recetas_ordenes_laboratorio_diagnostico ON recetas_ordenes_laboratorio (iddiagnostico);
+CREATE INDEX idx_recetas_ordenes_laboratorio_fecha ON recetas_ordenes_laboratorio (fecha_creacion);
+CREATE INDEX idx_recetas_ordenes_imagenologia_diagnostico ON recetas_ordenes_imagenologia (iddiagnostico);
+CREATE INDEX idx_recetas_ordenes_imagenologia_fecha ON recetas_ordenes_imagenologia (fecha_creacion);
+
+-- Facturas por centro o usuario en un rango de fechas (y recálculo de días)
+CREATE INDEX idx_invoice_headers_created_date ON invoice_headers (created_date);
+CREATE INDEX idx_invoice_headers_center_date ON invoice_headers (id_center, created_date);
+CREATE INDEX idx_invoice_headers_created_by_date ON invoice_headers (id_created_by, created_date);
+
+-- Paginación por cursor de los listados (/api/v1/bienimed/*): cada índice
+-- cubre (clave de orden, id) porque InnoDB agrega la clave primaria
+CREATE INDEX idx_pacientes_fecha_creacion ON pacientes (fecha_creacion);
+CREATE INDEX idx_pacientes_apellidopaterno ON pacientes (apellidopaterno);
+CREATE INDEX idx_medicos_fecha_creacion ON medicos (fecha_creacion);
+CREATE INDEX idx_medicos_apellidopaterno ON medicos (apellidopaterno);
+CREATE INDEX idx_listado_diagnostico_fecha ON listado_diagnostico (fecha);
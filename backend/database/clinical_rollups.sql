@@ -0,0 +1,37 @@
+-- Agregados de actividad clínica precalculados a partir de las tablas de Bienimed
+-- (también se crean con Base.metadata.create_all al iniciar la aplicación)
+CREATE TABLE IF NOT EXISTS clinical_activity_rollups (
+    source VARCHAR(20) NOT NULL COMMENT 'diagnoses, procedures, referrals, prescriptions, lab_orders o imaging_orders',
+    activity_date DATE NOT NULL,
+    user_id INT NOT NULL DEFAULT 0 COMMENT 'Médico (idusuario); 0 = desconocido',
+    client_id INT NOT NULL DEFAULT 0 COMMENT 'Cliente corporativo (idcliente); 0 = sin cliente',
+    item_id INT NOT NULL DEFAULT 0 COMMENT 'Diagnóstico, procedimiento o especialidad; 0 = no aplica',
+    row_count INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, activity_date, user_id, client_id, item_id),
+    INDEX idx_clinical_activity_rollups_user (source, user_id, activity_date),
+    INDEX idx_clinical_activity_rollups_client (source, client_id, activity_date)
+);
+
+CREATE TABLE IF NOT EXISTS clinical_consultations (
+    consultation_id INT NOT NULL,
+    activity_date DATE NOT NULL COMMENT 'Día con diagnósticos de la consulta',
+    user_id INT NOT NULL DEFAULT 0 COMMENT 'Médico (idusuario) que registró los diagnósticos',
+    client_id INT NOT NULL DEFAULT 0 COMMENT 'Cliente corporativo (idcliente) de los diagnósticos',
+    patient_id INT NULL COMMENT 'Paciente de la consulta',
+    PRIMARY KEY (consultation_id, activity_date, user_id, client_id),
+    INDEX idx_clinical_consultations_date (activity_date, user_id),
+    INDEX idx_clinical_consultations_client (client_id, activity_date)
+);
+
+CREATE TABLE IF NOT EXISTS clinical_rollup_state (
+    source VARCHAR(20) NOT NULL PRIMARY KEY,
+    last_id INT NOT NULL DEFAULT 0 COMMENT 'Mayor id ya agregado de la tabla de origen',
+    last_activity_date DATE NULL COMMENT 'Mayor fecha de registro vista',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Instalaciones con las tablas anteriores a la dimensión de cliente: son datos
+-- derivados, basta con eliminarlas y se reconstruyen en la siguiente pasada.
+-- DROP TABLE clinical_activity_rollups, clinical_consultations;
+-- DELETE FROM clinical_rollup_state;
@@ -0,0 +1,23 @@
+-- Historial de métricas de flujos por especialidad (una fila por día y especialidad)
+-- (también se crea con Base.metadata.create_all al iniciar la aplicación, sin particiones)
+CREATE TABLE IF NOT EXISTS flow_metrics_history (
+    snapshot_date DATE NOT NULL COMMENT 'Día de la instantánea',
+    specialty_id VARCHAR(36) NOT NULL COMMENT 'flows.specialty_id; general = sin especialidad',
+    specialty_name VARCHAR(255) NOT NULL,
+    flow_count INT NOT NULL DEFAULT 0 COMMENT 'Flujos activos',
+    step_count INT NOT NULL DEFAULT 0 COMMENT 'Nodos de los flujos activos',
+    avg_cost DECIMAL(12, 2) NULL COMMENT 'Costo estimado promedio por flujo',
+    avg_duration DECIMAL(10, 2) NULL COMMENT 'Duración promedio por flujo (minutos)',
+    captured_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (snapshot_date, specialty_id),
+    INDEX idx_flow_metrics_history_specialty (specialty_id, snapshot_date)
+)
+-- Particiones por año: el análisis de tendencias filtra por rango de fechas y
+-- solo lee las particiones del rango. Agregar el año siguiente antes de que
+-- empiece con: ALTER TABLE flow_metrics_history REORGANIZE PARTITION p_future INTO (...);
+PARTITION BY RANGE COLUMNS (snapshot_date) (
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION p2027 VALUES LESS THAN ('2028-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
@@ -0,0 +1,13 @@
+-- Resumen precalculado de estadísticas de flujos activos
+-- (también se crea con Base.metadata.create_all al iniciar la aplicación)
+CREATE TABLE IF NOT EXISTS flow_statistics_summary (
+    dimension VARCHAR(30) NOT NULL COMMENT 'total, specialty, source_system o flow_type',
+    dimension_value VARCHAR(255) NOT NULL DEFAULT '' COMMENT 'Valor de la dimensión ('''' para el total)',
+    flow_count INT NOT NULL DEFAULT 0,
+    node_count INT NOT NULL DEFAULT 0,
+    edge_count INT NOT NULL DEFAULT 0,
+    duration_sum DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    cost_sum DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (dimension, dimension_value)
+);
@@ -0,0 +1,36 @@
+-- Agregados de facturación precalculados a partir de invoice_headers (Bienimed)
+-- (también se crean con Base.metadata.create_all al iniciar la aplicación)
+CREATE TABLE IF NOT EXISTS revenue_rollups (
+    granularity VARCHAR(10) NOT NULL COMMENT 'day, week (inicia en lunes) o month',
+    bucket_start DATE NOT NULL COMMENT 'Primer día del periodo',
+    center_id INT NOT NULL DEFAULT 0 COMMENT '0 = sin centro',
+    payment_method_id INT NOT NULL DEFAULT 0 COMMENT '0 = sin método de pago',
+    user_id INT NOT NULL DEFAULT 0 COMMENT 'Usuario que registró la factura (id_created_by); 0 = sin usuario',
+    invoice_count INT NOT NULL DEFAULT 0,
+    revenue_total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (granularity, bucket_start, center_id, payment_method_id, user_id),
+    INDEX idx_revenue_rollups_center (granularity, center_id, bucket_start),
+    INDEX idx_revenue_rollups_user (granularity, user_id, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS revenue_patient_totals (
+    patient_id INT NOT NULL PRIMARY KEY,
+    invoice_count INT NOT NULL DEFAULT 0,
+    revenue_total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    INDEX idx_revenue_patient_totals_revenue (revenue_total)
+);
+
+CREATE TABLE IF NOT EXISTS revenue_rollup_state (
+    id INT NOT NULL PRIMARY KEY,
+    last_invoice_id INT NOT NULL DEFAULT 0 COMMENT 'Mayor invoice_headers.id ya agregado',
+    last_created_date DATE NULL COMMENT 'Mayor created_date visto',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Instalaciones con revenue_rollups anterior a la columna user_id: son datos
+-- derivados, basta con eliminarla y reconstruir los agregados.
+-- DROP TABLE revenue_rollups;
+-- DELETE FROM revenue_rollup_state;
+
+-- Índices recomendados en la base de datos de Bienimed: ver bienimed_analytics_indexes.sql
@@ -14,9 +14,17 @@ from typing import Dict, Any
 
 # Importar configuración
 from app.core.config import settings
-from app.core.database import init_db, close_db
+from app.core.database import init_db, close_db, create_db_session
 from app.core.redis import init_redis, close_redis
 from app.core.logging import setup_logging
+from app.services.flow_autosave import flow_autosave_buffer
+from app.services.reference_data import reference_data_cache
+from app.services.bienimed_analytics_service import dashboard_stats_snapshot
+from app.core.model_registry import model_registry
+from app.services.demand_forecast_service import DEMAND_MODEL, demand_model_snapshot
+from app.services.revenue_rollup_service import revenue_rollup_scheduler
+from app.services.clinical_rollup_service import clinical_rollup_scheduler
+from app.services.flow_metrics_history_service import flow_metrics_snapshot_scheduler
 
 # Importar rutas
 from app.api.v1.routes import config, integration, analytics, visualization, auth, patient_journey, steps, patient_flows, bienimed_analytics, flow_generator, advanced_flow_generator, flow_cleanup, unique_flow_generator, step_sync
@@ -25,7 +33,7 @@ from app.api.v1.routes import config, integration, analytics, visualization, aut
 from app.api.v1.routes import medical_flows
 
 # Importar rutas de integración Bienimed
-from app.integrations.bienimed.routes import filters_router
+from app.integrations.bienimed.routes import filters_router, exports_router
 
 from app.api.v1.websocket import websocket_router
 
@@ -36,6 +44,16 @@ logger = structlog.get_logger()
 # Security
 security = HTTPBearer()
 
+def load_reference_data():
+    """Cargar el caché de datos de referencia; si falla se carga en el primer request"""
+    db = create_db_session()
+    try:
+        reference_data_cache.load(db)
+    except Exception as e:
+        logger.warning("Reference data not preloaded", error=str(e))
+    finally:
+        db.close()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestión del ciclo de vida de la aplicación"""
@@ -47,6 +65,23 @@ async def lifespan(app: FastAPI):
         await init_db()
         logger.info("Database initialized successfully")
         
+        # Precargar catálogos de flujos (tipos de paso, urgencias, especialidades)
+        load_reference_data()
+        
+        # Calcular en segundo plano la instantánea del dashboard (página de inicio)
+        dashboard_stats_snapshot.refresh_in_background()
+        
+        # Mantener los agregados de facturación al día en segundo plano
+        revenue_rollup_scheduler.start()
+        # Incorporar los registros clínicos nuevos a los agregados de analítica
+        clinical_rollup_scheduler.start()
+        # Guardar la instantánea diaria de métricas de flujos (análisis de tendencias)
+        flow_metrics_snapshot_scheduler.start()
+        # Ajustar en segundo plano los modelos de pronóstico de demanda si no
+        # hay una versión entrenada fuera de línea (train_models.py)
+        if model_registry.current_version(DEMAND_MODEL) is None:
+            demand_model_snapshot.refresh_in_background()
+        
         # Inicializar Redis
         await init_redis()
         logger.info("Redis initialized successfully")
@@ -60,6 +95,11 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down Patient Journey Predictor API")
+        # Escribir autoguardados de flujos pendientes antes de cerrar la base de datos
+        flow_autosave_buffer.flush_all()
+        revenue_rollup_scheduler.stop()
+        clinical_rollup_scheduler.stop()
+        flow_metrics_snapshot_scheduler.stop()
         await close_db()
         await close_redis()
 
@@ -120,6 +160,7 @@ app.include_router(medical_flows.router, prefix="/api/v1/medical-flows", tags=["
 
 # Rutas de integración Bienimed
 app.include_router(filters_router, prefix="/api/v1/bienimed/filters", tags=["Bienimed - Filtros"])
+app.include_router(exports_router, prefix="/api/v1/bienimed/export", tags=["Bienimed - Exportación"])
 
 app.include_router(websocket_router, prefix="/ws", tags=["WebSocket"])
 
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Entrenamiento fuera de línea de los modelos de pronóstico
+
+Ajusta los modelos y los publica como una versión nueva en ML_MODEL_PATH. Los
+workers de la API cambian a la versión nueva en su siguiente revisión del
+puntero (ML_MODEL_CHECK_SECONDS) sin reiniciarse.
+
+Uso:
+    python train_models.py train [demand_forecast] [cost_forecast]
+    python train_models.py list [modelo]
+    python train_models.py activate <modelo> <versión>
+"""
+
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.model_registry import model_registry
+from app.services.demand_forecast_service import DEMAND_MODEL, fit_demand_models, train_and_publish
+from app.services.cost_forecast_service import COST_MODEL, fit_cost_models
+
+TRAINERS = {
+    DEMAND_MODEL: fit_demand_models,
+    COST_MODEL: fit_cost_models,
+}
+
+
+def train(names) -> None:
+    for name in names or TRAINERS:
+        started = time.perf_counter()
+        version, model = train_and_publish(name, TRAINERS[name])
+        print(
+            f"{name}: versión {version} publicada ({len(model['keys'])} series, "
+            f"{model['days']} días, {time.perf_counter() - started:.1f} s)"
+        )
+
+
+def list_versions(names) -> None:
+    for name in names or TRAINERS:
+        print(f"{name}:")
+        versions = model_registry.versions(name)
+        if not versions:
+            print("   (sin versiones publicadas)")
+        for version in versions:
+            marker = "*" if version["active"] else " "
+            print(f" {marker} {version['version']}  {version['created_at']}  {version['summary']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrenar y publicar modelos de pronóstico")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="Entrenar y publicar una versión nueva")
+    train_parser.add_argument("models", nargs="*", help=f"Modelos a entrenar: {', '.join(TRAINERS)} (todos por defecto)")
+    list_parser = commands.add_parser("list", help="Listar las versiones guardadas")
+    list_parser.add_argument("models", nargs="*")
+    activate_parser = commands.add_parser("activate", help="Volver a una versión guardada")
+    activate_parser.add_argument("model", choices=list(TRAINERS))
+    activate_parser.add_argument("version")
+    args = parser.parse_args()
+    for name in getattr(args, "models", []):
+        if name not in TRAINERS:
+            parser.error(f"Modelo no válido: {name}. Opciones: {', '.join(TRAINERS)}")
+
+    try:
+        if args.command == "train":
+            train(args.models)
+        elif args.command == "list":
+            list_versions(args.models)
+        else:
+            model_registry.activate(args.model, args.version)
+            print(f"{args.model}: versión {args.version} activa")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
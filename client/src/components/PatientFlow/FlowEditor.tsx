@@ -778,7 +778,8 @@ const FlowEditor: React.FC<FlowEditorProps> = ({ flowId, onSave, readOnly = fals
           duration: n.data.templateData?.defaultDuration || originalNode?.durationMinutes || 0,
           position: n.position, // Guardar la posición actual (puede haber sido movida)
           stepTypeId: originalNode?.stepTypeId,
-          description: originalNode?.description || n.data?.label,
+          // Sin valor guardado no se envía: el backend compara y escribiría la etiqueta como descripción
+          description: originalNode?.description ?? undefined,
         };
       }),
       edges: edges.map(e => ({
@@ -14,6 +14,19 @@ export interface DemandPrediction {
   factors: Record<string, any>;
 }
 
+export interface BatchPredictionItem {
+  specialty_id: number;
+  prediction_horizon?: number;
+  time_period?: 'daily' | 'weekly' | 'monthly' | 'quarterly' | 'yearly';
+}
+
+export type BatchPredictionResult = DemandPrediction & {
+  prediction_horizon: number;
+  forecast_period: 'daily' | 'weekly' | 'monthly' | 'quarterly' | 'yearly';
+  forecast?: Array<{ date: string; end_date?: string; value: number; lower: number; upper: number }>;
+  error?: string;
+};
+
 export interface TrendAnalysis {
   specialty_id?: string | number;
   specialty_name?: string;
@@ -103,6 +116,23 @@ class AnalyticsService {
     return response.json();
   }
 
+  /**
+   * Obtener predicciones de demanda de varias especialidades y horizontes en
+   * una sola llamada (resultados en el mismo orden)
+   */
+  async getBatchPredictions(requests: BatchPredictionItem[]): Promise<BatchPredictionResult[]> {
+    const response = await fetch(`${this.baseUrl}/predictions/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ requests }),
+    });
+    if (!response.ok) {
+      throw new Error(`Error obteniendo predicciones: ${response.statusText}`);
+    }
+    const data = await response.json();
+    return data.results;
+  }
+
   /**
    * Obtener análisis de tendencias
    */